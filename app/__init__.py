@@ -6,8 +6,6 @@ import os
 from flask import Flask, abort, request
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, verify_jwt_in_request
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
@@ -17,8 +15,8 @@ from app.webhooks import webhook_bp
 from config import Config
 from flask_migrate import Migrate
 
-# Initialize Limiter for rate limiting
-limiter = Limiter(key_func=get_remote_address, default_limits=["200 per day", "50 per hour"])
+# Shared rate limiter (storage and limits are configured via RATELIMIT_* settings)
+from app.rate_limits import limiter
 
 # Initialize Flask extensions
 db = SQLAlchemy()
@@ -67,16 +65,21 @@ def create_app(config_class=Config):
     jwt.init_app(app)
 
     # Initialize other extensions
+    from app import db_profiles
+    db_profiles.configure(app)
     db.init_app(app)
+    db_profiles.init_app(app)
     bcrypt.init_app(app)
     login_manager.init_app(app)
     mail.init_app(app)
     migrate.init_app(app, db)
-    limiter.init_app(app)
 
     # Image upload settings
     # Folder where class images will be saved
     app.config['UPLOAD_FOLDER'] = os.path.join(app.root_path, 'static', 'images')
+    # Folder for uploads in progress: not served as static files
+    if not app.config.get('UPLOAD_TMP_FOLDER'):
+        app.config['UPLOAD_TMP_FOLDER'] = os.path.join(app.instance_path, 'uploads')
     # Allowed file extensions for uploads
     app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif'}
     # Maximum file size allowed for uploads: 16 MB
@@ -93,6 +96,23 @@ def create_app(config_class=Config):
     app.register_blueprint(webhook_bp)
 
     from app import models  # Import models for Alembic
+    from app import seats  # Registers session listeners maintaining class_seat_counter
+    from app import stats  # Registers session listeners maintaining statistics rollups
+    from app import audit, fragment_cache, images, metrics, passwords, query_stats, rate_limits, rate_windows, token_revocation, uploads, user_cache
+    from app.commands import register_commands
+
+    rate_limits.init_app(app)
+    audit.init_app(app)
+    rate_windows.init_app(app)
+    user_cache.init_app(app)
+    fragment_cache.init_app(app)
+    images.init_app(app)
+    uploads.init_app(app)
+    passwords.init_app(app)
+    token_revocation.init_app(app)
+    query_stats.init_app(app)
+    metrics.init_app(app)
+    register_commands(app)
 
     # # Enable JWT authentication for API routes
     # @app.before_request
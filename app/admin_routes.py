@@ -1,21 +1,21 @@
 # app/admin_routes.py
 import logging
-import os
-import random
-import string
 from datetime import datetime, timedelta
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, current_app
-from sqlalchemy.orm import joinedload
-from werkzeug.utils import secure_filename
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.exc import StaleDataError
 
-from app import db
+from app import db, images, passwords
+from app.audit import log_action
 from app.forms import ClassForm, DeleteClassForm, PromoteUserForm, DemoteUserForm, DeleteUserForm, AddBookingForm
-from app.models import User, Class, Booking, ActionLog, Payment
+from app.models import User, Class, Booking, ActionLog, Payment, ClassSeatCounter, UserBookingStat, PaymentStatusStat
+from app.pagination import decode_cursor, keyset_page
+from app.reservations import reserve_seat
 from flask_login import login_required, current_user
 from functools import wraps
 
-from app.utils import allowed_file, random_string
+from app.utils import allowed_file
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -24,6 +24,12 @@ admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Размер страницы таблиц пользователей и классов в панели администратора
+ADMIN_PAGE_SIZE = 50
+# Сколько последних бронирований и платежей показывать в деталях пользователя
+USER_DETAILS_LIMIT = 20
+# Сколько неактивных пользователей показывать на странице статистики
+INACTIVE_USERS_LIMIT = 50
 
 
 # Декоратор для проверки прав администратора
@@ -44,46 +50,52 @@ def admin_required(f):
 @admin_required
 def admin_panel():
     try:
-        # Предварительная загрузка бронирований и связанных классов
-        users = User.query.options(
-            joinedload(User.bookings).joinedload(Booking.class_),
-            joinedload(User.payments)
-        ).order_by(User.username.asc()).all()
-
-        classes = Class.query.order_by(Class.schedule.asc()).all()
-
-        # Создание формы для удаления классов
-        delete_class_forms = {class_.id: DeleteClassForm(class_id=class_.id) for class_ in classes}
-
-        # Создание форм для управления пользователями
-        promote_user_forms = {user.id: PromoteUserForm(user_id=user.id) for user in users if not user.is_admin}
-        demote_user_forms = {user.id: DemoteUserForm(user_id=user.id) for user in users if user.is_admin}
-        delete_user_forms = {user.id: DeleteUserForm(user_id=user.id) for user in users if user.id != current_user.id}
-
-        # Получение количества подтверждённых бронирований для всех классов за один запрос
-        booking_counts = db.session.query(
-            Booking.class_id,
-            db.func.count(Booking.id)
-        ).filter_by(status='confirmed').group_by(Booking.class_id).all()
-
-        # Создание словаря с количеством бронирований
-        bookings_dict = {class_id: count for class_id, count in booking_counts}
-
-        # Вычисление доступных мест для каждого класса
-        available_spots = {}
-        for class_ in classes:
-            confirmed_bookings = bookings_dict.get(class_.id, 0)
-            available = class_.capacity - confirmed_bookings
-            available_spots[class_.id] = available if available >= 0 else 0  # Предотвращение отрицательных значений
+        # Поиск и keyset-пагинация выполняются в базе: на странице не больше ADMIN_PAGE_SIZE строк
+        user_search = request.args.get('user_q', '').strip()
+        class_search = request.args.get('class_q', '').strip()
+        try:
+            users_after = decode_cursor(request.args['users_after']) if request.args.get('users_after') else None
+            classes_after = decode_cursor(request.args['classes_after']) if request.args.get('classes_after') else None
+        except ValueError:
+            flash('Некорректная ссылка на страницу.', 'warning')
+            users_after = classes_after = None
+
+        users_query = User.query
+        if user_search:
+            users_query = users_query.filter(
+                User.username.icontains(user_search, autoescape=True) |
+                User.email.icontains(user_search, autoescape=True)
+            )
+        users, next_users_cursor = keyset_page(users_query, User.username, User.id, users_after, ADMIN_PAGE_SIZE)
+
+        classes_query = Class.query
+        if class_search:
+            classes_query = classes_query.filter(Class.name.icontains(class_search, autoescape=True))
+        classes, next_classes_cursor = keyset_page(
+            classes_query, Class.schedule, Class.id, classes_after, ADMIN_PAGE_SIZE
+        )
+
+        # Одна форма каждого типа на страницу; user_id/class_id подставляется в шаблоне
+        delete_class_form = DeleteClassForm()
+        promote_user_form = PromoteUserForm()
+        demote_user_form = DemoteUserForm()
+        delete_user_form = DeleteUserForm()
+
+        # Доступные места для классов страницы за один запрос
+        available_spots = Class.preload_available_slots(classes)
 
         return render_template(
             'admin_panel.html',
             users=users,
             classes=classes,
-            delete_class_forms=delete_class_forms,
-            promote_user_forms=promote_user_forms,
-            demote_user_forms=demote_user_forms,
-            delete_user_forms=delete_user_forms,
+            user_search=user_search,
+            class_search=class_search,
+            next_users_cursor=next_users_cursor,
+            next_classes_cursor=next_classes_cursor,
+            delete_class_form=delete_class_form,
+            promote_user_form=promote_user_form,
+            demote_user_form=demote_user_form,
+            delete_user_form=delete_user_form,
             available_spots=available_spots  # Передача данных о доступных местах
         )
     except Exception as e:
@@ -92,6 +104,22 @@ def admin_panel():
         return redirect(url_for('main.home'))
 
 
+# Бронирования и платежи пользователя (загружаются панелью по запросу)
+@admin_bp.route('/users/<int:user_id>/details')
+@login_required
+@admin_required
+def user_details(user_id):
+    user = User.query.get_or_404(user_id)
+    bookings = Booking.query.options(selectinload(Booking.class_)) \
+        .filter_by(user_id=user.id) \
+        .order_by(Booking.booking_date.desc()) \
+        .limit(USER_DETAILS_LIMIT).all()
+    payments = Payment.query.filter_by(user_id=user.id) \
+        .order_by(Payment.timestamp.desc()) \
+        .limit(USER_DETAILS_LIMIT).all()
+    return render_template('partials/user_details.html', user=user, bookings=bookings, payments=payments)
+
+
 # Добавление Администратора
 @admin_bp.route('/promote_user/<int:user_id>', methods=['POST'])
 @login_required
@@ -208,16 +236,11 @@ def add_class():
 
         # Обработка загрузки изображения
         if form.image.data:
-            image_file = form.image.data
-            filename = secure_filename(image_file.filename)
-            # Добавляем случайную строку для уникальности имени файла
-            unique_suffix = random_string()
-            filename = f"{unique_suffix}_{filename}"
-            # Используем current_app.root_path для построения пути
-            image_path = os.path.join(current_app.root_path, 'static', 'images', filename)
             try:
-                image_file.save(image_path)
+                # Файл сохраняется под именем из хэша содержимого; повторная загрузка не создаёт копию
+                filename = images.store_upload(form.image.data)
                 new_class.image_filename = filename
+                images.schedule_variants(filename)
                 logger.info(f"Изображение сохранено как: {filename}")
             except Exception as e:
                 logger.error(f"Ошибка сохранения изображения: {e}")
@@ -261,44 +284,17 @@ def edit_class(class_id):
         # Преобразование списка дней недели в строку
         class_.days_of_week = ','.join(form.days_of_week.data)
 
-        # Обработка удаления текущего изображения, если выбрано
-        remove_image = request.form.get('remove_image')
-        if remove_image:
-            if class_.image_filename:
-                old_image_path = os.path.join(current_app.root_path, 'static', 'images', class_.image_filename)
-                if os.path.exists(old_image_path):
-                    try:
-                        os.remove(old_image_path)
-                        logger.info(f"Старое изображение {class_.image_filename} удалено.")
-                    except Exception as e:
-                        logger.error(f"Ошибка удаления изображения: {e}")
-                        flash('Ошибка при удалении старого изображения.', 'danger')
-                        return render_template('edit_class.html', form=form, class_=class_)
-                class_.image_filename = None
+        # Обработка удаления текущего изображения, если выбрано. Файл может использоваться
+        # другими классами или пользователями, поэтому удаляет его `flask gc-images`
+        if request.form.get('remove_image'):
+            class_.image_filename = None
 
         # Обработка загрузки нового изображения, если было выбрано новое
         if form.image.data:
-            # Удаляем старое изображение, если оно существует
-            if class_.image_filename:
-                old_image_path = os.path.join(current_app.root_path, 'static', 'images', class_.image_filename)
-                if os.path.exists(old_image_path):
-                    try:
-                        os.remove(old_image_path)
-                        logger.info(f"Старое изображение {class_.image_filename} удалено.")
-                    except Exception as e:
-                        logger.error(f"Ошибка удаления изображения: {e}")
-                        flash('Ошибка при удалении старого изображения.', 'danger')
-                        return render_template('edit_class.html', form=form, class_=class_)
-
-            image_file = form.image.data
-            filename = secure_filename(image_file.filename)
-            # Добавляем случайную строку для уникальности имени файла
-            unique_suffix = random_string()
-            filename = f"{unique_suffix}_{filename}"
-            image_path = os.path.join(current_app.root_path, 'static', 'images', filename)
             try:
-                image_file.save(image_path)
+                filename = images.store_upload(form.image.data)
                 class_.image_filename = filename
+                images.schedule_variants(filename)
                 logger.info(f"Новое изображение сохранено как: {filename}")
             except Exception as e:
                 logger.error(f"Ошибка сохранения изображения: {e}")
@@ -319,10 +315,7 @@ def edit_class(class_id):
     if request.method == 'GET' and class_.days_of_week:
         form.days_of_week.data = class_.days_of_week.split(',')
 
-    # Генерируем случайную строку для предотвращения кеширования изображения
-    random_suffix = ''.join(random.choices(string.ascii_letters + string.digits, k=8))
-
-    return render_template('edit_class.html', form=form, class_=class_, random_string=random_suffix)
+    return render_template('edit_class.html', form=form, class_=class_)
 
 
 
@@ -369,25 +362,18 @@ def add_booking(user_id):
             flash('Выбранный класс не существует.', 'danger')
             return redirect(url_for('admin.add_booking', user_id=user_id))
 
-        # Проверка, не превышает ли бронирование вместимость класса
-        confirmed_bookings = Booking.query.filter_by(class_id=class_id, day=day, status='confirmed').count()
-        if confirmed_bookings >= class_.capacity:
+        # Создание бронирования; место списывается атомарно, без превышения вместимости
+        booking = reserve_seat(user.id, class_, day)
+        if booking is None:
             flash('Извините, на этот день места уже заполнены.', 'danger')
             return redirect(url_for('admin.add_booking', user_id=user_id))
 
-        # Создание бронирования
-        booking = Booking(user_id=user.id, class_id=class_id, day=day, status='confirmed')
-        db.session.add(booking)
-        db.session.commit()
-
         # Логирование добавления бронирования администратором
-        action = ActionLog(
-            user_id=current_user.id,
-            action=f"Добавление бронирования для пользователя '{user.username}' на класс '{class_.name}' в день '{day}'",
-            ip_address=request.remote_addr,
-            status='success'
+        log_action(
+            f"Добавление бронирования для пользователя '{user.username}' на класс '{class_.name}' в день '{day}'",
+            status='success',
+            user_id=current_user.id
         )
-        db.session.add(action)
         db.session.commit()
 
         flash('Бронирование успешно добавлено.', 'success')
@@ -403,18 +389,22 @@ def add_booking(user_id):
 def delete_booking(booking_id):
     booking = Booking.query.get_or_404(booking_id)
     user = booking.user
-    db.session.delete(booking)
-    db.session.commit()
-
-    # Логирование удаления бронирования администратором
-    action = ActionLog(
-        user_id=current_user.id,
-        action=f"Удаление бронирования пользователя '{user.username}' на класс ID {booking.class_id} в день {booking.day}",
-        ip_address=request.remote_addr,
-        status='success'
-    )
-    db.session.add(action)
-    db.session.commit()
+    try:
+        db.session.delete(booking)
+
+        # Логирование удаления бронирования администратором
+        log_action(
+            f"Удаление бронирования пользователя '{user.username}' на класс ID {booking.class_id} в день {booking.day}",
+            status='success',
+            user_id=current_user.id
+        )
+        db.session.commit()
+    except StaleDataError:
+        # Бронирование изменено или удалено в другом запросе после загрузки
+        db.session.rollback()
+        logger.warning(f"Concurrent update of booking ID {booking_id} while deleting by admin ID {current_user.id}")
+        flash('Бронирование было изменено в другом запросе. Обновите страницу и попробуйте снова.', 'warning')
+        return redirect(url_for('admin.admin_panel'))
 
     flash('Бронирование успешно удалено.', 'success')
     return redirect(url_for('admin.admin_panel'))
@@ -430,33 +420,61 @@ def delete_booking(booking_id):
 @admin_required
 def statistics():
     try:
+        # Все показатели читаются из сводок, которые обновляются при записи
+        # (class_seat_counter — app/seats.py, user_booking_stat и payment_status_stat — app/stats.py)
+        class_confirmed = db.func.sum(ClassSeatCounter.confirmed)
+
         # Популярные классы (наибольшее количество бронирований)
         popular_classes = db.session.query(
             Class.name,
-            db.func.count(Booking.id).label('booking_count')
-        ).join(Booking).filter(Booking.status == 'confirmed').group_by(Class.id).order_by(db.desc('booking_count')).limit(10).all()
+            class_confirmed.label('booking_count')
+        ).join(ClassSeatCounter, ClassSeatCounter.class_id == Class.id) \
+            .group_by(Class.id, Class.name) \
+            .having(class_confirmed > 0) \
+            .order_by(db.desc('booking_count')).limit(10).all()
 
         # Активность пользователей (наибольшее количество бронирований)
         active_users = db.session.query(
             User.username,
-            db.func.count(Booking.id).label('booking_count')
-        ).join(Booking).filter(Booking.status == 'confirmed').group_by(User.id).order_by(db.desc('booking_count')).limit(10).all()
+            UserBookingStat.confirmed
+        ).join(UserBookingStat, UserBookingStat.user_id == User.id) \
+            .filter(UserBookingStat.confirmed > 0) \
+            .order_by(UserBookingStat.confirmed.desc()).limit(10).all()
 
         # Время занятий (например, бронирования по часам)
         bookings_by_hour = db.session.query(
             db.extract('hour', Class.schedule).label('hour'),
-            db.func.count(Booking.id).label('booking_count')
-        ).join(Booking).filter(Booking.status == 'confirmed').group_by('hour').order_by('hour').all()
+            class_confirmed.label('booking_count')
+        ).join(ClassSeatCounter, ClassSeatCounter.class_id == Class.id) \
+            .group_by('hour') \
+            .having(class_confirmed > 0) \
+            .order_by('hour').all()
 
-        # Неактивные пользователи (не заходили более 30 дней)
+        # Неактивные пользователи (не заходили более 30 дней): количество и самые давние
         thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        inactive_users = User.query.filter(
-            (User.last_login < thirty_days_ago) | (User.last_login == None)
-        ).all()
+        inactive_filter = (User.last_login < thirty_days_ago) | (User.last_login == None)
+        inactive_users_count = db.session.query(db.func.count(User.id)).filter(inactive_filter).scalar()
+        inactive_users = User.query.filter(inactive_filter) \
+            .order_by(User.last_login.asc(), User.id.asc()) \
+            .limit(INACTIVE_USERS_LIMIT).all()
 
         # Количество успешных и неуспешных транзакций
-        successful_payments = Payment.query.filter_by(status='paid').count()
-        failed_payments = Payment.query.filter_by(status='failed').count()
+        payment_counts = dict(db.session.query(PaymentStatusStat.status, PaymentStatusStat.count))
+        successful_payments = payment_counts.get('paid', 0)
+        failed_payments = payment_counts.get('failed', 0)
+
+        # Задержки хэширования и проверки паролей в этом процессе (app/passwords.py)
+        password_latency = [
+            {
+                'operation': operation,
+                'count': snapshot['count'],
+                'average': snapshot['sum'] / snapshot['count'] if snapshot['count'] else None,
+                'p50': passwords.quantile_bound(snapshot, 0.5),
+                'p95': passwords.quantile_bound(snapshot, 0.95),
+                'p99': passwords.quantile_bound(snapshot, 0.99),
+            }
+            for operation, snapshot in passwords.latency_histograms().items()
+        ]
 
         return render_template(
             'statistics.html',
@@ -464,8 +482,11 @@ def statistics():
             active_users=active_users,
             bookings_by_hour=bookings_by_hour,
             inactive_users=inactive_users,
+            inactive_users_count=inactive_users_count,
             successful_payments=successful_payments,
-            failed_payments=failed_payments
+            failed_payments=failed_payments,
+            password_latency=password_latency,
+            latency_max=passwords.LATENCY_BUCKETS[-1]
         )
     except Exception as e:
         logger.error(f"Ошибка при загрузке статистики: {e}")
@@ -8,11 +8,14 @@ from .payments import PaymentResource
 api_bp = Blueprint('api', __name__)
 api = Api(api_bp, prefix='/v1')
 
-from .bookings import BookingListResource, BookingResource
-from .auth import UserLoginResource
+from .bookings import BookingBatchResource, BookingListResource, BookingResource
+from .auth import TokenRefreshResource, TokenRevokeResource, UserLoginResource
 
 # Регистрация ресурсов
 api.add_resource(BookingListResource, '/bookings')
+api.add_resource(BookingBatchResource, '/bookings:batch')
 api.add_resource(BookingResource, '/bookings/<int:booking_id>')
 api.add_resource(UserLoginResource, '/login')
+api.add_resource(TokenRefreshResource, '/token/refresh')
+api.add_resource(TokenRevokeResource, '/token/revoke')
 api.add_resource(PaymentResource, '/payment')
@@ -2,15 +2,46 @@
 
 import logging
 from flask_restful import Resource, reqparse
-from flask_jwt_extended import create_access_token
+from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt, get_jwt_identity, jwt_required
+from sqlalchemy.exc import IntegrityError
 from app.models import User
-from app import bcrypt, db
-from datetime import timedelta
+from app.user_cache import get_user
+from app import db, passwords, token_revocation
 
 auth_parser = reqparse.RequestParser()
 auth_parser.add_argument('email', type=str, required=True, help='Email is required')
 auth_parser.add_argument('password', type=str, required=True, help='Password is required')
 
+
+def issue_tokens(user, family):
+    """
+    Выдаёт пару токенов пользователю.
+
+    Access-токен содержит claim is_admin, поэтому проверка прав в API не
+    загружает пользователя. Refresh-токен содержит цепочку и поколение
+    (family — claims из token_revocation.start_family/rotate_family).
+    Сроки действия — JWT_ACCESS_TOKEN_EXPIRES и JWT_REFRESH_TOKEN_EXPIRES.
+    """
+    return {
+        'access_token': create_access_token(identity=str(user.id), additional_claims={'is_admin': bool(user.is_admin)}),
+        'refresh_token': create_refresh_token(identity=str(user.id), additional_claims=family),
+    }
+
+
+def current_user_is_admin():
+    """
+    Права администратора владельца текущего access-токена.
+
+    Берутся из claim is_admin; для токенов без него (выданных до появления
+    claim) пользователь загружается через кэш.
+    """
+    claims = get_jwt()
+    if 'is_admin' in claims:
+        return bool(claims['is_admin'])
+    user = get_user(int(get_jwt_identity()))
+    return bool(user and user.is_admin)
+
+
 class UserLoginResource(Resource):
     def post(self):
         logging.debug("Received login request")
@@ -19,10 +50,74 @@ class UserLoginResource(Resource):
         password = args['password']
 
         user = User.query.filter_by(email=email).first()
-        if user and bcrypt.check_password_hash(user.password, password):
-            access_token = create_access_token(identity=str(user.id), expires_delta=timedelta(hours=1))
+        if user and passwords.verify_and_update(user, password):
+            family = token_revocation.start_family(user.id)
+            # Сохраняет цепочку refresh-токенов и хэш, пересчитанный при смене BCRYPT_LOG_ROUNDS
+            db.session.commit()
             logging.debug(f"User {user.id} authenticated successfully")
-            return {'access_token': access_token}, 200
+            return issue_tokens(user, family), 200
         else:
             logging.debug("Invalid credentials provided")
-            return {'message': 'Invalid credentials'}, 401
\ No newline at end of file
+            return {'message': 'Invalid credentials'}, 401
+
+
+class TokenRefreshResource(Resource):
+    @jwt_required(refresh=True)
+    def post(self):
+        """
+        Обменять refresh-токен на новую пару токенов
+
+        Использованный refresh-токен становится недействительным (ротация):
+        повторное предъявление того же токена отклоняется с 401 и отзывает
+        всю цепочку токенов этого входа.
+        """
+        try:
+            user_id = int(get_jwt_identity())
+        except ValueError:
+            return {"message": "Invalid token"}, 400
+
+        # Права могли измениться с момента входа, поэтому claim is_admin берётся из актуальных данных
+        user = get_user(user_id)
+        if user is None:
+            return {'message': 'User not found'}, 401
+
+        token = get_jwt()
+        if 'fam' in token:
+            family = token_revocation.rotate_family(token)
+            if family is None:
+                # Отзыв цепочки сохраняется, запрос отклоняется
+                db.session.commit()
+                return {'msg': 'Token has been revoked'}, 401
+        else:
+            # Токен, выданный до появления цепочек: отзывается по jti, обмен начинает новую цепочку
+            token_revocation.revoke(token)
+            family = token_revocation.start_family(user.id)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Тот же токен одновременно обменян в другом запросе
+            db.session.rollback()
+            return {'msg': 'Token has been revoked'}, 401
+
+        logging.debug(f"Tokens refreshed for user {user_id}")
+        return issue_tokens(user, family), 200
+
+
+class TokenRevokeResource(Resource):
+    @jwt_required(verify_type=False)
+    def post(self):
+        """
+        Отозвать предъявленный токен (access или refresh), например при выходе
+
+        Refresh-токен отзывается вместе со всей цепочкой, access-токен — по jti.
+        """
+        token = get_jwt()
+        if token.get('type') == 'refresh' and 'fam' in token:
+            token_revocation.revoke_family(token['fam'])
+        else:
+            token_revocation.revoke(token)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+        return {'message': 'Token revoked'}, 200
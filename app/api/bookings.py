@@ -1,10 +1,19 @@
 # app/api/bookings.py
 
+import hashlib
+import json
+from urllib.parse import urlencode
+
 from flask_restful import Resource, reqparse
-from flask import request
+from flask import Response, request, stream_with_context
+from sqlalchemy.orm.exc import StaleDataError
+from werkzeug.http import quote_etag
 from app import db
-from app.models import Booking, User, Class
+from app.models import Booking, BookingListVersion, Class
+from app.pagination import decode_cursor, keyset_page
+from app.reservations import already_booked, reserve_seat, reserve_seats
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from .auth import current_user_is_admin
 from datetime import datetime, timezone
 
 # Парсер для POST-запросов
@@ -12,11 +21,153 @@ booking_parser = reqparse.RequestParser()
 booking_parser.add_argument('class_id', type=int, required=True, help='Class ID is required')
 booking_parser.add_argument('status', type=str, default='confirmed')
 
+# Поля, доступные в списке бронирований (параметр fields)
+BOOKING_FIELDS = {
+    'id': Booking.id,
+    'class_id': Booking.class_id,
+    'status': Booking.status,
+    'booking_date': Booking.booking_date,
+    'day': Booking.day,
+}
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Размер пакета, которым NDJSON-выгрузка читает бронирования из базы
+STREAM_BATCH_SIZE = 500
+# Максимальное количество элементов в POST /bookings:batch
+MAX_BATCH_ITEMS = 500
+
+
+def parse_fields(value):
+    if not value:
+        return list(BOOKING_FIELDS)
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in BOOKING_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def parse_limit(value):
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+
+def bookings_page(user_id, fields, after, limit):
+    """
+    Страница бронирований пользователя по ключу (booking_date, id).
+
+    Выбираются только нужные столбцы; поиск начала страницы идёт по индексу
+    ix_booking_user_id_booking_date, а не через OFFSET.
+
+    Returns:
+        tuple[list, str | None]: Записи и курсор следующей страницы.
+    """
+    columns = [BOOKING_FIELDS[field] for field in dict.fromkeys(fields + ['booking_date', 'id'])]
+    query = db.session.query(*columns).filter(Booking.user_id == user_id)
+    return keyset_page(query, Booking.booking_date, Booking.id, after, limit)
+
+
+def serialize_booking(row, fields):
+    data = {}
+    for field in fields:
+        value = getattr(row, field)
+        data[field] = value.isoformat() if isinstance(value, datetime) else value
+    return data
+
+
+def booking_etag(booking_id, version):
+    """Слабый ETag бронирования по версии строки."""
+    return f"{booking_id}-{version}"
+
+
+def bookings_list_etag(user_id, fields, cursor, limit):
+    """
+    Слабый ETag страницы бронирований пользователя.
+
+    Строится по версии списка (BookingListVersion), которая увеличивается при
+    любом изменении бронирований пользователя и не повторяется, — это поиск по
+    первичному ключу. Параметры запроса входят в ETag, потому что от них
+    зависит тело ответа.
+    """
+    version = db.session.query(BookingListVersion.version) \
+        .filter(BookingListVersion.user_id == user_id).scalar() or 0
+    key = f"{user_id}:{version}:{','.join(fields)}:{cursor or ''}:{limit}"
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def conditional_headers(etag):
+    # no-cache: клиент хранит ответ, но перепроверяет его через If-None-Match при каждом опросе
+    return {'ETag': quote_etag(etag, weak=True), 'Cache-Control': 'private, no-cache'}
+
+
+def not_modified(etag):
+    """
+    Ответ 304 без тела, если If-None-Match совпадает с etag (слабое сравнение), иначе None.
+    """
+    if request.if_none_match.contains_weak(etag):
+        return Response(status=304, headers=conditional_headers(etag))
+    return None
+
+
+def parse_batch_items(data):
+    """
+    Разбирает тело POST /bookings:batch: {"items": [{"class_id": 1, "day": "Monday"}, ...]}.
+
+    Raises:
+        ValueError: Тело не соответствует формату или элементов больше MAX_BATCH_ITEMS.
+    """
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise ValueError("items must be a non-empty list")
+    if len(items) > MAX_BATCH_ITEMS:
+        raise ValueError(f"At most {MAX_BATCH_ITEMS} items are allowed")
+    parsed = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or type(item.get('class_id')) is not int \
+                or not isinstance(item.get('day'), str):
+            raise ValueError(f"Item {index}: class_id (integer) and day (string) are required")
+        parsed.append((item['class_id'], item['day']))
+    return parsed
+
+
+def stream_bookings(user_id, fields, after):
+    """
+    Выгрузка всех бронирований пользователя после after в формате NDJSON.
+
+    Записи читаются пакетами по STREAM_BATCH_SIZE, поэтому память не зависит
+    от общего количества бронирований.
+    """
+    def generate():
+        position = after
+        while True:
+            rows, next_cursor = bookings_page(user_id, fields, position, STREAM_BATCH_SIZE)
+            for row in rows:
+                yield json.dumps(serialize_booking(row, fields)) + '\n'
+            if next_cursor is None:
+                break
+            position = decode_cursor(next_cursor)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 class BookingListResource(Resource):
     @jwt_required()
     def get(self):
         """
-        Получить список всех бронирований текущего пользователя
+        Получить бронирования текущего пользователя постранично
+
+        Параметры запроса:
+            limit: размер страницы (по умолчанию DEFAULT_PAGE_SIZE, не больше MAX_PAGE_SIZE)
+            cursor: значение X-Next-Cursor предыдущей страницы
+            fields: список полей через запятую, например id,status
+            format: ndjson — выгрузить все бронирования после cursor потоком NDJSON
         """
         user_id = get_jwt_identity()
         try:
@@ -24,16 +175,30 @@ class BookingListResource(Resource):
         except ValueError:
             return {"message": "Invalid token"}, 400
 
-        bookings = Booking.query.filter_by(user_id=user_id).all()
-        return [
-            {
-                'id': b.id,
-                'class_id': b.class_id,
-                'status': b.status,
-                'booking_date': b.booking_date.isoformat(),
-                'day': b.day
-            } for b in bookings
-        ], 200
+        try:
+            fields = parse_fields(request.args.get('fields'))
+            after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+            limit = parse_limit(request.args.get('limit'))
+        except ValueError as e:
+            return {'message': str(e)}, 400
+
+        if request.args.get('format') == 'ndjson':
+            return stream_bookings(user_id, fields, after)
+
+        etag = bookings_list_etag(user_id, fields, request.args.get('cursor'), limit)
+        response = not_modified(etag)
+        if response is not None:
+            return response
+
+        rows, next_cursor = bookings_page(user_id, fields, after, limit)
+        headers = conditional_headers(etag)
+        if next_cursor:
+            next_args = request.args.to_dict()
+            next_args['cursor'] = next_cursor
+            headers['X-Next-Cursor'] = next_cursor
+            headers['Link'] = f'<{request.base_url}?{urlencode(next_args)}>; rel="next"'
+
+        return [serialize_booking(row, fields) for row in rows], 200, headers
 
     @jwt_required()
     def post(self):
@@ -51,56 +216,98 @@ class BookingListResource(Resource):
         if not class_:
             return {'message': 'Class not found'}, 404
 
-        if class_.available_slots() <= 0:
+        # Установка поля 'day' на основе расписания класса. День не выбирается клиентом,
+        # поэтому не сверяется с days_of_week: выбор дня есть в веб-форме и в bookings:batch
+        day = class_.schedule.strftime('%A')  # Например, 'Monday'
+
+        if class_.available_slots(day) <= 0:
             return {'message': 'No available slots for this class'}, 400
 
-        # Проверка, уже есть ли бронирование на этот класс
-        existing_booking = Booking.query.filter_by(user_id=user_id, class_id=class_.id).first()
-        if existing_booking:
+        # Повторное бронирование — по тому же правилу, что в веб-форме и пакетном бронировании
+        if already_booked(user_id, class_.id, day):
             return {'message': 'You have already booked this class'}, 400
 
-        # Установка поля 'day' на основе расписания класса
-        day = class_.schedule.strftime('%A')  # Например, 'Monday'
-
-        booking = Booking(
-            user_id=user_id,
-            class_id=class_.id,
+        booking = reserve_seat(
+            user_id,
+            class_,
+            day,
             status=args['status'],
-            day=day,
             booking_date=datetime.now(timezone.utc)
         )
-        db.session.add(booking)
+        if booking is None:
+            return {'message': 'No available slots for this class'}, 400
         db.session.commit()
 
         return {'message': 'Booking created', 'booking_id': booking.id}, 201
 
+class BookingBatchResource(Resource):
+    @jwt_required()
+    def post(self):
+        """
+        Создать несколько бронирований одним запросом
+
+        Тело: {"items": [{"class_id": 1, "day": "Monday"}, ...]}, не больше MAX_BATCH_ITEMS.
+        Все успешные элементы сохраняются в одной транзакции; в ответе для каждого
+        элемента (в том же порядке) — booking_id или причина отказа.
+        """
+        try:
+            user_id = int(get_jwt_identity())
+        except ValueError:
+            return {"message": "Invalid token"}, 400
+
+        try:
+            items = parse_batch_items(request.get_json(silent=True))
+        except ValueError as e:
+            return {'message': str(e)}, 400
+
+        results = reserve_seats(user_id, items, booking_date=datetime.now(timezone.utc))
+        db.session.commit()
+
+        response = []
+        for (class_id, day), result in zip(items, results):
+            if isinstance(result, Booking):
+                response.append({'class_id': class_id, 'day': day, 'status': 'created', 'booking_id': result.id})
+            else:
+                response.append({'class_id': class_id, 'day': day, 'status': 'error', 'message': result})
+        created = sum(1 for item in response if item['status'] == 'created')
+        return {'created': created, 'failed': len(response) - created, 'results': response}, 200
+
+
 class BookingResource(Resource):
     @jwt_required()
     def get(self, booking_id):
         """
         Получить детали конкретного бронирования
+
+        Поддерживает If-None-Match: если версия бронирования не изменилась,
+        возвращается 304 без загрузки и сериализации строки.
         """
         try:
             user_id = int(get_jwt_identity())
         except ValueError:
             return {"message": "Invalid token"}, 400
 
-        # Используем db.session.get() вместо Query.get()
-        booking = db.session.get(Booking, booking_id)
-        if not booking:
+        # Проверка версии и владельца по первичному ключу, без загрузки всей строки
+        row = db.session.query(Booking.user_id, Booking.version).filter(Booking.id == booking_id).first()
+        if not row:
             return {'message': 'Booking not found'}, 404
 
-        user = db.session.get(User, user_id)
-        if booking.user_id != user_id and not user.is_admin:
+        if row.user_id != user_id and not current_user_is_admin():
             return {'message': 'Access denied'}, 403
 
+        etag = booking_etag(booking_id, row.version)
+        response = not_modified(etag)
+        if response is not None:
+            return response
+
+        booking = db.session.get(Booking, booking_id)
         return {
             'id': booking.id,
             'class_id': booking.class_id,
             'status': booking.status,
             'booking_date': booking.booking_date.isoformat(),
             'day': booking.day
-        }, 200
+        }, 200, conditional_headers(etag)
 
     @jwt_required()
     def put(self, booking_id):
@@ -116,8 +323,7 @@ class BookingResource(Resource):
         if not booking:
             return {'message': 'Booking not found'}, 404
 
-        user = db.session.get(User, user_id)
-        if booking.user_id != user_id and not user.is_admin:
+        if booking.user_id != user_id and not current_user_is_admin():
             return {'message': 'Access denied'}, 403
 
         parser = reqparse.RequestParser()
@@ -125,7 +331,12 @@ class BookingResource(Resource):
         data = parser.parse_args()
 
         booking.status = data['status']
-        db.session.commit()
+        try:
+            db.session.commit()
+        except StaleDataError:
+            # Бронирование изменено или удалено в другом запросе после загрузки
+            db.session.rollback()
+            return {'message': 'Booking was modified by another request'}, 409
 
         return {'message': 'Booking updated'}, 200
 
@@ -143,11 +354,14 @@ class BookingResource(Resource):
         if not booking:
             return {'message': 'Booking not found'}, 404
 
-        user = db.session.get(User, user_id)
-        if booking.user_id != user_id and not user.is_admin:
+        if booking.user_id != user_id and not current_user_is_admin():
             return {'message': 'Access denied'}, 403
 
         db.session.delete(booking)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            return {'message': 'Booking was modified by another request'}, 409
 
         return {'message': 'Booking deleted'}, 200
\ No newline at end of file
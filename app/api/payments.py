@@ -4,7 +4,8 @@ import logging
 from flask_restful import Resource
 from flask import request, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import User, Payment
+from app.models import Payment
+from app.user_cache import get_user
 from app import db
 import stripe
 
@@ -25,7 +26,7 @@ class PaymentResource(Resource):
                 logging.error(f"Invalid user ID in JWT: {current_user_id}")
                 return {"success": False, "error": "Invalid token"}, 400
 
-            user = User.query.get(current_user_id)
+            user = get_user(current_user_id)
             if not user:
                 logging.error(f"User with ID {current_user_id} not found")
                 return {"success": False, "error": "User not found"}, 404
@@ -0,0 +1,179 @@
+# app/audit.py
+
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import current_app, has_app_context, has_request_context, request
+from sqlalchemy import event
+
+from app import db
+from app.models import ActionLog
+
+logger = logging.getLogger(__name__)
+
+_PENDING_KEY = 'audit_pending'
+
+
+class AuditBuffer:
+    """
+    Потокобезопасный ограниченный буфер записей журнала действий процесса.
+
+    Сюда попадают записи запросов, которые ничего не сохраняли в базе
+    (например, страница ошибки или неудачный вход). Буфер сбрасывается
+    пакетной вставкой при достижении flush_size или по истечении flush_interval.
+    """
+
+    def __init__(self):
+        self._records = deque()
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def __len__(self):
+        return len(self._records)
+
+    def extend(self, records):
+        with self._lock:
+            self._records.extend(records)
+
+    def drain(self):
+        with self._lock:
+            records = list(self._records)
+            self._records.clear()
+            self._last_flush = time.monotonic()
+        return records
+
+    def is_due(self, flush_size, flush_interval):
+        if not self._records:
+            return False
+        return len(self._records) >= flush_size or time.monotonic() - self._last_flush >= flush_interval
+
+
+_buffer = AuditBuffer()
+_flusher_lock = threading.Lock()
+_flusher_thread = None
+
+
+def log_action(action, status=None, user_id=None, ip_address=None):
+    """
+    Добавляет запись в журнал действий без отдельного commit.
+
+    Запись вставляется вместе с ближайшим commit текущей сессии; если запрос
+    ничего не сохраняет, запись уходит в буфер процесса и сбрасывается пакетом.
+
+    Args:
+        action (str): Описание действия.
+        status (str | None): Например, 'success', 'failure', 'warning'.
+        user_id (int | None): Идентификатор пользователя.
+        ip_address (str | None): IP-адрес; по умолчанию адрес текущего запроса.
+    """
+    if ip_address is None and has_request_context():
+        ip_address = request.remote_addr
+    record = {
+        'user_id': user_id,
+        'action': action,
+        'timestamp': datetime.utcnow(),
+        'ip_address': ip_address,
+        'status': status,
+    }
+    if has_app_context():
+        db.session.info.setdefault(_PENDING_KEY, []).append(record)
+    else:
+        _buffer.extend([record])
+
+
+@event.listens_for(db.session, 'before_commit')
+def _insert_pending_records(session):
+    """
+    Вставляет накопленные записи журнала в транзакцию основного commit.
+
+    Записи разделяют судьбу транзакции: при откате действие не состоялось,
+    и запись о нём не нужна.
+    """
+    records = session.info.pop(_PENDING_KEY, None)
+    if not records:
+        return
+    session.execute(db.insert(ActionLog), records)
+
+
+def flush():
+    """
+    Записывает все буферизованные записи одной пакетной вставкой.
+
+    Returns:
+        int: Количество записанных записей.
+    """
+    records = _buffer.drain()
+    if not records:
+        return 0
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(db.insert(ActionLog), records)
+    except Exception as e:
+        logger.error(f"Не удалось записать {len(records)} записей журнала действий: {e}")
+        max_size = current_app.config.get('AUDIT_BUFFER_MAX_SIZE', 10000)
+        # Возвращаем записи в буфер, не превышая его предельного размера
+        _buffer.extend(records[:max(0, max_size - len(_buffer))])
+        return 0
+    return len(records)
+
+
+def _release_pending_records(exception=None):
+    """
+    Переносит записи текущего запроса в буфер процесса при завершении контекста
+    и сбрасывает буфер, если достигнут порог размера или времени.
+    """
+    records = db.session.info.pop(_PENDING_KEY, None)
+
+    config = current_app.config
+    max_size = config.get('AUDIT_BUFFER_MAX_SIZE', 10000)
+    if records:
+        # Ограничение размера буфера: при переполнении сбрасываем его синхронно
+        if len(_buffer) + len(records) > max_size:
+            flush()
+        _buffer.extend(records)
+
+    if _buffer.is_due(config.get('AUDIT_FLUSH_SIZE', 500), config.get('AUDIT_FLUSH_INTERVAL', 5)):
+        flush()
+    _ensure_flusher(current_app._get_current_object())
+
+
+def _run_flusher(app):
+    interval = app.config.get('AUDIT_FLUSH_INTERVAL', 5)
+    while True:
+        time.sleep(interval)
+        if len(_buffer):
+            with app.app_context():
+                flush()
+
+
+def _ensure_flusher(app):
+    """Запускает фоновый поток, сбрасывающий буфер по времени, когда запросов нет."""
+    global _flusher_thread
+    if app.testing or (_flusher_thread is not None and _flusher_thread.is_alive()):
+        return
+    with _flusher_lock:
+        if _flusher_thread is None or not _flusher_thread.is_alive():
+            _flusher_thread = threading.Thread(target=_run_flusher, args=(app,), name='audit-flusher', daemon=True)
+            _flusher_thread.start()
+
+
+def init_app(app):
+    """
+    Подключает буферизованный журнал действий к приложению.
+
+    Args:
+        app (Flask): Экземпляр приложения.
+    """
+    # Запросы и контексты без запроса (CLI, фоновые потоки) освобождают записи одинаково
+    app.teardown_request(_release_pending_records)
+    app.teardown_appcontext(_release_pending_records)
+
+    def flush_on_exit():
+        with app.app_context():
+            flush()
+
+    atexit.register(flush_on_exit)
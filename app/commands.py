@@ -0,0 +1,154 @@
+# app/commands.py
+
+import click
+from flask.cli import with_appcontext
+
+
+@click.command('rebuild-seat-counters')
+@with_appcontext
+def rebuild_seat_counters_command():
+    """Пересчитывает таблицу class_seat_counter по подтверждённым бронированиям."""
+    from app.seats import rebuild_seat_counters
+
+    rows = rebuild_seat_counters()
+    click.echo(f"Счётчики мест пересчитаны: {rows} строк.")
+
+
+@click.command('rebuild-statistics')
+@with_appcontext
+def rebuild_statistics_command():
+    """Пересчитывает сводки статистики user_booking_stat и payment_status_stat."""
+    from app.stats import rebuild_statistics
+
+    user_rows, payment_rows = rebuild_statistics()
+    click.echo(f"Сводки статистики пересчитаны: {user_rows} строк по пользователям, {payment_rows} по статусам платежей.")
+
+
+@click.command('send-emails')
+@click.option('--loop', is_flag=True, help='Работать постоянно, опрашивая очередь.')
+@click.option('--batch-size', type=int, default=None, help='Количество писем в одном пакете.')
+@with_appcontext
+def send_emails_command(loop, batch_size):
+    """Отправляет письма из очереди outbox_email."""
+    from flask import current_app
+    from app.mailer import outbox, send_pending_emails
+
+    if loop:
+        outbox.drain(current_app._get_current_object())
+        return
+
+    total = 0
+    while True:
+        sent = send_pending_emails(batch_size)
+        if not sent:
+            break
+        total += sent
+    click.echo(f"Отправлено писем: {total}.")
+
+
+@click.command('process-stripe-events')
+@click.option('--loop', is_flag=True, help='Работать постоянно, опрашивая очередь.')
+@click.option('--batch-size', type=int, default=None, help='Количество событий в одном пакете.')
+@click.option('--requeue-dead', is_flag=True, help='Вернуть в очередь события со статусом dead.')
+@with_appcontext
+def process_stripe_events_command(loop, batch_size, requeue_dead):
+    """Обрабатывает события вебхука Stripe из очереди stripe_event."""
+    from flask import current_app
+    from app.stripe_events import process_pending_events, requeue_dead_events, stripe_event_queue
+
+    if requeue_dead:
+        click.echo(f"Возвращено в очередь событий: {requeue_dead_events()}.")
+
+    if loop:
+        stripe_event_queue.drain(current_app._get_current_object())
+        return
+
+    total = 0
+    while True:
+        processed = process_pending_events(batch_size)
+        if not processed:
+            break
+        total += processed
+    click.echo(f"Обработано событий: {total}.")
+
+
+@click.command('generate-image-variants')
+@click.option('--force', is_flag=True, help='Пересоздать уже существующие производные изображения.')
+@with_appcontext
+def generate_image_variants_command(force):
+    """Создаёт миниатюры и WebP для изображений классов и аватаров."""
+    import os
+    from flask import current_app
+    from app import images
+
+    if images.Image is None:
+        raise click.ClickException('Pillow не установлен.')
+
+    created = 0
+    for filename in sorted(images.referenced_images()):
+        if not os.path.exists(os.path.join(current_app.config['UPLOAD_FOLDER'], filename)):
+            click.echo(f"Файл не найден: {filename}", err=True)
+            continue
+        if not force and images.load_manifest(filename) is not None:
+            continue
+        try:
+            images.create_variants(filename)
+            created += 1
+        except Exception as e:
+            click.echo(f"Ошибка обработки {filename}: {e}", err=True)
+    click.echo(f"Производные изображения созданы для {created} файлов.")
+
+
+@click.command('gc-images')
+@click.option('--dry-run', is_flag=True, help='Только показать файлы, которые будут удалены.')
+@click.option('--grace-period', type=int, default=3600, show_default=True,
+              help='Не удалять файлы моложе указанного числа секунд.')
+@with_appcontext
+def gc_images_command(dry_run, grace_period):
+    """Удаляет изображения, на которые не ссылаются классы и пользователи."""
+    from app.images import collect_garbage
+
+    garbage = collect_garbage(grace_period=grace_period, dry_run=dry_run)
+    for path in garbage:
+        click.echo(path)
+    verb = 'Будет удалено' if dry_run else 'Удалено'
+    click.echo(f"{verb} файлов: {len(garbage)}.")
+
+
+@click.command('prune-revoked-tokens')
+@with_appcontext
+def prune_revoked_tokens_command():
+    """Удаляет записи об отозванных JWT, срок действия которых истёк."""
+    from app.token_revocation import prune_expired
+
+    click.echo(f"Удалено записей об отозванных токенах: {prune_expired()}.")
+
+
+@click.command('reset-metrics')
+@with_appcontext
+def reset_metrics_command():
+    """Удаляет снимки метрик процессов из METRICS_DIR (перед запуском воркеров)."""
+    from flask import current_app
+
+    metrics = current_app.extensions.get('metrics')
+    if metrics is None or metrics.store is None:
+        click.echo("Каталог метрик не используется.")
+        return
+    click.echo(f"Удалено снимков метрик: {metrics.store.clear()}.")
+
+
+def register_commands(app):
+    """
+    Регистрирует CLI-команды приложения (flask <command>).
+
+    Args:
+        app (Flask): Экземпляр приложения.
+    """
+    app.cli.add_command(rebuild_seat_counters_command)
+    app.cli.add_command(rebuild_statistics_command)
+    app.cli.add_command(send_emails_command)
+    app.cli.add_command(process_stripe_events_command)
+    app.cli.add_command(generate_image_variants_command)
+    app.cli.add_command(gc_images_command)
+    app.cli.add_command(prune_revoked_tokens_command)
+    app.cli.add_command(reset_metrics_command)
@@ -0,0 +1,121 @@
+# app/db_profiles.py
+
+import logging
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+PROFILES = ('sqlite', 'postgres', 'none')
+
+
+def normalize_database_uri(uri):
+    """
+    Приводит URI вида postgres:// (Heroku, Render и др.) к postgresql://,
+    который понимает SQLAlchemy 2.
+    """
+    if uri and uri.startswith('postgres://'):
+        return 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def resolve_profile(config):
+    """
+    Определяет профиль движка: DB_PROFILE или, при 'auto', схема SQLALCHEMY_DATABASE_URI.
+
+    Raises:
+        ValueError: Неизвестный профиль.
+    """
+    profile = config.get('DB_PROFILE', 'auto')
+    if profile == 'auto':
+        uri = config.get('SQLALCHEMY_DATABASE_URI') or ''
+        if uri.startswith('sqlite'):
+            return 'sqlite'
+        if uri.startswith('postgresql'):
+            return 'postgres'
+        return 'none'
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE: {profile}")
+    return profile
+
+
+def engine_options(config, profile):
+    """
+    Параметры create_engine для профиля.
+
+    Postgres: пул фиксированного размера с переполнением, пересоздание соединений
+    старше DB_POOL_RECYCLE секунд (раньше, чем их закроет сервер или PgBouncer)
+    и проверка соединения перед выдачей из пула.
+    SQLite: ожидание блокировки на уровне драйвера; PRAGMA применяются в init_app().
+    """
+    if profile == 'postgres':
+        return {
+            'pool_size': config.get('DB_POOL_SIZE', 10),
+            'max_overflow': config.get('DB_MAX_OVERFLOW', 20),
+            'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+            'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+            'pool_pre_ping': True,
+        }
+    if profile == 'sqlite':
+        return {
+            'connect_args': {'timeout': config.get('SQLITE_BUSY_TIMEOUT', 5000) / 1000},
+        }
+    return {}
+
+
+def sqlite_pragmas(config):
+    """PRAGMA, выполняемые на каждом новом соединении SQLite."""
+    return {
+        'journal_mode': config.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': config.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': config.get('SQLITE_BUSY_TIMEOUT', 5000),
+    }
+
+
+def configure(app):
+    """
+    Выбирает профиль движка и дополняет SQLALCHEMY_ENGINE_OPTIONS.
+
+    Вызывается до db.init_app(). Явно заданные в SQLALCHEMY_ENGINE_OPTIONS
+    параметры имеют приоритет над профилем.
+
+    Args:
+        app (Flask): Экземпляр приложения.
+    """
+    config = app.config
+    config['SQLALCHEMY_DATABASE_URI'] = normalize_database_uri(config.get('SQLALCHEMY_DATABASE_URI'))
+    profile = resolve_profile(config)
+    config['DB_PROFILE'] = profile
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **engine_options(config, profile),
+        **config.get('SQLALCHEMY_ENGINE_OPTIONS', {}),
+    }
+
+
+def init_app(app):
+    """
+    Подключает PRAGMA профиля SQLite к движку приложения.
+
+    Вызывается после db.init_app(), когда движок уже создан.
+
+    Args:
+        app (Flask): Экземпляр приложения.
+    """
+    if app.config.get('DB_PROFILE') != 'sqlite':
+        return
+
+    from app import db
+
+    pragmas = sqlite_pragmas(app.config)
+
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    with app.app_context():
+        event.listen(db.engine, 'connect', _apply_pragmas)
+    logger.info(f"SQLite pragmas enabled: {pragmas}")
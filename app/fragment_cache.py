@@ -0,0 +1,218 @@
+# app/fragment_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context, render_template
+from markupsafe import Markup
+from sqlalchemy import event, inspect
+
+from app import db, images
+from app.models import Booking, Class
+from app.seats import old_values
+
+_BUMP_KEY = 'fragment_cache_bump'
+
+# Версия списка классов: меняется при добавлении, удалении и изменении любого класса
+CLASSES_VERSION = 'classes'
+
+# Порядок карточек на страницах: главная — по id, /classes — по расписанию
+ORDERINGS = {
+    'id': (Class.id,),
+    'schedule': (Class.schedule, Class.id),
+}
+
+
+def class_version_key(class_id):
+    return f'class:{class_id}'
+
+
+class FragmentCache:
+    """
+    Кэш отрендеренных фрагментов шаблонов с вытеснением LRU.
+
+    Размер ограничен числом записей и суммарной длиной фрагментов. Ключи
+    фрагментов включают версии (version()): bump() делает устаревшими все
+    фрагменты, построенные до изменения, не перебирая кэш. Версии не
+    сбрасываются, поэтому старая запись не может снова стать актуальной.
+    """
+
+    def __init__(self, ttl=30, max_entries=5000, max_bytes=16 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, size, value = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+    def version(self, name):
+        with self._lock:
+            return self._versions.get(name, 0)
+
+    def bump(self, *names):
+        with self._lock:
+            for name in names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _get_cache():
+    return current_app.extensions.get('fragment_cache') if has_app_context() else None
+
+
+def _render_card(template, class_):
+    return Markup(render_template(template, class_=class_, extended=False))
+
+
+def _is_final(class_):
+    # Пока производные изображения создаются в фоне, карточка выводит оригинал;
+    # такую карточку не кэшируем, чтобы не закрепить её до следующего изменения класса
+    return not class_.image_filename or images.Image is None or \
+        images.load_manifest(class_.image_filename) is not None
+
+
+def class_cards(template, order_by='id'):
+    """
+    Отрендеренные карточки всех классов для публичных страниц.
+
+    Список id классов и каждая карточка кэшируются с ключом по версии:
+    карточка — по версии класса (изменение класса или его бронирований),
+    список — по версии списка классов. При полном попадании в кэш запросов
+    к базе нет; при частичном загружаются только недостающие классы.
+
+    Args:
+        template (str): Шаблон карточки, получает class_ и extended=False.
+        order_by (str): Порядок карточек из ORDERINGS.
+
+    Returns:
+        list[Markup]: HTML карточек.
+    """
+    order = ORDERINGS[order_by]
+    cache = _get_cache()
+    if cache is None:
+        classes = Class.query.order_by(*order).all()
+        Class.preload_available_slots(classes)
+        return [_render_card(template, class_) for class_ in classes]
+
+    ids_key = ('class_ids', order_by, cache.version(CLASSES_VERSION))
+    class_ids = cache.get(ids_key)
+    loaded = None
+    if class_ids is None:
+        # Список устарел: классы загружаются целиком, из них же строятся недостающие карточки
+        loaded = Class.query.order_by(*order).all()
+        class_ids = [class_.id for class_ in loaded]
+        cache.set(ids_key, class_ids, size=8 * len(class_ids))
+
+    keys = {
+        class_id: ('class_card', template, class_id, cache.version(class_version_key(class_id)))
+        for class_id in class_ids
+    }
+    cards = {class_id: cache.get(key) for class_id, key in keys.items()}
+    missing = {class_id for class_id, card in cards.items() if card is None}
+    if missing:
+        if loaded is None:
+            classes = Class.query.filter(Class.id.in_(missing)).all()
+        else:
+            classes = [class_ for class_ in loaded if class_.id in missing]
+        Class.preload_available_slots(classes)
+        for class_ in classes:
+            card = _render_card(template, class_)
+            cards[class_.id] = card
+            if _is_final(class_):
+                cache.set(keys[class_.id], card, size=len(card))
+    return [cards[class_id] for class_id in class_ids if cards[class_id] is not None]
+
+
+def invalidate_class(class_id):
+    """Делает устаревшей карточку класса (например, после изменения в обход сессии)."""
+    cache = _get_cache()
+    if cache is not None:
+        cache.bump(CLASSES_VERSION, class_version_key(class_id))
+
+
+@event.listens_for(db.session, 'before_flush')
+def _collect_changed_classes(session, flush_context, instances):
+    """
+    Собирает версии, которые нужно увеличить после commit: изменённые классы
+    и классы, у которых изменились бронирования.
+    """
+    names = session.info.setdefault(_BUMP_KEY, set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Class):
+            names.add(CLASSES_VERSION)
+            if obj.id is not None:
+                names.add(class_version_key(obj.id))
+        elif isinstance(obj, Booking):
+            if obj.class_id is not None:
+                names.add(class_version_key(obj.class_id))
+            old = old_values(session, inspect(obj), ('class_id',))
+            if old and old.get('class_id') is not None:
+                names.add(class_version_key(old['class_id']))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _bump_committed_versions(session):
+    names = session.info.pop(_BUMP_KEY, None)
+    cache = _get_cache()
+    if names and cache is not None:
+        cache.bump(*names)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_changed_classes(session):
+    session.info.pop(_BUMP_KEY, None)
+
+
+def init_app(app):
+    """
+    Подключает кэш фрагментов (FRAGMENT_CACHE_TTL, FRAGMENT_CACHE_MAX_ENTRIES,
+    FRAGMENT_CACHE_MAX_BYTES).
+
+    Кэш локален для процесса: изменения, сделанные в других воркерах,
+    становятся видны не позднее чем через FRAGMENT_CACHE_TTL секунд.
+
+    Args:
+        app (Flask): Экземпляр приложения.
+    """
+    if app.config.get('FRAGMENT_CACHE_TTL', 30) > 0:
+        app.extensions['fragment_cache'] = FragmentCache(
+            ttl=app.config.get('FRAGMENT_CACHE_TTL', 30),
+            max_entries=app.config.get('FRAGMENT_CACHE_MAX_ENTRIES', 5000),
+            max_bytes=app.config.get('FRAGMENT_CACHE_MAX_BYTES', 16 * 1024 * 1024),
+        )
@@ -0,0 +1,417 @@
+# app/images.py
+
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, send_from_directory, url_for
+from markupsafe import Markup, escape
+
+from app.uploads import UploadStream, upload_stream
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow не установлен: шаблоны используют оригиналы
+    Image = ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+# Размеры производных изображений: (ширина, высота) в пикселях с запасом для экранов 2x.
+# crop=True обрезает изображение по центру до точного размера, иначе оно вписывается в рамку.
+DEFAULT_VARIANTS = {
+    'thumb': {'size': (100, 100), 'crop': True},  # Аватары и миниатюры 50x50
+    'small': {'size': (400, 400)},                # Превью шириной 200px
+    'card': {'size': (800, 800)},                 # Карточки классов
+}
+
+# Имя файла по хэшу содержимого: загрузки (app.images.store_upload) и производные изображения
+CONTENT_HASH_RE = re.compile(r'^([0-9a-f]{32})\.[a-z0-9]+$')
+_CHUNK_SIZE = 64 * 1024
+
+_executor_lock = threading.Lock()
+_executor = None
+
+# Манифесты производных изображений процесса. Манифест не меняется, пока не изменится
+# исходный файл (имена загрузок уникальны), поэтому кэшируются только найденные манифесты.
+_MANIFEST_CACHE_SIZE = 4096
+_manifest_cache = OrderedDict()
+_manifest_lock = threading.Lock()
+
+
+def variants_folder():
+    """Каталог производных изображений и их манифестов."""
+    return current_app.config.get('IMAGE_VARIANTS_FOLDER') or \
+        os.path.join(current_app.config['UPLOAD_FOLDER'], 'variants')
+
+
+def _manifest_path(folder, filename):
+    return os.path.join(folder, f"{filename}.json")
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _encode(image, format, **params):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **params)
+    return buffer.getvalue()
+
+
+def _content_name(digest, extension):
+    return f"{digest.hexdigest()[:32]}.{extension}"
+
+
+def _store(folder, data, extension):
+    """Сохраняет файл под именем из хэша содержимого; одинаковые файлы записываются один раз."""
+    name = _content_name(hashlib.sha256(data), extension)
+    path = os.path.join(folder, name)
+    if not os.path.exists(path):
+        _write_atomic(path, data)
+    return name
+
+
+def store_upload(file_storage):
+    """
+    Сохраняет загруженное изображение в UPLOAD_FOLDER под именем из хэша содержимого.
+
+    Файлы из запроса уже записаны UploadRequest во временный файл в UPLOAD_TMP_FOLDER
+    и только переименовываются; другие потоки (например, FileStorage в тестах)
+    копируются блоками через UploadStream. Расширение определяется по сигнатуре.
+    Если такой файл уже есть (повторная загрузка), используется он.
+
+    Args:
+        file_storage (FileStorage): Загруженный файл.
+
+    Returns:
+        str: Имя файла вида <sha256[:32]>.<расширение>.
+
+    Raises:
+        InvalidImageError: Файл не является изображением допустимого формата.
+    """
+    stream = file_storage.stream
+    if not isinstance(stream, UploadStream):
+        stream = upload_stream()
+        try:
+            for chunk in iter(lambda: file_storage.stream.read(_CHUNK_SIZE), b''):
+                stream.write(chunk)
+            return stream.commit()
+        finally:
+            stream.close()
+    return stream.commit()
+
+
+def generate_variants(source_path, folder, variants=None, webp_quality=80, jpeg_quality=85):
+    """
+    Создаёт производные изображения и записывает их манифест.
+
+    Для каждого размера сохраняются WebP и запасной вариант (PNG для изображений
+    с прозрачностью, иначе JPEG). Файлы называются по хэшу содержимого.
+
+    Args:
+        source_path (str): Путь к исходному изображению.
+        folder (str): Каталог производных изображений.
+        variants (dict | None): Размеры, по умолчанию DEFAULT_VARIANTS.
+        webp_quality (int): Качество WebP.
+        jpeg_quality (int): Качество JPEG.
+
+    Returns:
+        dict: Манифест {'variants': {name: {'webp', 'fallback', 'width', 'height'}}}.
+
+    Raises:
+        RuntimeError: Pillow не установлен.
+    """
+    if Image is None:
+        raise RuntimeError("Pillow is not installed")
+    variants = variants or DEFAULT_VARIANTS
+    os.makedirs(folder, exist_ok=True)
+
+    with Image.open(source_path) as original:
+        original = ImageOps.exif_transpose(original)
+        has_alpha = original.mode in ('RGBA', 'LA') or 'transparency' in original.info
+        original = original.convert('RGBA' if has_alpha else 'RGB')
+
+        manifest = {'variants': {}}
+        for name, spec in variants.items():
+            size = tuple(spec['size'])
+            if spec.get('crop'):
+                image = ImageOps.fit(original, size, Image.Resampling.LANCZOS)
+            else:
+                image = original.copy()
+                image.thumbnail(size, Image.Resampling.LANCZOS)
+
+            webp = _encode(image, 'WEBP', quality=webp_quality, method=6)
+            if has_alpha:
+                fallback = _store(folder, _encode(image, 'PNG', optimize=True), 'png')
+            else:
+                fallback = _store(
+                    folder, _encode(image, 'JPEG', quality=jpeg_quality, optimize=True, progressive=True), 'jpg'
+                )
+            manifest['variants'][name] = {
+                'webp': _store(folder, webp, 'webp'),
+                'fallback': fallback,
+                'width': image.width,
+                'height': image.height,
+            }
+
+    _write_atomic(_manifest_path(folder, os.path.basename(source_path)), json.dumps(manifest).encode())
+    return manifest
+
+
+def create_variants(filename):
+    """
+    Создаёт производные изображения файла из UPLOAD_FOLDER с настройками приложения.
+
+    Args:
+        filename (str): Имя файла в UPLOAD_FOLDER.
+
+    Returns:
+        dict: Манифест производных изображений.
+    """
+    config = current_app.config
+    manifest = generate_variants(
+        os.path.join(config['UPLOAD_FOLDER'], filename),
+        variants_folder(),
+        variants=config.get('IMAGE_VARIANTS'),
+        webp_quality=config.get('IMAGE_WEBP_QUALITY', 80),
+        jpeg_quality=config.get('IMAGE_JPEG_QUALITY', 85),
+    )
+    forget_manifest(filename)
+    return manifest
+
+
+def _generate_for_app(app, filename):
+    with app.app_context():
+        try:
+            create_variants(filename)
+            logger.info(f"Производные изображения для {filename} созданы.")
+        except Exception as e:
+            logger.error(f"Ошибка создания производных изображений для {filename}: {e}")
+
+
+def _get_executor(app):
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=app.config.get('IMAGE_WORKERS', 2), thread_name_prefix='image-variants'
+                )
+    return _executor
+
+
+def schedule_variants(filename):
+    """
+    Ставит создание производных изображений для загруженного файла в пул потоков.
+
+    В тестах (app.testing) изображения создаются сразу. Без Pillow ничего не делает.
+
+    Args:
+        filename (str): Имя файла в UPLOAD_FOLDER.
+    """
+    if Image is None or not filename or load_manifest(filename) is not None:
+        return
+    app = current_app._get_current_object()
+    if app.testing:
+        _generate_for_app(app, filename)
+    else:
+        _get_executor(app).submit(_generate_for_app, app, filename)
+
+
+def load_manifest(filename):
+    """
+    Манифест производных изображений файла или None, если они ещё не созданы.
+    """
+    folder = variants_folder()
+    key = (folder, filename)
+    with _manifest_lock:
+        manifest = _manifest_cache.get(key)
+        if manifest is not None:
+            _manifest_cache.move_to_end(key)
+            return manifest
+    try:
+        with open(_manifest_path(folder, filename), 'rb') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    with _manifest_lock:
+        _manifest_cache[key] = manifest
+        while len(_manifest_cache) > _MANIFEST_CACHE_SIZE:
+            _manifest_cache.popitem(last=False)
+    return manifest
+
+
+def forget_manifest(filename):
+    """Удаляет манифест файла из кэша процесса (например, после пересоздания)."""
+    with _manifest_lock:
+        _manifest_cache.pop((variants_folder(), filename), None)
+
+
+def _static_path(path):
+    return os.path.relpath(path, current_app.static_folder).replace(os.sep, '/')
+
+
+def image_url(filename, variant=None):
+    """
+    URL изображения из UPLOAD_FOLDER: запасной вариант нужного размера,
+    если он создан, иначе оригинал.
+    """
+    entry = (load_manifest(filename) or {}).get('variants', {}).get(variant) if variant else None
+    if entry is None:
+        path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+    else:
+        path = os.path.join(variants_folder(), entry['fallback'])
+    return url_for('static', filename=_static_path(path))
+
+
+def picture(filename, variant, alt='', **attrs):
+    """
+    Шаблонный хелпер: <picture> с WebP и запасным вариантом нужного размера.
+
+    Если производные изображения ещё не созданы, выводится <img> с оригиналом.
+    Атрибут class передаётся как class_.
+
+    Пример:
+        {{ picture(class_.image_filename, 'card', alt=class_.name, class_='card-img-top') }}
+    """
+    entry = (load_manifest(filename) or {}).get('variants', {}).get(variant)
+    if 'class_' in attrs:
+        attrs['class'] = attrs.pop('class_')
+    attrs.setdefault('loading', 'lazy')
+    if entry is not None and 'width' not in attrs and 'height' not in attrs:
+        attrs.update(width=entry['width'], height=entry['height'])
+    img_attrs = ''.join(f' {name}="{escape(value)}"' for name, value in attrs.items())
+    img = Markup(f'<img src="{escape(image_url(filename, variant))}" alt="{escape(alt)}"{img_attrs}>')
+    if entry is None:
+        return img
+    webp_url = url_for('static', filename=_static_path(os.path.join(variants_folder(), entry['webp'])))
+    return Markup(f'<picture><source srcset="{escape(webp_url)}" type="image/webp">{img}</picture>')
+
+
+def referenced_images():
+    """Имена файлов UPLOAD_FOLDER, на которые ссылаются классы и пользователи."""
+    from app import db
+    from app.models import Class, User
+
+    filenames = {name for (name,) in db.session.query(Class.image_filename).filter(Class.image_filename.isnot(None))}
+    filenames.update(name for (name,) in db.session.query(User.avatar).filter(User.avatar.isnot(None)))
+    return filenames
+
+
+def _is_upload_tmp(name):
+    return name.startswith('.upload.') and name.endswith('.tmp')
+
+
+def collect_garbage(grace_period=3600, dry_run=False):
+    """
+    Удаляет загрузки с именами по хэшу, на которые не ссылаются Class.image_filename
+    и User.avatar, их манифесты и производные изображения, не нужные ни одному манифесту,
+    а также оставшиеся временные файлы загрузок.
+
+    Файлы моложе grace_period секунд не удаляются: их загрузка могла ещё не
+    завершиться commit. Файлы со старыми именами (до хранения по хэшу) не трогаются.
+
+    Args:
+        grace_period (int): Минимальный возраст удаляемого файла в секундах.
+        dry_run (bool): Только вернуть список файлов, ничего не удаляя.
+
+    Returns:
+        list[str]: Пути удалённых (или подлежащих удалению) файлов.
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    tmp_folder = current_app.config.get('UPLOAD_TMP_FOLDER') or upload_folder
+    folder = variants_folder()
+    referenced = referenced_images()
+    cutoff = time.time() - grace_period
+    garbage = []
+
+    for name in os.listdir(upload_folder):
+        path = os.path.join(upload_folder, name)
+        # Временные файлы в UPLOAD_FOLDER могли остаться от версий, писавших их туда
+        unused = (CONTENT_HASH_RE.match(name) and name not in referenced) or _is_upload_tmp(name)
+        if unused and os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+            garbage.append(path)
+    # Временные файлы загрузок остаются, если процесс упал во время загрузки
+    if tmp_folder != upload_folder and os.path.isdir(tmp_folder):
+        for name in os.listdir(tmp_folder):
+            path = os.path.join(tmp_folder, name)
+            if _is_upload_tmp(name) and os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                garbage.append(path)
+    removed_sources = {os.path.basename(path) for path in garbage}
+
+    # Манифест удаляется вместе с исходным файлом; варианты остальных манифестов сохраняются
+    names = os.listdir(folder) if os.path.isdir(folder) else []
+    kept_variants = set()
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(folder, name)
+        source = name[:-len('.json')]
+        if source in removed_sources or not os.path.exists(os.path.join(upload_folder, source)):
+            garbage.append(path)
+            continue
+        try:
+            with open(path, 'rb') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for entry in manifest.get('variants', {}).values():
+            kept_variants.update((entry['webp'], entry['fallback']))
+
+    for name in names:
+        path = os.path.join(folder, name)
+        if CONTENT_HASH_RE.match(name) and name not in kept_variants and os.path.getmtime(path) < cutoff:
+            garbage.append(path)
+
+    if not dry_run:
+        for path in garbage:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            if path.endswith('.json'):
+                forget_manifest(os.path.basename(path)[:-len('.json')])
+        logger.info(f"Удалено неиспользуемых файлов изображений: {len(garbage)}.")
+    return garbage
+
+
+def _send_static_file(filename):
+    """
+    Статика приложения; файлы с именами по хэшу содержимого отдаются с
+    Cache-Control: immutable на IMAGE_CACHE_MAX_AGE и ETag, равным хэшу.
+    """
+    match = CONTENT_HASH_RE.match(filename.rsplit('/', 1)[-1])
+    if match is None:
+        return current_app.send_static_file(filename)
+    response = send_from_directory(
+        current_app.static_folder, filename,
+        max_age=current_app.config.get('IMAGE_CACHE_MAX_AGE', 31536000), etag=match.group(1)
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    """
+    Подключает шаблонные хелперы picture() и image_url() и заголовки
+    кэширования для файлов с именами по хэшу.
+
+    Args:
+        app (Flask): Экземпляр приложения.
+    """
+    app.jinja_env.globals.update(picture=picture, image_url=image_url)
+    if 'static' in app.view_functions:
+        app.view_functions['static'] = _send_static_file
+    if Image is None:
+        logger.warning("Pillow не установлен: производные изображения не создаются.")
@@ -0,0 +1,107 @@
+# app/mailer.py
+
+import logging
+from datetime import datetime
+
+from flask import current_app
+from flask_mail import Message
+
+from app import db, mail
+from app.models import OutboxEmail, User
+from app.work_queue import WorkQueue
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(subject, recipients=None, body=None, html=None, to_admins=False):
+    """
+    Ставит письмо в очередь на отправку.
+
+    Письмо добавляется в текущую сессию и сохраняется вместе с основным
+    commit запроса; сам запрос не ждёт SMTP.
+
+    Args:
+        subject (str): Тема письма.
+        recipients (list[str] | None): Адреса получателей.
+        body (str | None): Текстовая версия письма.
+        html (str | None): HTML-версия письма.
+        to_admins (bool): Отправить всем администраторам.
+
+    Returns:
+        OutboxEmail: Созданная запись очереди.
+    """
+    email = OutboxEmail(
+        subject=subject,
+        recipients=','.join(recipients or []),
+        to_admins=to_admins,
+        body=body,
+        html=html
+    )
+    db.session.add(email)
+    outbox.notify()
+    return email
+
+
+def _build_message(email, admin_emails):
+    recipients = [address for address in (email.recipients or '').split(',') if address]
+    if email.to_admins:
+        recipients.extend(admin_emails)
+    return Message(
+        email.subject,
+        recipients=recipients,
+        body=email.body,
+        html=email.html,
+        sender=current_app.config.get('MAIL_DEFAULT_SENDER')
+    )
+
+
+def send_pending_emails(batch_size=None):
+    """
+    Отправляет один пакет писем из очереди через одно SMTP-соединение.
+
+    Неудачные письма откладываются с экспоненциальной задержкой; после
+    MAIL_OUTBOX_MAX_ATTEMPTS попыток письмо помечается как 'failed'
+    (см. WorkQueue.schedule_retry).
+
+    Args:
+        batch_size (int | None): Размер пакета, по умолчанию MAIL_OUTBOX_BATCH_SIZE.
+
+    Returns:
+        int: Количество успешно отправленных писем.
+    """
+    email_ids = outbox.claim_due(outbox.batch_size(batch_size))
+    if not email_ids:
+        return 0
+    emails = OutboxEmail.query.filter(OutboxEmail.id.in_(email_ids)).all()
+
+    admin_emails = []
+    if any(email.to_admins for email in emails):
+        admin_emails = [address for (address,) in db.session.query(User.email).filter_by(is_admin=True)]
+
+    sent = 0
+    try:
+        with mail.connect() as connection:
+            for email in emails:
+                try:
+                    message = _build_message(email, admin_emails)
+                    if message.send_to:
+                        connection.send(message)
+                    email.status = 'sent'
+                    email.sent_at = datetime.utcnow()
+                    email.last_error = None
+                    sent += 1
+                except Exception as e:
+                    outbox.schedule_retry(email, e)
+    except Exception as e:
+        # Не удалось установить SMTP-соединение: откладываем весь пакет
+        logger.error(f"Ошибка подключения к SMTP-серверу: {e}")
+        for email in emails:
+            if email.status == 'pending':
+                outbox.schedule_retry(email, e)
+
+    db.session.commit()
+    logger.info(f"Outbox: sent {sent} of {len(emails)} emails.")
+    return sent
+
+
+outbox = WorkQueue(OutboxEmail, 'MAIL_OUTBOX', send_pending_emails, name='outbox-worker', label='Письмо ID {}')
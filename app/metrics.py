@@ -0,0 +1,485 @@
+# app/metrics.py
+
+import hmac
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: без блокировки, там приложение работает одним процессом
+    fcntl = None
+
+from flask import Response, abort, current_app, g, request
+from flask_login import current_user
+
+from app.query_stats import current_request_queries
+from app.rate_limits import limiter
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин: длительность запроса (секунды) и количество SQL-запросов на HTTP-запрос
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Имя метрики → (тип, описание)
+METRICS = {
+    'http_requests_total': ('counter', 'HTTP requests by endpoint, method and status code.'),
+    'http_request_duration_seconds': ('histogram', 'HTTP request latency by endpoint and method.'),
+    'http_requests_in_progress': ('gauge', 'HTTP requests currently being handled, by endpoint.'),
+    'http_request_db_queries': ('histogram', 'SQL statements executed per HTTP request, by endpoint.'),
+    'http_request_db_duration_seconds': ('histogram', 'Time spent in SQL statements per HTTP request, by endpoint.'),
+    'password_hash_duration_seconds': ('histogram', 'bcrypt hash and verify latency, including pool wait.'),
+}
+
+# Методы с собственной меткой; остальные (в том числе произвольные из запроса) — 'other'
+HTTP_METHODS = frozenset({'GET', 'POST', 'PUT', 'DELETE', 'PATCH', 'HEAD', 'OPTIONS'})
+
+# Метрики, которые суммируются только по работающим процессам
+LIVE_ONLY = {'http_requests_in_progress'}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class Registry:
+    """
+    Метрики одного процесса: счётчики, gauge и гистограммы с метками.
+
+    Гистограмма хранит количество наблюдений в каждой корзине (не
+    накопленное) и сумму значений; последняя корзина — +Inf.
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels, amount=1):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def gauge_add(self, name, labels, amount):
+        key = _key(name, labels)
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + amount
+
+    def observe(self, name, labels, value, buckets):
+        key = _key(name, labels)
+        index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [list(buckets), [0] * (len(buckets) + 1), 0.0]
+            histogram[1][index] += 1
+            histogram[2] += value
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: Значения метрик в виде, пригодном для JSON и merge().
+        """
+        with self._lock:
+            return {
+                'counters': [[name, dict(labels), value] for (name, labels), value in self._counters.items()],
+                'gauges': [[name, dict(labels), value] for (name, labels), value in self._gauges.items()],
+                'histograms': [
+                    [name, dict(labels), list(bounds), list(counts), total]
+                    for (name, labels), (bounds, counts, total) in self._histograms.items()
+                ],
+            }
+
+
+def _password_histograms():
+    """Гистограммы app/passwords.py этого процесса в формате Registry.snapshot()."""
+    from app import passwords
+
+    histograms = []
+    for operation, snapshot in passwords.latency_histograms().items():
+        bounds = [bound for bound, _ in snapshot['buckets'][:-1]]
+        cumulative = [count for _, count in snapshot['buckets']]
+        counts = [count - previous for count, previous in zip(cumulative, [0] + cumulative[:-1])]
+        histograms.append(['password_hash_duration_seconds', {'operation': operation}, bounds, counts, snapshot['sum']])
+    return histograms
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _process_start(pid):
+    """Время запуска процесса (такты с загрузки системы) из /proc; None, если /proc недоступен."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Поля после имени процесса (оно в скобках и может содержать пробелы); starttime — 22-е поле
+    return stat.rpartition(')')[2].split()[19]
+
+
+def process_key():
+    """
+    Ключ снимка текущего процесса: pid и время запуска процесса (или
+    случайный идентификатор без /proc), чтобы снимок нового процесса с
+    повторно выданным pid не заменил снимок завершившегося.
+    """
+    pid = os.getpid()
+    return f'{pid}-{_process_start(pid) or uuid.uuid4().hex}'
+
+
+def _process_alive(key):
+    pid, _, started = key.partition('-')
+    if not _pid_alive(int(pid)):
+        return False
+    # Без /proc pid сравнивается без времени запуска
+    return _process_start(int(pid)) in (None, started)
+
+
+class FileStore:
+    """
+    Снимки метрик процессов в общем каталоге: по файлу <pid>-<время
+    запуска>.json на процесс (воркер gunicorn) и archive.json с суммой
+    счётчиков и гистограмм завершившихся процессов. Файл заменяется
+    атомарно, поэтому читатель видит либо старый, либо новый снимок целиком.
+    """
+
+    ARCHIVE = 'archive'
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.json')
+
+    @contextmanager
+    def _locked(self, exclusive):
+        # Перенос в архив и чтение не должны пересекаться, иначе снимок
+        # завершившегося процесса будет учтён дважды или пропущен
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def write(self, key, snapshot):
+        fd, tmp_path = tempfile.mkstemp(prefix=f'.{key}.', suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def _read(self, key):
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать снимок метрик {key}: {e}")
+            return None
+
+    def _keys(self):
+        for name in os.listdir(self.directory):
+            key, extension = os.path.splitext(name)
+            pid = key.partition('-')[0]
+            if extension == '.json' and (key == self.ARCHIVE or pid.isdigit()):
+                yield key
+
+    def read_all(self):
+        """
+        Returns:
+            dict: Ключ процесса (или ARCHIVE) → снимок.
+        """
+        with self._locked(exclusive=False):
+            snapshots = {key: self._read(key) for key in self._keys()}
+        return {key: snapshot for key, snapshot in snapshots.items() if snapshot is not None}
+
+    def archive(self, keys):
+        """
+        Переносит снимки завершившихся процессов в archive.json: счётчики и
+        гистограммы добавляются к архиву, gauge отбрасываются. Файлы
+        процессов удаляются, поэтому каталог не растёт с перезапусками воркеров.
+
+        Returns:
+            int: Количество перенесённых снимков.
+        """
+        with self._locked(exclusive=True):
+            # Другой процесс мог перенести часть снимков, пока ждали блокировку
+            snapshots = {key: self._read(key) for key in keys}
+            snapshots = {key: snapshot for key, snapshot in snapshots.items() if snapshot is not None}
+            if not snapshots:
+                return 0
+            archived = self._read(self.ARCHIVE)
+            merged = merge({**snapshots, self.ARCHIVE: archived or {}}, live_keys=set())
+            merged['gauges'] = []
+            self.write(self.ARCHIVE, merged)
+            for key in snapshots:
+                os.remove(self._path(key))
+        return len(snapshots)
+
+    def clear(self):
+        removed = 0
+        for name in os.listdir(self.directory):
+            if name.endswith('.json') or name.endswith('.tmp'):
+                os.remove(os.path.join(self.directory, name))
+                removed += 1
+        return removed
+
+
+def merge(snapshots, live_keys=None):
+    """
+    Объединяет снимки процессов: счётчики и гистограммы суммируются по всем
+    процессам (в том числе завершившимся), метрики из LIVE_ONLY — только по
+    live_keys.
+
+    Args:
+        snapshots (dict): Ключ процесса → снимок Registry.snapshot().
+        live_keys (set | None): Работающие процессы; None — все.
+
+    Returns:
+        dict: Объединённый снимок.
+    """
+    counters, gauges, histograms = {}, {}, {}
+    for key, snapshot in snapshots.items():
+        live = live_keys is None or key in live_keys
+        for name, labels, value in snapshot.get('counters', []):
+            key = _key(name, labels)
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in snapshot.get('gauges', []):
+            if name in LIVE_ONLY and not live:
+                continue
+            key = _key(name, labels)
+            gauges[key] = gauges.get(key, 0) + value
+        for name, labels, bounds, counts, total in snapshot.get('histograms', []):
+            key = _key(name, labels)
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = [list(bounds), list(counts), total]
+            elif merged[0] == list(bounds):
+                merged[1] = [a + b for a, b in zip(merged[1], counts)]
+                merged[2] += total
+    return {
+        'counters': [[name, dict(labels), value] for (name, labels), value in counters.items()],
+        'gauges': [[name, dict(labels), value] for (name, labels), value in gauges.items()],
+        'histograms': [
+            [name, dict(labels), bounds, counts, total]
+            for (name, labels), (bounds, counts, total) in histograms.items()
+        ],
+    }
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in sorted(labels.items())) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshot):
+    """
+    Текстовый формат экспозиции Prometheus (version 0.0.4).
+
+    Args:
+        snapshot (dict): Снимок Registry.snapshot() или merge().
+
+    Returns:
+        str: Текст для ответа /metrics.
+    """
+    samples = {}
+    for kind in ('counters', 'gauges'):
+        for name, labels, value in snapshot.get(kind, []):
+            samples.setdefault(name, []).append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    for name, labels, bounds, counts, total in snapshot.get('histograms', []):
+        lines = samples.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(bounds + [float('inf')], counts):
+            cumulative += count
+            bucket_labels = {**labels, 'le': _format_value(float(bound))}
+            lines.append(f'{name}_bucket{_format_labels(bucket_labels)} {cumulative}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(float(total))}')
+        lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+
+    output = []
+    for name in sorted(samples):
+        kind, description = METRICS.get(name, ('untyped', ''))
+        output.append(f'# HELP {name} {description}')
+        output.append(f'# TYPE {name} {kind}')
+        output.extend(sorted(samples[name]))
+    return '\n'.join(output) + '\n'
+
+
+class Metrics:
+    """Метрики процесса и общее хранилище снимков (None — без агрегации между процессами)."""
+
+    def __init__(self, store=None, flush_interval=5):
+        self.registry = Registry()
+        self.store = store
+        self.flush_interval = flush_interval
+        self._flushed_at = time.monotonic()
+        self._key = None
+
+    @property
+    def key(self):
+        # Вычисляется заново в процессе, созданном fork (gunicorn --preload)
+        if self._key is None or not self._key.startswith(f'{os.getpid()}-'):
+            self._key = process_key()
+        return self._key
+
+    def snapshot(self):
+        snapshot = self.registry.snapshot()
+        snapshot['histograms'].extend(_password_histograms())
+        return snapshot
+
+    def flush(self):
+        if self.store is not None:
+            self._flushed_at = time.monotonic()
+            self.store.write(self.key, self.snapshot())
+
+    def maybe_flush(self):
+        if self.store is not None and time.monotonic() - self._flushed_at >= self.flush_interval:
+            try:
+                self.flush()
+            except OSError as e:
+                logger.error(f"Ошибка при записи снимка метрик: {e}")
+
+    def collect(self):
+        """
+        Метрики всех процессов (или только этого, если хранилища нет).
+        Снимки завершившихся процессов попутно переносятся в архив хранилища.
+        """
+        if self.store is None:
+            return self.snapshot()
+        self.flush()
+        snapshots = self.store.read_all()
+        dead = {key for key in snapshots if key != FileStore.ARCHIVE and not _process_alive(key)}
+        if dead:
+            try:
+                self.store.archive(dead)
+                snapshots = self.store.read_all()
+            except OSError as e:
+                logger.error(f"Ошибка при переносе снимков метрик в архив: {e}")
+        return merge(snapshots, live_keys=set(snapshots) - dead)
+
+
+def _get_metrics():
+    return current_app.extensions.get('metrics')
+
+
+def _endpoint():
+    # Для неизвестных URL метка одна, чтобы число временных рядов не зависело от запросов
+    return request.endpoint or 'unmatched'
+
+
+def _method():
+    # Метод приходит от клиента как есть, поэтому нестандартные объединяются в одну метку
+    return request.method if request.method in HTTP_METHODS else 'other'
+
+
+def _start_request():
+    metrics = _get_metrics()
+    g.metrics_started = time.perf_counter()
+    metrics.registry.gauge_add('http_requests_in_progress', {'endpoint': _endpoint()}, 1)
+
+
+def _remember_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _finish_request(exc):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return
+    metrics = _get_metrics()
+    endpoint = _endpoint()
+    labels = {'endpoint': endpoint, 'method': _method()}
+    status = g.pop('metrics_status', 500)
+    metrics.registry.gauge_add('http_requests_in_progress', {'endpoint': endpoint}, -1)
+    metrics.registry.inc('http_requests_total', {**labels, 'status': str(status)})
+    metrics.registry.observe('http_request_duration_seconds', labels, time.perf_counter() - started, DURATION_BUCKETS)
+    # Количество и время SQL-запросов считает app/query_stats.py
+    queries = current_request_queries()
+    metrics.registry.observe('http_request_db_queries', {'endpoint': endpoint}, queries.count if queries else 0,
+                             QUERY_BUCKETS)
+    metrics.registry.observe('http_request_db_duration_seconds', {'endpoint': endpoint},
+                             queries.duration if queries else 0.0, DURATION_BUCKETS)
+    metrics.maybe_flush()
+
+
+@limiter.exempt
+def metrics_view():
+    """
+    Метрики в формате Prometheus.
+
+    Доступ: администратор в сессии или заголовок Authorization: Bearer <METRICS_TOKEN>.
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    if not (token and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())):
+        if not current_user.is_authenticated:
+            abort(401)
+        if not current_user.is_admin:
+            abort(403)
+    return Response(render(_get_metrics().collect()), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_app(app):
+    """
+    Подключает сбор метрик запросов и маршрут /metrics (METRICS_ENABLED,
+    METRICS_DIR, METRICS_FLUSH_INTERVAL, METRICS_TOKEN).
+
+    Каждый процесс копит метрики в памяти и не реже раза в
+    METRICS_FLUSH_INTERVAL секунд (по окончании запроса) записывает снимок
+    в METRICS_DIR; /metrics суммирует снимки всех процессов. Без METRICS_DIR
+    используется каталог metrics в instance, в режиме тестирования —
+    только метрики текущего процесса.
+
+    Args:
+        app (Flask): Экземпляр приложения.
+    """
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    directory = app.config.get('METRICS_DIR')
+    if directory is None and not app.testing:
+        directory = os.path.join(app.instance_path, 'metrics')
+    store = FileStore(directory) if directory else None
+    app.extensions['metrics'] = Metrics(store=store, flush_interval=app.config.get('METRICS_FLUSH_INTERVAL', 5))
+
+    # Первым, чтобы учитывались и запросы, отклонённые другими before_request (например, лимитом)
+    app.before_request_funcs.setdefault(None, []).insert(0, _start_request)
+    app.after_request(_remember_status)
+    app.teardown_request(_finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -7,7 +7,8 @@ from datetime import datetime
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    from app.user_cache import get_user
+    return get_user(int(user_id))
 
 
 class User(db.Model, UserMixin):
@@ -18,7 +19,7 @@ class User(db.Model, UserMixin):
     is_admin = db.Column(db.Boolean, default=False)
     avatar = db.Column(db.String(120), nullable=True, default='user.png')  # Поле для аватара
     date_registered = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Дата регистрации
-    last_login = db.Column(db.DateTime, nullable=True)  # Последний вход
+    last_login = db.Column(db.DateTime, nullable=True, index=True)  # Последний вход
     bookings = db.relationship('Booking', backref='user', lazy=True)
     payments = db.relationship('Payment', backref='user', lazy=True)
 
@@ -56,13 +57,62 @@ class Class(db.Model):
 
     bookings = db.relationship('Booking', backref='class_', lazy=True, cascade='all, delete-orphan')
 
-    def available_slots(self):
-        confirmed_bookings = Booking.query.filter_by(class_id=self.id, status='confirmed').count()
-        return self.capacity - confirmed_bookings
+    def confirmed_count(self, day=None):
+        """
+        Количество подтверждённых бронирований по таблице class_seat_counter.
+
+        Если указан день, выполняется один поиск по первичному ключу (class_id, day),
+        иначе суммируются счётчики всех дней класса.
+        """
+        query = db.session.query(
+            db.func.coalesce(db.func.sum(ClassSeatCounter.confirmed), 0)
+        ).filter(ClassSeatCounter.class_id == self.id)
+        if day is not None:
+            query = query.filter(ClassSeatCounter.day == day)
+        return query.scalar()
+
+    def available_slots(self, day=None):
+        # Значение, предзагруженное preload_available_slots(), избавляет от запроса на каждый вызов
+        preloaded = getattr(self, '_preloaded_slots', None)
+        if day is None and preloaded is not None:
+            return preloaded
+        return self.capacity - self.confirmed_count(day)
+
+    @staticmethod
+    def preload_available_slots(classes):
+        """
+        Вычисляет свободные места для списка классов одним групповым запросом.
+
+        Результат сохраняется в экземплярах, поэтому последующие вызовы
+        available_slots() (например, из шаблонов) не обращаются к базе.
+
+        Args:
+            classes (list[Class]): Классы для отображения.
+
+        Returns:
+            dict: Словарь {class_id: количество свободных мест}.
+        """
+        class_ids = [class_.id for class_ in classes]
+        confirmed = {}
+        if class_ids:
+            confirmed = dict(
+                db.session.query(
+                    ClassSeatCounter.class_id,
+                    db.func.sum(ClassSeatCounter.confirmed)
+                ).filter(ClassSeatCounter.class_id.in_(class_ids))
+                .group_by(ClassSeatCounter.class_id)
+                .all()
+            )
+
+        available_spots = {}
+        for class_ in classes:
+            class_._preloaded_slots = class_.capacity - (confirmed.get(class_.id) or 0)
+            available_spots[class_.id] = class_._preloaded_slots
+        return available_spots
 
     @property
     def enrolled_count(self):
-        return Booking.query.filter_by(class_id=self.id, status='confirmed').count()
+        return self.confirmed_count()
 
     def __repr__(self):
         return f"Class('{self.name}', '{self.schedule}', Capacity={self.capacity})"
@@ -71,23 +121,125 @@ class Class(db.Model):
 
 
 class Booking(db.Model):
+    # Составные индексы под горячие фильтры: проверка мест, списки бронирований
+    # пользователя и проверка массового бронирования
+    __table_args__ = (
+        db.Index('ix_booking_class_id_day_status', 'class_id', 'day', 'status'),
+        db.Index('ix_booking_user_id_status_booking_date', 'user_id', 'status', 'booking_date'),
+        db.Index('ix_booking_user_id_booking_date', 'user_id', 'booking_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     class_id = db.Column(db.Integer, db.ForeignKey('class.id'), nullable=False)
     booking_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     status = db.Column(db.String(20), nullable=False, default='confirmed')  # Статус бронирования
     day = db.Column(db.String(10), nullable=False)  # День недели выбранный пользователем
+    # Версия строки: увеличивается при каждом изменении через ORM, используется для ETag в API
+    # и как проверка конкурентных изменений (UPDATE ... WHERE version = :прежняя)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
 
     def __repr__(self):
         return f"Booking(User ID: {self.user_id}, Class ID: {self.class_id}, Status: {self.status})"
 
 
+class ClassSeatCounter(db.Model):
+    """
+    Денормализованный счётчик подтверждённых бронирований для пары (класс, день).
+
+    Обновляется в той же транзакции, что и изменения Booking (см. app/seats.py),
+    поэтому проверка вместимости сводится к поиску по первичному ключу.
+
+    Атрибуты:
+        class_id (int): Идентификатор класса.
+        day (str): День недели, как в Booking.day.
+        confirmed (int): Количество подтверждённых бронирований.
+        capacity (int): Копия Class.capacity на момент последнего обновления.
+    """
+    __tablename__ = 'class_seat_counter'
+
+    class_id = db.Column(db.Integer, db.ForeignKey('class.id'), primary_key=True)
+    day = db.Column(db.String(10), primary_key=True)
+    confirmed = db.Column(db.Integer, nullable=False, default=0)
+    capacity = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f"ClassSeatCounter(Class ID: {self.class_id}, Day: {self.day}, Confirmed: {self.confirmed}/{self.capacity})"
+
+
+
+class UserBookingStat(db.Model):
+    """
+    Сводка для статистики: количество подтверждённых бронирований пользователя.
+
+    Обновляется в той же транзакции, что и изменения Booking (см. app/stats.py).
+
+    Атрибуты:
+        user_id (int): Идентификатор пользователя.
+        confirmed (int): Количество подтверждённых бронирований.
+    """
+    __tablename__ = 'user_booking_stat'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    confirmed = db.Column(db.Integer, nullable=False, default=0, index=True)
+
+    def __repr__(self):
+        return f"UserBookingStat(User ID: {self.user_id}, Confirmed: {self.confirmed})"
+
+
+class BookingListVersion(db.Model):
+    """
+    Версия списка бронирований пользователя для ETag в API.
+
+    Увеличивается в той же транзакции при любом добавлении, изменении или
+    удалении бронирования пользователя через ORM (см. app/stats.py) и никогда
+    не уменьшается, поэтому ETag не повторяется даже при повторном
+    использовании id удалённого бронирования.
+
+    Атрибуты:
+        user_id (int): Идентификатор пользователя.
+        version (int): Номер версии списка.
+    """
+    __tablename__ = 'booking_list_version'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"BookingListVersion(User ID: {self.user_id}, Version: {self.version})"
+
+
+class PaymentStatusStat(db.Model):
+    """
+    Сводка для статистики: количество платежей в каждом статусе.
+
+    Обновляется в той же транзакции, что и изменения Payment (см. app/stats.py).
+
+    Атрибуты:
+        status (str): Статус платежа, как в Payment.status.
+        count (int): Количество платежей.
+    """
+    __tablename__ = 'payment_status_stat'
+
+    status = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"PaymentStatusStat(Status: {self.status}, Count: {self.count})"
+
 class Payment(db.Model):
+    # Индекс под последние платежи пользователя в панели администратора
+    __table_args__ = (
+        db.Index('ix_payment_user_id_timestamp', 'user_id', 'timestamp'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     amount = db.Column(db.Float, nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    stripe_payment_id = db.Column(db.String(100), nullable=False)
+    stripe_payment_id = db.Column(db.String(100), nullable=False, index=True)
     status = db.Column(db.String(20), nullable=False, default='paid')
 
     def __repr__(self):
@@ -98,6 +250,11 @@ class Payment(db.Model):
 
 
 class ActionLog(db.Model):
+    # Индекс под подсчёт недавних действий пользователя (неудачные входы, смены пароля)
+    __table_args__ = (
+        db.Index('ix_action_log_user_id_action_status_timestamp', 'user_id', 'action', 'status', 'timestamp'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Может быть NULL для неавторизованных действий
     action = db.Column(db.String(255), nullable=False)  # Описание действия
@@ -112,5 +269,132 @@ class ActionLog(db.Model):
 
 
 
+class OutboxEmail(db.Model):
+    """
+    Исходящее письмо в очереди на отправку (outbox).
+
+    Письма сохраняются в той же транзакции, что и действие пользователя, и
+    отправляются фоновым обработчиком из app/mailer.py пакетами через одно
+    SMTP-соединение.
+
+    Атрибуты:
+        recipients (str): Адреса получателей через запятую.
+        to_admins (bool): Разослать всем администраторам (адреса определяются при отправке).
+        status (str): 'pending', 'sent' или 'failed' (исчерпаны попытки).
+        attempts (int): Количество неудачных попыток отправки.
+        next_attempt_at (datetime): Время, не раньше которого письмо можно отправлять.
+    """
+    __tablename__ = 'outbox_email'
+    __table_args__ = (
+        db.Index('ix_outbox_email_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255), nullable=False)
+    recipients = db.Column(db.Text, nullable=True)
+    to_admins = db.Column(db.Boolean, nullable=False, default=False)
+    body = db.Column(db.Text, nullable=True)
+    html = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"OutboxEmail(ID: {self.id}, Subject: {self.subject}, Status: {self.status}, Attempts: {self.attempts})"
+
+
+class StripeEvent(db.Model):
+    """
+    Входящее событие вебхука Stripe в очереди на обработку.
+
+    Первичный ключ — идентификатор события Stripe, поэтому повторные доставки
+    одного события не создают новых записей. Вебхук только сохраняет событие и
+    сразу отвечает 200; обработку выполняет фоновый обработчик из app/stripe_events.py.
+
+    Атрибуты:
+        id (str): Идентификатор события Stripe (evt_...).
+        type (str): Тип события, например 'payment_intent.succeeded'.
+        payload (str): JSON события.
+        status (str): 'pending', 'processed' или 'dead' (исчерпаны попытки).
+        attempts (int): Количество неудачных попыток обработки.
+        next_attempt_at (datetime): Время, не раньше которого событие можно обрабатывать.
+    """
+    __tablename__ = 'stripe_event'
+    __table_args__ = (
+        db.Index('ix_stripe_event_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.String(255), primary_key=True)
+    type = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    received_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"StripeEvent(ID: {self.id}, Type: {self.type}, Status: {self.status}, Attempts: {self.attempts})"
+
+
+class RefreshTokenFamily(db.Model):
+    """
+    Цепочка refresh-токенов одного входа в API.
+
+    Refresh-токен содержит id цепочки (claim fam) и номер поколения (claim gen).
+    Обмен увеличивает generation условным UPDATE, поэтому принимается только
+    последний выданный токен; предъявление старого означает повторное
+    использование, и вся цепочка отзывается (app/token_revocation.py).
+    На каждый вход хранится одна строка независимо от числа обменов.
+
+    Атрибуты:
+        id (str): Идентификатор цепочки (UUID).
+        user_id (int): Владелец токенов.
+        generation (int): Поколение последнего выданного refresh-токена.
+        revoked (bool): Цепочка отозвана (выход или повторное использование).
+        expires_at (datetime): Время истечения последнего refresh-токена (UTC).
+    """
+    __tablename__ = 'refresh_token_family'
+
+    id = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+    revoked = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"RefreshTokenFamily(ID: {self.id}, User ID: {self.user_id}, Generation: {self.generation})"
+
+
+class RevokedToken(db.Model):
+    """
+    Отозванный JWT: access-токен или refresh-токен без цепочки, отозванный
+    через /api/v1/token/revoke. Ротация refresh-токенов сюда не пишет
+    (см. RefreshTokenFamily).
+
+    Таблица — постоянное хранилище списка отзыва; проверки в запросах идут по
+    копии в памяти процесса (app/token_revocation.py). Строки с истёкшим
+    expires_at больше не нужны и удаляются командой `flask prune-revoked-tokens`.
+
+    Атрибуты:
+        jti (str): Идентификатор токена (claim jti).
+        token_type (str): 'access' или 'refresh'.
+        user_id (int): Владелец токена.
+        expires_at (datetime): Время истечения токена (UTC).
+    """
+    __tablename__ = 'revoked_token'
 
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), nullable=False, unique=True)
+    token_type = db.Column(db.String(10), nullable=False)
+    user_id = db.Column(db.Integer, nullable=True)
+    revoked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
 
+    def __repr__(self):
+        return f"RevokedToken(JTI: {self.jti}, Type: {self.token_type}, User ID: {self.user_id})"
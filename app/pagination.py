@@ -0,0 +1,66 @@
+# app/pagination.py
+
+import base64
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+
+def encode_cursor(sort_value, row_id):
+    """
+    Непрозрачный курсор keyset-пагинации: позиция (sort_value, id) последней
+    выданной записи. sort_value — datetime или строка.
+    """
+    if isinstance(sort_value, datetime):
+        sort_value = 'd' + sort_value.isoformat()
+    else:
+        sort_value = 's' + str(sort_value)
+    raw = f"{sort_value}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Разбирает курсор encode_cursor().
+
+    Raises:
+        ValueError: Курсор повреждён.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        sort_value, row_id = raw.rsplit('|', 1)
+        kind, sort_value = sort_value[0], sort_value[1:]
+        if kind == 'd':
+            sort_value = datetime.fromisoformat(sort_value)
+        elif kind != 's':
+            raise ValueError(kind)
+        return sort_value, int(row_id)
+    except (ValueError, IndexError):
+        raise ValueError("Invalid cursor")
+
+
+def keyset_page(query, sort_column, id_column, after, limit):
+    """
+    Страница запроса по ключу (sort_column, id_column) вместо OFFSET.
+
+    Возвращает до limit записей и курсор следующей страницы (None, если
+    это последняя страница). Сортировка должна опираться на индекс.
+
+    Args:
+        query: Запрос SQLAlchemy.
+        sort_column: Столбец сортировки.
+        id_column: Уникальный столбец для однозначного порядка.
+        after (tuple | None): Раскодированный курсор предыдущей страницы.
+        limit (int): Размер страницы.
+
+    Returns:
+        tuple[list, str | None]: Записи и курсор следующей страницы.
+    """
+    if after is not None:
+        query = query.filter(tuple_(sort_column, id_column) > after)
+    rows = query.order_by(sort_column, id_column).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
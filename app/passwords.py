@@ -0,0 +1,231 @@
+# app/passwords.py
+
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt as _bcrypt
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROUNDS = 12
+
+# Границы корзин гистограммы задержек, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_COST_RE = re.compile(r'^\$2[abxy]?\$(\d{2})\$')
+
+
+class LatencyHistogram:
+    """Потокобезопасная гистограмма задержек с фиксированными корзинами."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = next((i for i, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += seconds
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: count, sum (секунды) и buckets — список (граница, накопленное число),
+            последняя граница — float('inf').
+        """
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, buckets = 0, []
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            buckets.append((bound, cumulative))
+        return {'count': cumulative, 'sum': total, 'buckets': buckets}
+
+
+def quantile_bound(snapshot, q):
+    """
+    Верхняя граница корзины, в которую попадает квантиль q гистограммы.
+
+    Returns:
+        float | None: Граница в секундах (inf — за последней корзиной) или None без наблюдений.
+    """
+    if not snapshot['count']:
+        return None
+    rank = q * snapshot['count']
+    return next(bound for bound, cumulative in snapshot['buckets'] if cumulative >= rank)
+
+
+def _hash(password, rounds):
+    return _bcrypt.hashpw(password, _bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(hashed, password):
+    try:
+        return _bcrypt.checkpw(password, hashed)
+    except ValueError:
+        # Хэш в базе повреждён или не является bcrypt
+        return False
+
+
+def hash_cost(hashed):
+    """Стоимость (log2 числа раундов) из bcrypt-хэша или None, если хэш не распознан."""
+    match = _COST_RE.match(hashed or '')
+    return int(match.group(1)) if match else None
+
+
+class PasswordHasher:
+    """
+    Хэширование и проверка паролей bcrypt в пуле процессов.
+
+    bcrypt намеренно медленный (сотни миллисекунд при стоимости 12): в пуле
+    из `workers` процессов вычисления не конкурируют с обработкой запросов
+    за GIL. Пул создаётся лениво в каждом процессе приложения (после fork
+    воркера сервера), поэтому workers — доля ядер одного воркера сервера, а
+    не всех ядер машины; при workers=0 вычисления выполняются в вызывающем потоке. Процессы пула импортируют главный модуль,
+    поэтому запуск сервера в нём должен быть под `if __name__ == '__main__'`.
+    """
+
+    def __init__(self, rounds=DEFAULT_ROUNDS, workers=0):
+        self.rounds = rounds
+        self.workers = workers
+        self.histograms = {'hash': LatencyHistogram(), 'verify': LatencyHistogram()}
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # fork из процесса с фоновыми потоками небезопасен, поэтому процессы
+                # пула запускаются через forkserver (или spawn, где его нет)
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context(method)
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, operation, func, *args):
+        started = time.perf_counter()
+        try:
+            executor = self._get_executor()
+            if executor is None:
+                return func(*args)
+            try:
+                return executor.submit(func, *args).result()
+            except BrokenProcessPool:
+                logger.error("Пул хэширования паролей завершился аварийно, вычисление в текущем потоке.")
+                with self._lock:
+                    self._executor = None
+                return func(*args)
+        finally:
+            self.histograms[operation].observe(time.perf_counter() - started)
+
+    def hash(self, password):
+        return self._run('hash', _hash, password.encode('utf-8'), self.rounds)
+
+    def check(self, hashed, password):
+        if not hashed:
+            return False
+        return self._run('verify', _check, hashed.encode('utf-8'), password.encode('utf-8'))
+
+    def needs_rehash(self, hashed):
+        return hash_cost(hashed) != self.rounds
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Используется вне контекста приложения (скрипты, консоль)
+_default_hasher = PasswordHasher()
+
+
+def _get_hasher():
+    if has_app_context():
+        return current_app.extensions.get('passwords', _default_hasher)
+    return _default_hasher
+
+
+def hash_password(password):
+    """
+    Хэширует пароль с текущей стоимостью BCRYPT_LOG_ROUNDS.
+
+    Returns:
+        str: bcrypt-хэш.
+    """
+    return _get_hasher().hash(password)
+
+
+def check_password(hashed, password):
+    """
+    Проверяет пароль по bcrypt-хэшу.
+
+    Returns:
+        bool: True, если пароль совпадает.
+    """
+    return _get_hasher().check(hashed, password)
+
+
+def needs_rehash(hashed):
+    """True, если стоимость хэша отличается от BCRYPT_LOG_ROUNDS."""
+    return _get_hasher().needs_rehash(hashed)
+
+
+def verify_and_update(user, password):
+    """
+    Проверяет пароль пользователя и при успехе пересчитывает хэш, если его
+    стоимость отличается от текущей BCRYPT_LOG_ROUNDS. Новый хэш сохраняется
+    при следующем commit вызывающего кода.
+
+    Args:
+        user (User): Пользователь.
+        password (str): Введённый пароль.
+
+    Returns:
+        bool: True, если пароль совпадает.
+    """
+    if not check_password(user.password, password):
+        return False
+    if needs_rehash(user.password):
+        logger.info(f"Пароль пользователя {user.id} перехэширован со стоимостью {_get_hasher().rounds}.")
+        user.password = hash_password(password)
+    return True
+
+
+def latency_histograms():
+    """Снимки гистограмм задержек хэширования ('hash') и проверки ('verify') паролей."""
+    hasher = _get_hasher()
+    return {operation: histogram.snapshot() for operation, histogram in hasher.histograms.items()}
+
+
+def init_app(app):
+    """
+    Подключает сервис паролей (BCRYPT_LOG_ROUNDS, PASSWORD_HASH_WORKERS).
+
+    PASSWORD_HASH_WORKERS задаётся на один воркер сервера: при N воркерах
+    gunicorn хэширование занимает до N * PASSWORD_HASH_WORKERS ядер. В режиме
+    тестирования пул процессов не создаётся.
+
+    Args:
+        app (Flask): Экземпляр приложения.
+    """
+    workers = 0 if app.testing else app.config.get('PASSWORD_HASH_WORKERS', 2)
+    app.extensions['passwords'] = PasswordHasher(
+        rounds=app.config.get('BCRYPT_LOG_ROUNDS', DEFAULT_ROUNDS),
+        workers=workers,
+    )
@@ -0,0 +1,186 @@
+# app/query_stats.py
+
+import logging
+import os
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Каталог проекта: место вызова запроса ищется в его файлах (код приложения, шаблоны, тесты)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Активные capture_queries(); запросы записываются во все
+_captures = []
+
+
+def call_site():
+    """
+    Ближайший к запросу кадр стека из файлов проекта (включая шаблоны Jinja).
+
+    Returns:
+        str: 'путь:строка in функция' или '?', если кадр не найден.
+    """
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if filename == os.path.abspath(__file__) or not filename.startswith(PROJECT_ROOT + os.sep):
+            continue
+        if 'site-packages' in filename:
+            continue
+        return f"{os.path.relpath(filename, PROJECT_ROOT)}:{frame.lineno} in {frame.name}"
+    return '?'
+
+
+class RequestQueries:
+    """
+    SQL-запросы одного HTTP-запроса: количество, суммарное время и повторы.
+
+    Одинаковый текст запроса, выполненный n_plus_one_threshold и более раз
+    (с разными параметрами), считается N+1; для него запоминается место
+    вызова на момент достижения порога.
+    """
+
+    def __init__(self, n_plus_one_threshold=5):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        self.n_plus_one = {}
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+        if self.n_plus_one_threshold and self.statements[statement] == self.n_plus_one_threshold:
+            self.n_plus_one[statement] = call_site()
+
+
+class QueryLog:
+    """Запросы, выполненные внутри capture_queries(): список (statement, parameters, duration, call site)."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __len__(self):
+        return len(self.queries)
+
+    @property
+    def statements(self):
+        return [statement for statement, _, _, _ in self.queries]
+
+    def repeated(self, threshold=2):
+        """Тексты запросов, выполненных не меньше threshold раз, с количеством."""
+        return {statement: count for statement, count in Counter(self.statements).items() if count >= threshold}
+
+    def report(self):
+        lines = [f"{len(self.queries)} SQL-запросов:"]
+        for statement, parameters, duration, site in self.queries:
+            lines.append(f"  [{duration * 1000:.1f} мс] {site}: {' '.join(statement.split())} {parameters}")
+        for statement, count in self.repeated().items():
+            lines.append(f"  повторён {count} раз: {' '.join(statement.split())}")
+        return '\n'.join(lines)
+
+
+@contextmanager
+def capture_queries():
+    """
+    Собирает все SQL-запросы, выполненные внутри блока, в том числе
+    в запросах тестового клиента.
+
+    Yields:
+        QueryLog: Журнал запросов.
+    """
+    log = QueryLog()
+    _captures.append(log)
+    try:
+        yield log
+    finally:
+        _captures.remove(log)
+
+
+def _get_settings():
+    return current_app.extensions.get('query_stats') if has_app_context() else None
+
+
+def current_request_queries():
+    """Статистика SQL-запросов текущего HTTP-запроса или None вне запроса."""
+    if not has_request_context():
+        return None
+    return g.get('query_stats')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_stats_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_stats_started', None)
+    if started is None:
+        return
+    duration = time.perf_counter() - started
+
+    if _captures:
+        site = call_site()
+        for log in _captures:
+            log.queries.append((statement, parameters, duration, site))
+    settings = _get_settings()
+    if settings is None:
+        return
+    if has_request_context():
+        stats = g.get('query_stats')
+        if stats is None:
+            stats = g.query_stats = RequestQueries(settings['n_plus_one_threshold'])
+        stats.record(statement, duration)
+    if settings['slow_threshold'] is not None and duration >= settings['slow_threshold']:
+        logger.warning(f"Медленный SQL-запрос {duration * 1000:.0f} мс ({call_site()}): {' '.join(statement.split())}")
+
+
+def _report_request(exc):
+    stats = g.get('query_stats')
+    if stats is None:
+        return
+    settings = _get_settings()
+    endpoint = request.endpoint or request.path
+    for statement, site in stats.n_plus_one.items():
+        logger.warning(
+            f"Возможный N+1 в {endpoint}: запрос выполнен {stats.statements[statement]} раз ({site}): "
+            f"{' '.join(statement.split())}"
+        )
+    budget = settings['budget'] if settings else None
+    if budget is not None and stats.count > budget:
+        logger.warning(f"{endpoint}: {stats.count} SQL-запросов при бюджете {budget}.")
+    logger.debug(f"{endpoint}: {stats.count} SQL-запросов, {stats.duration * 1000:.1f} мс")
+
+
+def init_app(app):
+    """
+    Подключает учёт SQL-запросов (QUERY_STATS_ENABLED, QUERY_SLOW_THRESHOLD,
+    QUERY_N_PLUS_ONE_THRESHOLD, QUERY_BUDGET).
+
+    Для каждого HTTP-запроса считает количество и время SQL-запросов;
+    медленные запросы и возможные N+1 записываются в журнал с местом вызова.
+
+    Args:
+        app (Flask): Экземпляр приложения.
+    """
+    if not app.config.get('QUERY_STATS_ENABLED', True):
+        return
+
+    from app import db
+
+    app.extensions['query_stats'] = {
+        'slow_threshold': app.config.get('QUERY_SLOW_THRESHOLD', 0.1),
+        'n_plus_one_threshold': app.config.get('QUERY_N_PLUS_ONE_THRESHOLD', 5),
+        'budget': app.config.get('QUERY_BUDGET'),
+    }
+    app.teardown_request(_report_request)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
@@ -0,0 +1,121 @@
+# app/rate_limits.py
+
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app, request
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from limits.storage import Storage
+
+
+class SQLiteStorage(Storage):
+    """
+    Хранилище Flask-Limiter в локальном файле SQLite.
+
+    Счётчики общие для всех процессов приложения на одном сервере (например,
+    воркеров gunicorn), поэтому лимиты действуют глобально, а не для каждого
+    процесса отдельно. Поддерживается стратегия fixed-window.
+
+    URI: sqlite:///путь/к/файлу.db
+    """
+
+    STORAGE_SCHEME = ['sqlite']
+
+    def __init__(self, uri, wrap_exceptions=False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = os.path.abspath(uri[len('sqlite:///'):])
+        self._local = threading.local()
+        self._last_prune = 0.0
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit ('
+                'key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL)'
+            )
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        now = time.time()
+        with self._connect() as connection:
+            # Один UPSERT атомарен: конкурентные процессы не теряют инкременты
+            count = connection.execute(
+                'INSERT INTO rate_limit (key, count, expires_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET '
+                'count = CASE WHEN expires_at <= ? THEN excluded.count ELSE count + excluded.count END, '
+                'expires_at = CASE WHEN expires_at <= ? OR ? THEN excluded.expires_at ELSE expires_at END '
+                'RETURNING count',
+                (key, amount, now + expiry, now, now, int(elastic_expiry))
+            ).fetchone()[0]
+            if now - self._last_prune > 60:
+                self._last_prune = now
+                connection.execute('DELETE FROM rate_limit WHERE expires_at <= ?', (now,))
+        return count
+
+    def get(self, key):
+        row = self._connect().execute(
+            'SELECT count FROM rate_limit WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        now = time.time()
+        row = self._connect().execute(
+            'SELECT expires_at FROM rate_limit WHERE key = ? AND expires_at > ?', (key, now)
+        ).fetchone()
+        return int(row[0] if row else now)
+
+    def check(self):
+        try:
+            self._connect().execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        with self._connect() as connection:
+            return connection.execute('DELETE FROM rate_limit').rowcount
+
+    def clear(self, key):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM rate_limit WHERE key = ?', (key,))
+
+
+def _default_limits():
+    """
+    Лимиты текущего запроса: политика блюпринта из RATELIMIT_BLUEPRINT_LIMITS
+    или RATELIMIT_DEFAULT. Читаются при каждом запросе, поэтому политики
+    меняются через конфигурацию без повторной регистрации.
+    """
+    config = current_app.config
+    policies = config.get('RATELIMIT_BLUEPRINT_LIMITS') or {}
+    return policies.get(request.blueprint) or config['RATELIMIT_DEFAULT']
+
+
+# Единственный экземпляр Limiter приложения. Хранилище задаётся RATELIMIT_STORAGE_URI:
+# 'memory://', 'sqlite:///path.db' (SQLiteStorage) или 'redis://localhost:6379'
+limiter = Limiter(key_func=get_remote_address, default_limits=[_default_limits])
+
+
+def init_app(app):
+    """
+    Подключает общий limiter к приложению.
+
+    Args:
+        app (Flask): Экземпляр приложения.
+    """
+    app.config.setdefault('RATELIMIT_DEFAULT', '200 per day;50 per hour')
+    limiter.init_app(app)
@@ -0,0 +1,139 @@
+# app/rate_windows.py
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import timedelta
+
+from flask import current_app
+
+
+def _seconds(window):
+    return window.total_seconds() if isinstance(window, timedelta) else float(window)
+
+
+class MemoryWindowStore:
+    """
+    Счётчики скользящего окна в памяти процесса.
+
+    Для каждого ключа хранится кольцевой буфер отметок времени ограниченной
+    длины; устаревшие отметки отбрасываются при обращении, поэтому hit() и
+    count() выполняются за амортизированное O(1). Количество ключей ограничено,
+    наименее используемые ключи вытесняются.
+    """
+
+    def __init__(self, max_hits_per_key=100, max_keys=100000):
+        self.max_hits_per_key = max_hits_per_key
+        self.max_keys = max_keys
+        self._hits = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                hits = self._hits[key] = deque(maxlen=self.max_hits_per_key)
+                if len(self._hits) > self.max_keys:
+                    self._hits.popitem(last=False)
+            else:
+                self._hits.move_to_end(key)
+            hits.append(now)
+
+    def count(self, key, window, now=None):
+        now = time.time() if now is None else now
+        threshold = now - _seconds(window)
+        with self._lock:
+            hits = self._hits.get(key)
+            if not hits:
+                return 0
+            while hits and hits[0] < threshold:
+                hits.popleft()
+            return len(hits)
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
+
+
+class SQLiteWindowStore:
+    """
+    Счётчики скользящего окна в локальном файле SQLite, общие для всех
+    процессов приложения на одном сервере (например, воркеров gunicorn).
+
+    Отметки старше max_window периодически удаляются.
+    """
+
+    def __init__(self, path, max_window=timedelta(days=1)):
+        self.path = path
+        self.max_window = _seconds(max_window)
+        self._local = threading.local()
+        self._last_prune = 0.0
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS rate_hit (key TEXT NOT NULL, ts REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_rate_hit_key_ts ON rate_hit (key, ts)')
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def hit(self, key, now=None):
+        now = time.time() if now is None else now
+        with self._connect() as connection:
+            connection.execute('INSERT INTO rate_hit (key, ts) VALUES (?, ?)', (key, now))
+            if now - self._last_prune > 60:
+                self._last_prune = now
+                connection.execute('DELETE FROM rate_hit WHERE ts < ?', (now - self.max_window,))
+
+    def count(self, key, window, now=None):
+        now = time.time() if now is None else now
+        row = self._connect().execute(
+            'SELECT COUNT(*) FROM rate_hit WHERE key = ? AND ts >= ?', (key, now - _seconds(window))
+        ).fetchone()
+        return row[0]
+
+    def reset(self, key):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM rate_hit WHERE key = ?', (key,))
+
+
+def create_store(uri):
+    """
+    Создаёт хранилище по URI: 'memory://' или 'sqlite:///путь/к/файлу.db'.
+    """
+    if uri.startswith('memory://'):
+        return MemoryWindowStore()
+    if uri.startswith('sqlite:///'):
+        return SQLiteWindowStore(os.path.abspath(uri[len('sqlite:///'):]))
+    raise ValueError(f"Unsupported rate window storage: {uri}")
+
+
+def init_app(app):
+    """
+    Подключает хранилище счётчиков скользящего окна (RATE_WINDOW_STORAGE_URI).
+
+    Args:
+        app (Flask): Экземпляр приложения.
+    """
+    app.extensions['rate_windows'] = create_store(app.config.get('RATE_WINDOW_STORAGE_URI', 'memory://'))
+
+
+def get_store():
+    return current_app.extensions['rate_windows']
+
+
+def hit(key):
+    """Регистрирует событие для ключа."""
+    get_store().hit(key)
+
+
+def count(key, window):
+    """Количество событий для ключа за последние window (timedelta или секунды)."""
+    return get_store().count(key, window)
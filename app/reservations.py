@@ -0,0 +1,201 @@
+# app/reservations.py
+
+import logging
+
+from sqlalchemy import bindparam, tuple_
+
+from app import db
+from app.models import Booking, Class, ClassSeatCounter
+from app.seats import CONFIRMED, ensure_counter, ensure_counters
+
+logger = logging.getLogger(__name__)
+
+
+def is_held_on(class_, day):
+    """Проводится ли класс в этот день недели (Class.days_of_week)."""
+    return day in [d.strip() for d in (class_.days_of_week or '').split(',')]
+
+
+def booked_pairs(user_id, pairs):
+    """
+    Пары (class_id, day), на которые у пользователя уже есть бронирование.
+
+    Повторным считается любое бронирование на тот же класс и день, в том числе
+    отменённое: одно правило для веб-формы, API и пакетного бронирования.
+
+    Args:
+        user_id (int): Идентификатор пользователя.
+        pairs (Iterable[tuple[int, str]]): Проверяемые пары (class_id, day).
+
+    Returns:
+        set[tuple[int, str]]: Уже забронированные пары.
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return set()
+    return set(db.session.execute(
+        db.select(Booking.class_id, Booking.day).where(
+            Booking.user_id == user_id,
+            tuple_(Booking.class_id, Booking.day).in_(pairs)
+        )
+    ).tuples())
+
+
+def already_booked(user_id, class_id, day):
+    """Есть ли у пользователя бронирование на этот класс и день (см. booked_pairs)."""
+    return bool(booked_pairs(user_id, [(class_id, day)]))
+
+
+def lock_for_booking(connection):
+    """
+    Захватывает блокировку записи до проверки мест.
+
+    В SQLite транзакция начинается через BEGIN IMMEDIATE, чтобы конкурирующие
+    процессы ждали друг друга на busy_timeout, а не получали SQLITE_BUSY при
+    повышении блокировки. В Postgres строку счётчика блокирует сам условный UPDATE.
+    """
+    if connection.dialect.name != 'sqlite':
+        return
+    raw_connection = connection.connection.driver_connection
+    # Если транзакция уже открыта записью, RESERVED-блокировка у нас уже есть
+    if not raw_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+def reserve_seat(user_id, class_, day, status=CONFIRMED, **fields):
+    """
+    Атомарно занимает место в классе на выбранный день и создаёт бронирование.
+
+    Место списывается условным UPDATE (confirmed < capacity), поэтому два
+    параллельных запроса не могут занять последнее место одновременно.
+    Бронирования с другим статусом место не занимают и создаются без проверки.
+    День и повторное бронирование проверяет вызывающий код (is_held_on,
+    already_booked) по тем же правилам, что и reserve_seats. Фиксацию транзакции (db.session.commit()) выполняет вызывающий код; если
+    мест нет, транзакция откатывается, чтобы сразу снять блокировку.
+
+    Args:
+        user_id (int): Идентификатор пользователя.
+        class_ (Class): Бронируемый класс.
+        day (str): День недели.
+        status (str): Статус бронирования.
+        **fields: Дополнительные поля Booking (например, booking_date).
+
+    Returns:
+        Booking | None: Созданное бронирование или None, если мест нет.
+    """
+    booking = Booking(user_id=user_id, class_id=class_.id, day=day, status=status, **fields)
+
+    if status == CONFIRMED:
+        connection = db.session.connection()
+        lock_for_booking(connection)
+        ensure_counter(connection, class_.id, day)
+
+        result = connection.execute(
+            db.update(ClassSeatCounter)
+            .where(
+                ClassSeatCounter.class_id == class_.id,
+                ClassSeatCounter.day == day,
+                ClassSeatCounter.confirmed < ClassSeatCounter.capacity
+            )
+            .values(confirmed=ClassSeatCounter.confirmed + 1)
+        )
+        if result.rowcount != 1:
+            logger.info(f"No seats left for class ID {class_.id} on {day}")
+            db.session.rollback()
+            return None
+        booking._seat_counted = True
+
+    db.session.add(booking)
+    db.session.flush()
+    return booking
+
+
+def reserve_seats(user_id, items, **fields):
+    """
+    Бронирует для пользователя несколько мест за один набор запросов.
+
+    Классы, существующие бронирования и счётчики мест читаются групповыми
+    запросами под одной блокировкой, места распределяются в порядке элементов,
+    счётчики обновляются одним executemany, а бронирования вставляются одним
+    flush. Элемент отклоняется, если класса нет, класс не проводится в этот
+    день (is_held_on), у пользователя уже есть бронирование на этот класс и
+    день (booked_pairs; в том числе в этом же пакете) или места закончились.
+    Фиксацию транзакции выполняет вызывающий код.
+
+    Args:
+        user_id (int): Идентификатор пользователя.
+        items (list[tuple[int, str]]): Пары (class_id, day).
+        **fields: Дополнительные поля Booking (например, booking_date).
+
+    Returns:
+        list[Booking | str]: Для каждого элемента — созданное бронирование или причина отказа.
+    """
+    results = [None] * len(items)
+    if not items:
+        return results
+
+    connection = db.session.connection()
+    lock_for_booking(connection)
+
+    class_ids = {class_id for class_id, _ in items}
+    classes = {
+        row.id: row for row in db.session.execute(
+            db.select(Class.id, Class.capacity, Class.days_of_week).where(Class.id.in_(class_ids))
+        )
+    }
+    taken = booked_pairs(user_id, set(items))
+
+    pending = []
+    for index, (class_id, day) in enumerate(items):
+        class_ = classes.get(class_id)
+        if class_ is None:
+            results[index] = 'Class not found'
+        elif not is_held_on(class_, day):
+            results[index] = 'Class is not held on this day'
+        elif (class_id, day) in taken:
+            results[index] = 'Already booked'
+        else:
+            taken.add((class_id, day))
+            pending.append(index)
+
+    pairs = {items[index]: classes[items[index][0]].capacity for index in pending}
+    ensure_counters(connection, pairs)
+    remaining = {
+        (row.class_id, row.day): row.capacity - row.confirmed
+        for row in connection.execute(
+            db.select(ClassSeatCounter.class_id, ClassSeatCounter.day,
+                      ClassSeatCounter.confirmed, ClassSeatCounter.capacity)
+            .where(tuple_(ClassSeatCounter.class_id, ClassSeatCounter.day).in_(list(pairs)))
+            .with_for_update()
+        )
+    } if pairs else {}
+
+    granted = {}
+    bookings = []
+    for index in pending:
+        key = items[index]
+        if remaining.get(key, 0) <= 0:
+            results[index] = 'No available slots'
+            continue
+        remaining[key] -= 1
+        granted[key] = granted.get(key, 0) + 1
+        booking = Booking(user_id=user_id, class_id=key[0], day=key[1], status=CONFIRMED, **fields)
+        booking._seat_counted = True
+        results[index] = booking
+        bookings.append(booking)
+
+    if granted:
+        connection.execute(
+            db.update(ClassSeatCounter)
+            .where(
+                ClassSeatCounter.class_id == bindparam('b_class_id'),
+                ClassSeatCounter.day == bindparam('b_day')
+            )
+            .values(confirmed=ClassSeatCounter.confirmed + bindparam('b_count')),
+            [{'b_class_id': class_id, 'b_day': day, 'b_count': count} for (class_id, day), count in granted.items()]
+        )
+        db.session.add_all(bookings)
+        db.session.flush()
+
+    logger.info(f"Batch booking for user ID {user_id}: {len(bookings)} of {len(items)} items booked")
+    return results
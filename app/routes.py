@@ -1,35 +1,29 @@
 import logging
-import os
 import re
-import uuid
 from datetime import datetime, timedelta
 
 import stripe
 from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 from flask_login import login_user, current_user, logout_user, login_required
-from flask_mail import Message
 from itsdangerous import URLSafeTimedSerializer
-from werkzeug.utils import secure_filename
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.exc import StaleDataError
 
-from app import db, bcrypt
-from app import mail  # Ensure Flask-Mail is initialized
-from app.forms import RegistrationForm, BookingForm, CancelBookingForm, UpdateProfileForm, SelectDayForm, \
+from app import db
+from app.forms import RegistrationForm, CancelBookingForm, UpdateProfileForm, SelectDayForm, \
     ChangePasswordForm, LoginForm, ResetPasswordForm, ResetPasswordRequestForm, PaymentForm
-from app.models import User, Class, Booking, ActionLog
+from app.models import User, Class, Booking
+from app import fragment_cache, images, passwords, rate_windows
+from app.rate_limits import limiter
+from app.audit import log_action
+from app.mailer import queue_email
+from app.reservations import already_booked, reserve_seat
 from app.utils import allowed_file
 
 main_bp = Blueprint('main', __name__)
 
 logger = logging.getLogger(__name__)
 
-# Initialize Flask-Limiter
-limiter = Limiter(
-    key_func=get_remote_address,
-    default_limits=["200 per day", "50 per hour"]
-)
-
 MAX_FAILED_ATTEMPTS = 5
 BLOCK_DURATION = timedelta(minutes=15)
 
@@ -57,8 +51,9 @@ def home():
     Returns:
         Response: Rendered home page template with class data.
     """
-    classes = Class.query.all()
-    return render_template('home.html', classes=classes)
+    # Карточки классов из кэша фрагментов; при полном попадании запросов к базе нет
+    cards = fragment_cache.class_cards('partials/class_card.html')
+    return render_template('home.html', cards=cards)
 
 
 @main_bp.route('/register', methods=['GET', 'POST'])
@@ -79,33 +74,20 @@ def register():
         username = form.username.data.strip()
         email = form.email.data.strip().lower()
         password = form.password.data
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        hashed_password = passwords.hash_password(password)
         user = User(username=username, email=email, password=hashed_password)
         db.session.add(user)
-        db.session.commit()
+        db.session.flush()
 
-        # Log registration action
-        action = ActionLog(
-            user_id=user.id,
-            action='Registration',
-            ip_address=request.remote_addr,
-            status='success'
-        )
-        db.session.add(action)
+        # Log registration action (written together with the user in one commit)
+        log_action('Registration', status='success', user_id=user.id)
         db.session.commit()
 
         flash('Your account has been created! You can now log in.', 'success')
         return redirect(url_for('main.login'))
     elif request.method == 'POST':
         # Log failed registration attempt
-        action = ActionLog(
-            user_id=None,
-            action='Registration',
-            ip_address=request.remote_addr,
-            status='failure'
-        )
-        db.session.add(action)
-        db.session.commit()
+        log_action('Registration', status='failure')
 
     return render_template('register.html', form=form)
 
@@ -138,64 +120,34 @@ def login():
 
         if user:
             # Get number of failed login attempts in the last 15 minutes
-            recent_failed_logins = ActionLog.query.filter(
-                ActionLog.user_id == user.id,
-                ActionLog.action == 'Login',
-                ActionLog.status == 'failure',
-                ActionLog.timestamp >= datetime.utcnow() - BLOCK_DURATION
-            ).count()
+            failures_key = f"login_failure:{user.id}"
+            recent_failed_logins = rate_windows.count(failures_key, BLOCK_DURATION)
 
             if recent_failed_logins >= MAX_FAILED_ATTEMPTS:
                 # Log failed login attempt
-                action = ActionLog(
-                    user_id=user.id,
-                    action='Login',
-                    ip_address=request.remote_addr,
-                    status='failure'
-                )
-                db.session.add(action)
-                db.session.commit()
+                rate_windows.hit(failures_key)
+                log_action('Login', status='failure', user_id=user.id)
 
                 return redirect(url_for('main.error_page', error_type='too_many_attempts'))
 
-            if bcrypt.check_password_hash(user.password, password):
+            if passwords.verify_and_update(user, password):
                 login_user(user)
                 user.last_login = datetime.utcnow()
-                db.session.commit()
 
                 # Log successful login
-                action = ActionLog(
-                    user_id=user.id,
-                    action='Login',
-                    ip_address=request.remote_addr,
-                    status='success'
-                )
-                db.session.add(action)
+                log_action('Login', status='success', user_id=user.id)
                 db.session.commit()
 
                 return redirect(url_for('main.home'))
             else:
                 # Log failed login attempt
-                action = ActionLog(
-                    user_id=user.id,
-                    action='Login',
-                    ip_address=request.remote_addr,
-                    status='failure'
-                )
-                db.session.add(action)
-                db.session.commit()
+                rate_windows.hit(failures_key)
+                log_action('Login', status='failure', user_id=user.id)
 
                 return redirect(url_for('main.error_page', error_type='invalid_credentials'))
         else:
             # Log failed login attempt (user not found)
-            action = ActionLog(
-                user_id=None,
-                action='Login',
-                ip_address=request.remote_addr,
-                status='failure'
-            )
-            db.session.add(action)
-            db.session.commit()
+            log_action('Login', status='failure')
 
             return redirect(url_for('main.error_page', error_type='invalid_credentials'))
 
@@ -212,21 +164,20 @@ def change_password():
     form = ChangePasswordForm()
     if form.validate_on_submit():
         # Проверка количества изменений пароля за последние 24 часа
-        recent_password_changes = ActionLog.query.filter(
-            ActionLog.user_id == current_user.id,
-            ActionLog.action == 'Изменение пароля',
-            ActionLog.timestamp >= datetime.utcnow() - timedelta(hours=24)
-        ).count()
+        password_changes_key = f"password_change:{current_user.id}"
+        recent_password_changes = rate_windows.count(password_changes_key, timedelta(hours=24))
 
         if recent_password_changes >= 3:
             flash('Вы превысили лимит изменений пароля за последние 24 часа. Попробуйте позже.', 'danger')
             return redirect(url_for('main.profile'))
 
         # Проверка текущего пароля
-        if bcrypt.check_password_hash(current_user.password, form.current_password.data):
+        if passwords.check_password(current_user.password, form.current_password.data):
             # Генерация хэшированного нового пароля
-            hashed_password = bcrypt.generate_password_hash(form.new_password.data).decode('utf-8')
+            hashed_password = passwords.hash_password(form.new_password.data)
             current_user.password = hashed_password
+            # Логирование успешного изменения пароля в той же транзакции
+            log_action('Изменение пароля', status='success', user_id=current_user.id)
             try:
                 db.session.commit()
             except Exception as e:
@@ -234,39 +185,15 @@ def change_password():
                 logger.error(f"Ошибка при обновлении пароля пользователя {current_user.id}: {e}")
                 flash('Произошла ошибка при обновлении пароля. Попробуйте позже.', 'danger')
                 return redirect(url_for('main.change_password'))
-
-            # Логирование успешного изменения пароля
-            action = ActionLog(
-                user_id=current_user.id,
-                action='Изменение пароля',
-                ip_address=request.remote_addr,
-                status='success'
-            )
-            try:
-                db.session.add(action)
-                db.session.commit()
-            except Exception as e:
-                db.session.rollback()
-                logger.error(f"Ошибка при логировании изменения пароля пользователя {current_user.id}: {e}")
-                flash('Пароль обновлён, но произошла ошибка при логировании действия.', 'warning')
+            rate_windows.hit(password_changes_key)
 
             flash('Ваш пароль был обновлён!', 'success')
             return redirect(url_for('main.profile'))
         else:
             flash('Текущий пароль неверен.', 'danger')
             # Логирование неуспешного изменения пароля
-            action = ActionLog(
-                user_id=current_user.id,
-                action='Изменение пароля',
-                ip_address=request.remote_addr,
-                status='failure'
-            )
-            try:
-                db.session.add(action)
-                db.session.commit()
-            except Exception as e:
-                db.session.rollback()
-                logger.error(f"Ошибка при логировании неуспешного изменения пароля пользователя {current_user.id}: {e}")
+            rate_windows.hit(password_changes_key)
+            log_action('Изменение пароля', status='failure', user_id=current_user.id)
 
     return render_template('change_password.html', form=form)
 
@@ -288,11 +215,8 @@ def reset_password():
             token = serializer.dumps(user.email, salt='password-reset-salt')
             reset_url = url_for('main.reset_with_token', token=token, _external=True)
 
-            # Отправка письма с ссылкой для сброса пароля
-            msg = Message('Сброс Пароля',
-                          sender=current_app.config['MAIL_DEFAULT_SENDER'],
-                          recipients=[user.email])
-            msg.body = f'''Здравствуйте, {user.username}!
+            # Письмо со ссылкой для сброса пароля отправляется через очередь
+            body = f'''Здравствуйте, {user.username}!
 
 Вы получили это письмо, потому что вы (или кто-то другой) запросили сброс пароля для вашего аккаунта.
 
@@ -306,10 +230,12 @@ def reset_password():
 Команда c_work
 '''
             try:
-                mail.send(msg)
+                queue_email('Сброс Пароля', recipients=[user.email], body=body)
+                db.session.commit()
                 flash('Ссылка для сброса пароля отправлена на ваш email.', 'info')
             except Exception as e:
-                logger.error(f"Ошибка при отправке письма сброса пароля: {e}")
+                db.session.rollback()
+                logger.error(f"Ошибка при постановке письма сброса пароля в очередь: {e}")
                 flash('Не удалось отправить письмо. Пожалуйста, попробуйте позже.', 'danger')
         else:
             flash('Email не найден в системе.', 'danger')
@@ -334,8 +260,10 @@ def reset_with_token(token):
     user = User.query.filter_by(email=email).first_or_404()
     form = ResetPasswordForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        hashed_password = passwords.hash_password(form.password.data)
         user.password = hashed_password
+        # Логирование успешного сброса пароля в той же транзакции
+        log_action('Сброс пароля', status='success', user_id=user.id)
         try:
             db.session.commit()
         except Exception as e:
@@ -344,21 +272,6 @@ def reset_with_token(token):
             flash('Произошла ошибка при обновлении пароля. Попробуйте позже.', 'danger')
             return redirect(url_for('main.error_page', error_type='unknown_error'))
 
-        # Логирование успешного сброса пароля
-        action = ActionLog(
-            user_id=user.id,
-            action='Сброс пароля',
-            ip_address=request.remote_addr,
-            status='success'
-        )
-        try:
-            db.session.add(action)
-            db.session.commit()
-        except Exception as e:
-            db.session.rollback()
-            logger.error(f"Ошибка при логировании сброса пароля пользователя {user.id}: {e}")
-            flash('Пароль обновлён, но произошла ошибка при логировании действия.', 'warning')
-
         flash('Ваш пароль был успешно сброшен. Теперь вы можете войти.', 'success')
         return redirect(url_for('main.login'))
     return render_template('reset_with_token.html', form=form)
@@ -382,9 +295,8 @@ def logout():
 @main_bp.route('/classes')
 @login_required
 def classes():
-    classes = Class.query.order_by(Class.schedule.asc()).all()
-    booking_forms = {class_.id: BookingForm(class_id=class_.id) for class_ in classes}
-    return render_template('classes.html', classes=classes, booking_forms=booking_forms)
+    cards = fragment_cache.class_cards('partials/class_list_card.html', order_by='schedule')
+    return render_template('classes.html', cards=cards)
 
 
 
@@ -405,17 +317,10 @@ def book_class(class_id):
         selected_day = form.day.data
 
         # Проверка, не бронировал ли пользователь этот класс в этот день ранее
-        existing_booking = Booking.query.filter_by(user_id=current_user.id, class_id=class_id, day=selected_day).first()
-        if existing_booking:
+        if already_booked(current_user.id, class_id, selected_day):
             flash('Вы уже забронировали место в этом классе на выбранный день.', 'info')
             return redirect(url_for('main.classes'))
 
-        # Проверка доступности мест
-        confirmed_bookings = Booking.query.filter_by(class_id=class_id, day=selected_day, status='confirmed').count()
-        if confirmed_bookings >= class_.capacity:
-            flash('Извините, на этот день места уже заполнены.', 'danger')
-            return redirect(url_for('main.classes'))
-
         # Проверка массового бронирования
         recent_bookings = Booking.query.filter(
             Booking.user_id == current_user.id,
@@ -424,44 +329,27 @@ def book_class(class_id):
         if recent_bookings >= 10:
             flash('Вы сделали слишком много бронирований за короткий период. Попробуйте позже.', 'danger')
             # Логирование подозрительного действия
-            action = ActionLog(
-                user_id=current_user.id,
-                action='Массовое бронирование',
-                ip_address=request.remote_addr,
-                status='warning'
-            )
-            db.session.add(action)
-            db.session.commit()
+            log_action('Массовое бронирование', status='warning', user_id=current_user.id)
             return redirect(url_for('main.classes'))
 
-        # Создание бронирования
-        booking = Booking(user_id=current_user.id, class_id=class_id, day=selected_day)
-        db.session.add(booking)
-        db.session.commit()
-
-        # Логирование бронирования
-        action = ActionLog(
-            user_id=current_user.id,
-            action=f"Бронирование класса '{class_.name}' на {selected_day}",
-            ip_address=request.remote_addr,
-            status='success'
-        )
-        db.session.add(action)
-        db.session.commit()
+        # Создание бронирования с атомарным списанием места
+        booking = reserve_seat(current_user.id, class_, selected_day)
+        if booking is None:
+            flash('Извините, на этот день места уже заполнены.', 'danger')
+            return redirect(url_for('main.classes'))
 
-        # Отправка уведомления пользователю
-        try:
-            user_msg = Message(
-                'Подтверждение Бронирования',
-                recipients=[current_user.email]
-            )
-            user_msg.html = render_template(
+        # Уведомления пользователю и администраторам сохраняются в очередь в той же
+        # транзакции, что и бронирование, и отправляются фоновым обработчиком
+        queue_email(
+            'Подтверждение Бронирования',
+            recipients=[current_user.email],
+            html=render_template(
                 'emails/booking_confirmation.html',
                 user=current_user,
                 class_=class_,
                 selected_day=selected_day
-            )
-            user_msg.body = f'''Здравствуйте, {current_user.username}!
+            ),
+            body=f'''Здравствуйте, {current_user.username}!
 
 Вы успешно забронировали место на классе "{class_.name}".
 День недели: {selected_day}
@@ -472,21 +360,11 @@ def book_class(class_id):
 С уважением,
 Команда c_work
 '''
-            mail.send(user_msg)
-        except Exception as e:
-            logger.error(f"Ошибка при отправке подтверждения бронирования пользователю {current_user.id}: {e}")
-            flash('Не удалось отправить подтверждение бронирования на ваш email.', 'warning')
-
-        # Отправка уведомления администраторам
-        try:
-            admins = User.query.filter_by(is_admin=True).all()
-            admin_emails = [admin.email for admin in admins]
-            if admin_emails:
-                admin_msg = Message(
-                    'Новая Запись на Класс',
-                    recipients=admin_emails
-                )
-                admin_msg.body = f'''Здравствуйте!
+        )
+        queue_email(
+            'Новая Запись на Класс',
+            to_admins=True,
+            body=f'''Здравствуйте!
 
 Пользователь {current_user.username} ({current_user.email}) забронировал место на классе "{class_.name}".
 День недели: {selected_day}
@@ -497,10 +375,15 @@ def book_class(class_id):
 С уважением,
 Система c_work
 '''
-                mail.send(admin_msg)
-        except Exception as e:
-            logger.error(f"Ошибка при отправке уведомления администраторам: {e}")
-            flash('Не удалось отправить уведомление администраторам.', 'warning')
+        )
+
+        # Логирование бронирования
+        log_action(
+            f"Бронирование класса '{class_.name}' на {selected_day}",
+            status='success',
+            user_id=current_user.id
+        )
+        db.session.commit()
 
         flash('Класс успешно забронирован!', 'success')
         return redirect(url_for('main.my_bookings'))
@@ -517,7 +400,10 @@ def book_class(class_id):
 @login_required
 def my_bookings():
     # Получение только подтверждённых бронирований пользователя
-    bookings = Booking.query.filter_by(user_id=current_user.id, status='confirmed').order_by(Booking.booking_date.desc()).all()
+    bookings = Booking.query.options(joinedload(Booking.class_)) \
+        .filter_by(user_id=current_user.id, status='confirmed').order_by(Booking.booking_date.desc()).all()
+    # Классы и свободные места загружаются для всех бронирований сразу, а не в шаблоне по одному
+    Class.preload_available_slots(list({booking.class_ for booking in bookings}))
     cancel_forms = {booking.id: CancelBookingForm(booking_id=booking.id) for booking in bookings}
     return render_template('my_bookings.html', bookings=bookings, cancel_forms=cancel_forms)
 
@@ -540,37 +426,33 @@ def cancel_booking(booking_id):
             return redirect(url_for('main.profile'))
 
         # Проверка массовой отмены
-        recent_cancellations = ActionLog.query.filter(
-            ActionLog.user_id == current_user.id,
-            ActionLog.action.like('Отмена бронирования%'),
-            ActionLog.timestamp >= datetime.utcnow() - timedelta(minutes=10)
-        ).count()
+        cancellations_key = f"booking_cancel:{current_user.id}"
+        recent_cancellations = rate_windows.count(cancellations_key, timedelta(minutes=10))
         if recent_cancellations >= 10:
             flash('Вы отменили слишком много бронирований за короткий период. Попробуйте позже.', 'danger')
             # Логирование подозрительного действия
-            action = ActionLog(
-                user_id=current_user.id,
-                action='Массовая отмена бронирований',
-                ip_address=request.remote_addr,
-                status='warning'
+            log_action('Массовая отмена бронирований', status='warning', user_id=current_user.id)
+            return redirect(url_for('main.profile'))
+
+        try:
+            # Обновление статуса бронирования
+            booking.status = 'cancelled'
+
+            # Логирование отмены бронирования
+            log_action(
+                f"Отмена бронирования класса '{booking.class_.name}' на {booking.day}",
+                status='success',
+                user_id=current_user.id
             )
-            db.session.add(action)
             db.session.commit()
+        except StaleDataError:
+            # Бронирование изменено или удалено в другом запросе после загрузки
+            db.session.rollback()
+            logger.warning(f"Concurrent update of booking ID {booking_id} while cancelling by User ID {current_user.id}")
+            flash('Бронирование было изменено в другом запросе. Проверьте его статус и попробуйте снова.', 'warning')
             return redirect(url_for('main.profile'))
 
-        # Обновление статуса бронирования
-        booking.status = 'cancelled'
-        db.session.commit()
-
-        # Логирование отмены бронирования
-        action = ActionLog(
-            user_id=current_user.id,
-            action=f"Отмена бронирования класса '{booking.class_.name}' на {booking.day}",
-            ip_address=request.remote_addr,
-            status='success'
-        )
-        db.session.add(action)
-        db.session.commit()
+        rate_windows.hit(cancellations_key)
 
         logger.info(f"Booking ID {booking.id} cancelled by User ID {current_user.id}")
         flash('Бронирование успешно отменено.', 'success')
@@ -601,12 +483,10 @@ def profile():
             # Обработка загрузки аватара
             avatar_file = form.avatar.data
             if allowed_file(avatar_file.filename):
-                filename = secure_filename(avatar_file.filename)
-                unique_filename = f"{current_user.id}_{uuid.uuid4().hex}_{filename}"
-                avatar_path = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename)
                 try:
-                    avatar_file.save(avatar_path)
-                    current_user.avatar = unique_filename
+                    filename = images.store_upload(avatar_file)
+                    current_user.avatar = filename
+                    images.schedule_variants(filename)
                 except Exception as e:
                     logger.error(f"Ошибка при сохранении аватара пользователя {current_user.id}: {e}")
                     flash('Произошла ошибка при загрузке аватара.', 'danger')
@@ -618,15 +498,7 @@ def profile():
         current_user.username = form.username.data.strip()
         current_user.email = form.email.data.strip().lower()
 
-        try:
-            db.session.commit()
-        except Exception as e:
-            db.session.rollback()
-            logger.error(f"Ошибка при обновлении профиля пользователя {current_user.id}: {e}")
-            flash('Произошла ошибка при обновлении профиля.', 'danger')
-            return redirect(url_for('main.profile'))
-
-        # Логирование обновления профиля
+        # Логирование обновления профиля в той же транзакции
         changes = []
         if old_username != current_user.username:
             changes.append(f"Изменение имени пользователя: {old_username} → {current_user.username}")
@@ -636,37 +508,22 @@ def profile():
             changes.append("Обновление аватара")
 
         if changes:
-            action = ActionLog(
-                user_id=current_user.id,
-                action='; '.join(changes),
-                ip_address=request.remote_addr,
-                status='success'
-            )
-            try:
-                db.session.add(action)
-                db.session.commit()
-            except Exception as e:
-                db.session.rollback()
-                logger.error(f"Ошибка при логировании действия пользователя {current_user.id}: {e}")
-                flash('Произошла ошибка при логировании действия.', 'danger')
+            log_action('; '.join(changes), status='success', user_id=current_user.id)
+
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Ошибка при обновлении профиля пользователя {current_user.id}: {e}")
+            flash('Произошла ошибка при обновлении профиля.', 'danger')
+            return redirect(url_for('main.profile'))
 
         flash('Ваш профиль обновлён!', 'success')
         return redirect(url_for('main.profile'))
 
     elif request.method == 'POST':
         # Логирование неуспешной попытки обновления профиля (например, из-за ошибок валидации)
-        action = ActionLog(
-            user_id=current_user.id,
-            action='Обновление профиля',
-            ip_address=request.remote_addr,
-            status='failure'
-        )
-        try:
-            db.session.add(action)
-            db.session.commit()
-        except Exception as e:
-            db.session.rollback()
-            logger.error(f"Ошибка при логировании неуспешного действия пользователя {current_user.id}: {e}")
+        log_action('Обновление профиля', status='failure', user_id=current_user.id)
 
     # Получение подтверждённых бронирований пользователя
     confirmed_bookings = Booking.query.filter_by(user_id=current_user.id, status='confirmed').order_by(
@@ -737,14 +594,7 @@ def process_payment():
 @main_bp.route('/payment_success')
 @login_required
 def payment_success():
-    action = ActionLog(
-        user_id=current_user.id,
-        action='Успешный платёж',
-        ip_address=request.remote_addr,
-        status='success'
-    )
-    db.session.add(action)
-    db.session.commit()
+    log_action('Успешный платёж', status='success', user_id=current_user.id)
     logger.info(f"User {current_user.id} completed a payment successfully.")
     return render_template('payment_success.html')
 
@@ -755,14 +605,7 @@ def payment_success():
 @main_bp.route('/payment_failure')
 @login_required
 def payment_failure():
-    action = ActionLog(
-        user_id=current_user.id,
-        action='Ошибка платежа',
-        ip_address=request.remote_addr,
-        status='failure'
-    )
-    db.session.add(action)
-    db.session.commit()
+    log_action('Ошибка платежа', status='failure', user_id=current_user.id)
     logger.warning(f"User {current_user.id} encountered a payment failure.")
     return render_template('payment_failure.html')
 
@@ -793,14 +636,11 @@ def error_page(error_type):
         'message': 'Произошла неизвестная ошибка.'
     })
 
-    action = ActionLog(
-        user_id=current_user.id if current_user.is_authenticated else None,
-        action=f"Страница ошибки: {error_type}",
-        ip_address=request.remote_addr,
-        status='failure'
+    log_action(
+        f"Страница ошибки: {error_type}",
+        status='failure',
+        user_id=current_user.id if current_user.is_authenticated else None
     )
-    db.session.add(action)
-    db.session.commit()
 
     logger.error(f"Error page accessed: {error_type}. Message: {error['message']}")
     return render_template('error.html', error=error, error_type=error_type), 400
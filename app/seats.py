@@ -0,0 +1,289 @@
+# app/seats.py
+
+import logging
+from collections import defaultdict
+
+from sqlalchemy import event, inspect
+
+from app import db
+from app.models import Booking, Class, ClassSeatCounter
+
+logger = logging.getLogger(__name__)
+
+CONFIRMED = 'confirmed'
+
+# Ключ в session.info, под которым между before_flush и after_flush хранятся изменения счётчиков
+_PENDING_KEY = 'seat_counter_deltas'
+# Ключ в session.info для значений бронирований, прочитанных из базы под блокировкой в текущем flush
+_LOCKED_KEY = 'booking_locked_values'
+
+# Атрибуты бронирования, от которых зависят счётчики мест и сводки (app/stats.py)
+TRACKED_ATTRS = ('user_id', 'class_id', 'day', 'status')
+
+
+def _seat_key(class_id, day, status):
+    """Возвращает ключ (class_id, day), если бронирование занимает место, иначе None."""
+    if status != CONFIRMED or class_id is None or day is None:
+        return None
+    return class_id, day
+
+
+def old_values(session, state, attrs):
+    """
+    Значения атрибутов объекта до изменений в текущем flush.
+
+    Если атрибут был перезаписан без предварительной загрузки (например, после
+    commit объект истёк), прежнее значение читается из базы.
+
+    Returns:
+        dict | None: {атрибут: значение} или None, если строки уже нет в базе.
+    """
+    values = {}
+    for attr in attrs:
+        history = state.attrs[attr].history
+        if history.deleted:
+            values[attr] = history.deleted[0]
+        elif history.unchanged:
+            values[attr] = history.unchanged[0]
+        elif not history.added:
+            values[attr] = getattr(state.obj(), attr)
+
+    if len(values) < len(attrs) and state.identity:
+        model = state.class_
+        row = session.execute(
+            db.select(*[getattr(model, attr) for attr in attrs])
+            .where(model.id == state.identity[0])
+        ).first()
+        if row is None:
+            return None
+        for attr in attrs:
+            values.setdefault(attr, getattr(row, attr))
+
+    return values
+
+
+def has_tracked_changes(obj):
+    """Изменён ли у бронирования хотя бы один из TRACKED_ATTRS."""
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in TRACKED_ATTRS)
+
+
+def locked_booking_values(session):
+    """
+    Значения изменённых и удалённых в текущем flush бронирований, прочитанные
+    из базы после блокировки их строк.
+
+    История атрибутов хранит значения, загруженные в сессию, и может устареть:
+    если два запроса одновременно отменяют одно бронирование, оба увидели бы
+    статус 'confirmed' и дважды уменьшили бы счётчик. Пустой UPDATE блокирует
+    строки до конца транзакции (в SQLite — захватывает блокировку записи), поэтому
+    конкурирующий flush дожидается commit первого и читает уже новые значения.
+    Значения читаются одним запросом на flush и общие для всех слушателей.
+
+    Returns:
+        dict: {id бронирования: {атрибут: значение}}; строк, которых уже нет в базе, в словаре нет.
+    """
+    values = session.info.get(_LOCKED_KEY)
+    if values is not None:
+        return values
+
+    bookings = [obj for obj in session.deleted if isinstance(obj, Booking)] + \
+        [obj for obj in session.dirty if isinstance(obj, Booking) and has_tracked_changes(obj)]
+    booking_ids = [inspect(obj).identity[0] for obj in bookings if inspect(obj).identity]
+    values = session.info[_LOCKED_KEY] = {}
+    if booking_ids:
+        connection = session.connection()
+        connection.execute(
+            db.update(Booking).where(Booking.id.in_(booking_ids)).values(status=Booking.status)
+        )
+        rows = connection.execute(
+            db.select(Booking.id, *[getattr(Booking, attr) for attr in TRACKED_ATTRS])
+            .where(Booking.id.in_(booking_ids))
+        )
+        for row in rows:
+            values[row.id] = {attr: getattr(row, attr) for attr in TRACKED_ATTRS}
+    return values
+
+
+def _old_seat_key(session, state):
+    """Ключ места бронирования в базе до изменений в текущем flush."""
+    values = locked_booking_values(session).get(state.identity[0]) if state.identity else None
+    if values is None:
+        return None
+    return _seat_key(values['class_id'], values['day'], values['status'])
+
+
+def ensure_counter(connection, class_id, day):
+    """
+    Создаёт строку счётчика для (class_id, day), если её ещё нет.
+
+    Вместимость копируется из Class.capacity. Вставка выполняется через
+    INSERT ... ON CONFLICT DO NOTHING, поэтому безопасна при конкурентных запросах.
+    """
+    capacity = connection.execute(
+        db.select(Class.capacity).where(Class.id == class_id)
+    ).scalar()
+    if capacity is None:
+        return
+
+    values = {'class_id': class_id, 'day': day, 'confirmed': 0, 'capacity': capacity}
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        connection.execute(insert(ClassSeatCounter).values(**values).on_conflict_do_nothing())
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        connection.execute(insert(ClassSeatCounter).values(**values).on_conflict_do_nothing())
+    else:
+        exists = connection.execute(
+            db.select(ClassSeatCounter.class_id).where(
+                ClassSeatCounter.class_id == class_id,
+                ClassSeatCounter.day == day
+            )
+        ).first()
+        if not exists:
+            connection.execute(db.insert(ClassSeatCounter).values(**values))
+
+
+def ensure_counters(connection, capacities):
+    """
+    Создаёт недостающие строки счётчиков для нескольких пар одним запросом.
+
+    Args:
+        connection: Соединение текущей транзакции.
+        capacities (dict): {(class_id, day): вместимость класса}.
+    """
+    if not capacities:
+        return
+    rows = [
+        {'class_id': class_id, 'day': day, 'confirmed': 0, 'capacity': capacity}
+        for (class_id, day), capacity in capacities.items()
+    ]
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        connection.execute(insert(ClassSeatCounter).values(rows).on_conflict_do_nothing())
+    else:
+        for class_id, day in capacities:
+            ensure_counter(connection, class_id, day)
+
+
+def apply_delta(connection, class_id, day, delta):
+    """Атомарно изменяет счётчик подтверждённых бронирований на delta."""
+    if delta > 0:
+        ensure_counter(connection, class_id, day)
+    connection.execute(
+        db.update(ClassSeatCounter)
+        .where(ClassSeatCounter.class_id == class_id, ClassSeatCounter.day == day)
+        .values(confirmed=ClassSeatCounter.confirmed + delta)
+    )
+
+
+@event.listens_for(db.session, 'before_flush')
+def _collect_seat_deltas(session, flush_context, instances):
+    """
+    Собирает изменения счётчиков для изменённых и удалённых бронирований и
+    удаляет счётчики удаляемых классов.
+
+    Новые бронирования обрабатываются в after_flush, когда у них уже есть
+    значения по умолчанию (например, status='confirmed').
+    """
+    deltas = session.info.setdefault(_PENDING_KEY, defaultdict(int))
+
+    # Строки счётчика ссылаются на класс, поэтому удаляются до него
+    deleted_classes = [inspect(obj).identity[0] for obj in session.deleted
+                       if isinstance(obj, Class) and inspect(obj).identity]
+    if deleted_classes:
+        session.connection().execute(
+            db.delete(ClassSeatCounter).where(ClassSeatCounter.class_id.in_(deleted_classes))
+        )
+
+    for obj in session.dirty:
+        if not isinstance(obj, Booking) or not has_tracked_changes(obj):
+            continue
+        old_key = _old_seat_key(session, inspect(obj))
+        new_key = _seat_key(obj.class_id, obj.day, obj.status)
+        if old_key == new_key:
+            continue
+        if old_key:
+            deltas[old_key] -= 1
+        if new_key:
+            deltas[new_key] += 1
+
+    for obj in session.deleted:
+        if not isinstance(obj, Booking):
+            continue
+        key = _old_seat_key(session, inspect(obj))
+        if key and key[0] not in deleted_classes:
+            deltas[key] -= 1
+
+
+@event.listens_for(db.session, 'after_flush')
+def _apply_seat_deltas(session, flush_context):
+    """
+    Применяет накопленные изменения счётчиков в той же транзакции, что и flush.
+    """
+    deltas = session.info.pop(_PENDING_KEY, None) or defaultdict(int)
+    session.info.pop(_LOCKED_KEY, None)
+
+    for obj in session.new:
+        # Места для бронирований, созданных через app.reservations, уже учтены
+        if isinstance(obj, Booking) and not getattr(obj, '_seat_counted', False):
+            key = _seat_key(obj.class_id, obj.day, obj.status)
+            if key:
+                deltas[key] += 1
+
+    connection = session.connection()
+
+    for obj in session.dirty:
+        if isinstance(obj, Class) and inspect(obj).attrs.capacity.history.has_changes():
+            connection.execute(
+                db.update(ClassSeatCounter)
+                .where(ClassSeatCounter.class_id == obj.id)
+                .values(capacity=obj.capacity)
+            )
+
+    for (class_id, day), delta in deltas.items():
+        if delta:
+            apply_delta(connection, class_id, day, delta)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_seat_deltas(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_LOCKED_KEY, None)
+
+
+def rebuild_seat_counters():
+    """
+    Пересчитывает таблицу class_seat_counter по таблице booking.
+
+    Используется для сверки после ручных правок в базе или массовых
+    операций Query.update()/delete(), которые обходят события сессии.
+
+    Returns:
+        int: Количество созданных строк счётчиков.
+    """
+    db.session.execute(db.delete(ClassSeatCounter))
+
+    rows = db.session.query(
+        Booking.class_id,
+        Booking.day,
+        db.func.count(Booking.id),
+        Class.capacity
+    ).join(Class, Class.id == Booking.class_id) \
+        .filter(Booking.status == CONFIRMED) \
+        .group_by(Booking.class_id, Booking.day, Class.capacity) \
+        .all()
+
+    if rows:
+        db.session.execute(db.insert(ClassSeatCounter), [
+            {'class_id': class_id, 'day': day, 'confirmed': confirmed, 'capacity': capacity}
+            for class_id, day, confirmed, capacity in rows
+        ])
+    db.session.commit()
+    logger.info(f"Seat counters rebuilt: {len(rows)} rows.")
+    return len(rows)
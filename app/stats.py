@@ -0,0 +1,175 @@
+# app/stats.py
+
+import logging
+from collections import defaultdict
+
+from sqlalchemy import event, inspect
+
+from app import db
+from app.models import Booking, BookingListVersion, Payment, PaymentStatusStat, User, UserBookingStat
+from app.seats import CONFIRMED, has_tracked_changes, locked_booking_values, old_values
+
+logger = logging.getLogger(__name__)
+
+# Ключи в session.info, под которыми между before_flush и after_flush хранятся изменения сводок
+_USER_DELTAS_KEY = 'user_booking_stat_deltas'
+_PAYMENT_DELTAS_KEY = 'payment_status_stat_deltas'
+_LIST_USERS_KEY = 'booking_list_version_users'
+
+
+def increment(connection, model, key, column, delta):
+    """
+    Атомарно увеличивает счётчик column в строке сводки с первичным ключом key,
+    создавая строку при необходимости (INSERT ... ON CONFLICT DO UPDATE).
+    """
+    target = getattr(model, column)
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        connection.execute(
+            insert(model).values(**key, **{column: delta})
+            .on_conflict_do_update(index_elements=list(key), set_={column: target + delta})
+        )
+        return
+
+    updated = connection.execute(
+        db.update(model)
+        .where(*[getattr(model, name) == value for name, value in key.items()])
+        .values({column: target + delta})
+    ).rowcount
+    if not updated:
+        connection.execute(db.insert(model).values(**key, **{column: delta}))
+
+
+def _booking_user(user_id, status):
+    return user_id if status == CONFIRMED and user_id is not None else None
+
+
+@event.listens_for(db.session, 'before_flush')
+def _collect_stat_deltas(session, flush_context, instances):
+    """
+    Собирает изменения сводок для изменённых и удалённых бронирований и платежей
+    и пользователей, у которых изменился список бронирований (BookingListVersion).
+
+    Новые объекты обрабатываются в after_flush, когда у них уже есть значения
+    по умолчанию.
+    """
+    user_deltas = session.info.setdefault(_USER_DELTAS_KEY, defaultdict(int))
+    payment_deltas = session.info.setdefault(_PAYMENT_DELTAS_KEY, defaultdict(int))
+    list_users = session.info.setdefault(_LIST_USERS_KEY, set())
+
+    # Прежние значения бронирований читаются из базы под блокировкой (см. app/seats.py)
+    locked = locked_booking_values(session)
+
+    for obj in session.dirty:
+        if isinstance(obj, Booking) and session.is_modified(obj):
+            list_users.add(obj.user_id)
+            if not has_tracked_changes(obj):
+                continue
+            old = locked.get(inspect(obj).identity[0]) or {}
+            list_users.add(old.get('user_id'))
+            old_user = _booking_user(old.get('user_id'), old.get('status'))
+            new_user = _booking_user(obj.user_id, obj.status)
+            if old_user != new_user:
+                if old_user:
+                    user_deltas[old_user] -= 1
+                if new_user:
+                    user_deltas[new_user] += 1
+        elif isinstance(obj, Payment) and session.is_modified(obj):
+            old = old_values(session, inspect(obj), ('status',)) or {}
+            if old.get('status') != obj.status:
+                if old.get('status'):
+                    payment_deltas[old['status']] -= 1
+                payment_deltas[obj.status] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, Booking):
+            old = locked.get(inspect(obj).identity[0]) or {}
+            list_users.add(old.get('user_id'))
+            old_user = _booking_user(old.get('user_id'), old.get('status'))
+            if old_user:
+                user_deltas[old_user] -= 1
+        elif isinstance(obj, Payment):
+            old = old_values(session, inspect(obj), ('status',)) or {}
+            if old.get('status'):
+                payment_deltas[old['status']] -= 1
+        elif isinstance(obj, User):
+            # Строки сводки и версии списка ссылаются на пользователя, поэтому удаляются до него
+            session.execute(db.delete(UserBookingStat).where(UserBookingStat.user_id == obj.id))
+            session.execute(db.delete(BookingListVersion).where(BookingListVersion.user_id == obj.id))
+            user_deltas.pop(obj.id, None)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _apply_stat_deltas(session, flush_context):
+    """
+    Применяет накопленные изменения сводок в той же транзакции, что и flush.
+    """
+    user_deltas = session.info.pop(_USER_DELTAS_KEY, None) or defaultdict(int)
+    payment_deltas = session.info.pop(_PAYMENT_DELTAS_KEY, None) or defaultdict(int)
+    list_users = session.info.pop(_LIST_USERS_KEY, None) or set()
+
+    for obj in session.new:
+        if isinstance(obj, Booking):
+            list_users.add(obj.user_id)
+            new_user = _booking_user(obj.user_id, obj.status)
+            if new_user:
+                user_deltas[new_user] += 1
+        elif isinstance(obj, Payment):
+            payment_deltas[obj.status] += 1
+
+    connection = session.connection()
+    for user_id, delta in user_deltas.items():
+        if delta:
+            increment(connection, UserBookingStat, {'user_id': user_id}, 'confirmed', delta)
+    for status, delta in payment_deltas.items():
+        if delta:
+            increment(connection, PaymentStatusStat, {'status': status}, 'count', delta)
+
+    deleted_users = {obj.id for obj in session.deleted if isinstance(obj, User)}
+    for user_id in list_users - deleted_users - {None}:
+        increment(connection, BookingListVersion, {'user_id': user_id}, 'version', 1)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_stat_deltas(session):
+    session.info.pop(_USER_DELTAS_KEY, None)
+    session.info.pop(_PAYMENT_DELTAS_KEY, None)
+    session.info.pop(_LIST_USERS_KEY, None)
+
+
+def rebuild_statistics():
+    """
+    Пересчитывает сводки user_booking_stat и payment_status_stat по исходным таблицам.
+
+    Сводки по классам и часам занятий строятся из class_seat_counter, который
+    пересчитывается командой `flask rebuild-seat-counters`.
+
+    Returns:
+        tuple[int, int]: Количество строк сводки по пользователям и по статусам платежей.
+    """
+    db.session.execute(db.delete(UserBookingStat))
+    db.session.execute(db.delete(PaymentStatusStat))
+
+    user_rows = db.session.query(Booking.user_id, db.func.count(Booking.id)) \
+        .filter(Booking.status == CONFIRMED) \
+        .group_by(Booking.user_id) \
+        .all()
+    payment_rows = db.session.query(Payment.status, db.func.count(Payment.id)) \
+        .group_by(Payment.status) \
+        .all()
+
+    if user_rows:
+        db.session.execute(db.insert(UserBookingStat), [
+            {'user_id': user_id, 'confirmed': confirmed} for user_id, confirmed in user_rows
+        ])
+    if payment_rows:
+        db.session.execute(db.insert(PaymentStatusStat), [
+            {'status': status, 'count': count} for status, count in payment_rows
+        ])
+    db.session.commit()
+    logger.info(f"Statistics rebuilt: {len(user_rows)} user rows, {len(payment_rows)} payment status rows.")
+    return len(user_rows), len(payment_rows)
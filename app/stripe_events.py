@@ -0,0 +1,121 @@
+# app/stripe_events.py
+
+import json
+import logging
+from datetime import datetime
+
+from app import db
+from app.models import StripeEvent
+from app.work_queue import WorkQueue
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_event(event_id, event_type, payload):
+    """
+    Сохраняет событие Stripe в очередь, если оно ещё не было получено.
+
+    Вставка выполняется через INSERT ... ON CONFLICT DO NOTHING по идентификатору
+    события, поэтому повторные и параллельные доставки не создают дубликатов.
+    Запись сохраняется с ближайшим commit текущей сессии.
+
+    Args:
+        event_id (str): Идентификатор события Stripe.
+        event_type (str): Тип события.
+        payload (str): JSON события.
+
+    Returns:
+        bool: True, если событие новое.
+    """
+    now = datetime.utcnow()
+    values = {
+        'id': event_id,
+        'type': event_type,
+        'payload': payload,
+        'status': 'pending',
+        'attempts': 0,
+        'received_at': now,
+        'next_attempt_at': now,
+    }
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        created = db.session.execute(
+            insert(StripeEvent).values(**values).on_conflict_do_nothing(index_elements=['id'])
+        ).rowcount == 1
+    else:
+        created = db.session.get(StripeEvent, event_id) is None
+        if created:
+            db.session.execute(db.insert(StripeEvent).values(**values))
+
+    if created:
+        stripe_event_queue.notify()
+    return created
+
+
+def _handlers():
+    from app.webhooks import EVENT_HANDLERS
+    return EVENT_HANDLERS
+
+
+def process_pending_events(batch_size=None):
+    """
+    Обрабатывает один пакет событий из очереди.
+
+    Каждое событие обрабатывается в своей транзакции вместе с отметкой о
+    выполнении. Неудачные события откладываются с экспоненциальной задержкой;
+    после STRIPE_EVENTS_MAX_ATTEMPTS попыток событие помечается как 'dead'
+    и остаётся в таблице для разбора (см. WorkQueue.schedule_retry).
+
+    Args:
+        batch_size (int | None): Размер пакета, по умолчанию STRIPE_EVENTS_BATCH_SIZE.
+
+    Returns:
+        int: Количество взятых в обработку событий.
+    """
+    handlers = _handlers()
+
+    event_ids = stripe_event_queue.claim_due(stripe_event_queue.batch_size(batch_size))
+    for event_id in event_ids:
+        stripe_event = db.session.get(StripeEvent, event_id)
+        try:
+            handler = handlers.get(stripe_event.type)
+            if handler is None:
+                logger.warning(f"Unhandled event type: {stripe_event.type}")
+            else:
+                handler(json.loads(stripe_event.payload)['data']['object'])
+            stripe_event.status = 'processed'
+            stripe_event.processed_at = datetime.utcnow()
+            stripe_event.last_error = None
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            stripe_event_queue.schedule_retry(db.session.get(StripeEvent, event_id), e)
+            db.session.commit()
+
+    if event_ids:
+        logger.info(f"Stripe events: processed batch of {len(event_ids)}.")
+    return len(event_ids)
+
+
+def requeue_dead_events():
+    """
+    Возвращает события из 'dead' в очередь (например, после исправления ошибки).
+
+    Returns:
+        int: Количество возвращённых событий.
+    """
+    count = db.session.execute(
+        db.update(StripeEvent)
+        .where(StripeEvent.status == 'dead')
+        .values(status='pending', attempts=0, next_attempt_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return count
+
+
+stripe_event_queue = WorkQueue(StripeEvent, 'STRIPE_EVENTS', process_pending_events, name='stripe-events-worker',
+                               label='Событие Stripe {}', failed_status='dead', max_attempts=8)
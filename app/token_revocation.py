@@ -0,0 +1,212 @@
+# app/token_revocation.py
+
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app, has_app_context
+
+from app import db, jwt
+from app.models import RefreshTokenFamily, RevokedToken
+
+logger = logging.getLogger(__name__)
+
+# Запас при догрузке записей других процессов: строка получает revoked_at до commit,
+# поэтому перечитываются записи за последнюю минуту перед предыдущей синхронизацией
+SYNC_OVERLAP = timedelta(minutes=1)
+
+
+def _compact(jti):
+    # jti Flask-JWT-Extended — UUID: в памяти хранятся 16 байт вместо 36 символов
+    try:
+        return uuid.UUID(jti).bytes
+    except (TypeError, ValueError, AttributeError):
+        return jti
+
+
+class RevocationSet:
+    """
+    Список отзыва JWT в памяти процесса.
+
+    Хранит jti со временем истечения токена; записи истёкших токенов
+    удаляются при синхронизации (такие токены отклоняются и без списка).
+    sync() догружает из revoked_token записи, добавленные другими процессами,
+    не чаще раза в sync_interval секунд, поэтому проверка токена обычно
+    обходится без запроса к базе.
+    """
+
+    def __init__(self, sync_interval=10):
+        self.sync_interval = sync_interval
+        self._entries = {}
+        self._synced_at = None
+        self._synced_since = None
+        self._lock = threading.Lock()
+
+    def add(self, jti, expires_at):
+        with self._lock:
+            self._entries[_compact(jti)] = expires_at
+
+    def __contains__(self, jti):
+        return _compact(jti) in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def needs_sync(self):
+        return self._synced_at is None or time.monotonic() - self._synced_at >= self.sync_interval
+
+    def sync(self):
+        """Догружает отозванные токены из базы и удаляет из памяти истёкшие."""
+        with self._lock:
+            now = datetime.utcnow()
+            query = db.session.query(RevokedToken.jti, RevokedToken.expires_at) \
+                .filter(RevokedToken.expires_at > now)
+            if self._synced_since is not None:
+                query = query.filter(RevokedToken.revoked_at >= self._synced_since - SYNC_OVERLAP)
+            for jti, expires_at in query:
+                self._entries[_compact(jti)] = expires_at
+            self._entries = {key: expires_at for key, expires_at in self._entries.items() if expires_at > now}
+            self._synced_since = now
+            self._synced_at = time.monotonic()
+
+
+def _get_revocations():
+    return current_app.extensions.get('token_revocation') if has_app_context() else None
+
+
+def is_revoked(jti):
+    """
+    Проверяет, отозван ли токен.
+
+    Args:
+        jti (str): Идентификатор токена.
+
+    Returns:
+        bool: True, если токен отозван.
+    """
+    revocations = _get_revocations()
+    if revocations is None:
+        return db.session.query(RevokedToken.id).filter_by(jti=jti).first() is not None
+    if revocations.needs_sync():
+        try:
+            revocations.sync()
+        except Exception as e:
+            # Список в памяти остаётся прежним; следующая попытка — через sync_interval
+            logger.error(f"Ошибка при синхронизации списка отозванных токенов: {e}")
+            db.session.rollback()
+    return jti in revocations
+
+
+def revoke(token):
+    """
+    Отзывает токен. Запись в revoked_token сохраняется при commit вызывающего
+    кода; в списке этого процесса токен отклоняется сразу.
+
+    Args:
+        token (dict): Декодированный токен (get_jwt()).
+    """
+    expires_at = datetime.fromtimestamp(token['exp'], timezone.utc).replace(tzinfo=None)
+    db.session.add(RevokedToken(
+        jti=token['jti'],
+        token_type=token.get('type', 'access'),
+        user_id=int(token['sub']) if str(token.get('sub', '')).isdigit() else None,
+        expires_at=expires_at,
+    ))
+    revocations = _get_revocations()
+    if revocations is not None:
+        revocations.add(token['jti'], expires_at)
+
+
+def _refresh_expires_at():
+    return datetime.utcnow() + current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
+
+
+def start_family(user_id):
+    """
+    Создаёт цепочку refresh-токенов для нового входа. Строка сохраняется при
+    commit вызывающего кода.
+
+    Returns:
+        dict: Claims для первого refresh-токена цепочки: {'fam': id, 'gen': 0}.
+    """
+    family = RefreshTokenFamily(id=str(uuid.uuid4()), user_id=user_id, generation=0,
+                                expires_at=_refresh_expires_at())
+    db.session.add(family)
+    return {'fam': family.id, 'gen': 0}
+
+
+def rotate_family(token):
+    """
+    Переводит цепочку предъявленного refresh-токена на следующее поколение.
+
+    Условный UPDATE принимает только последний выданный токен неотозванной
+    цепочки, поэтому из двух одновременных обменов успешен один. Если токен
+    старый (повторное использование после ротации), отзывается вся цепочка:
+    украденный и законный токены перестают работать одновременно.
+
+    Args:
+        token (dict): Декодированный refresh-токен с claims fam и gen.
+
+    Returns:
+        dict | None: Claims для нового refresh-токена или None, если токен отклонён.
+    """
+    family_id, generation = token['fam'], token['gen']
+    rotated = db.session.execute(
+        db.update(RefreshTokenFamily)
+        .where(
+            RefreshTokenFamily.id == family_id,
+            RefreshTokenFamily.generation == generation,
+            RefreshTokenFamily.revoked.is_(False)
+        )
+        .values(generation=generation + 1, expires_at=_refresh_expires_at())
+    ).rowcount
+    if rotated:
+        return {'fam': family_id, 'gen': generation + 1}
+
+    revoke_family(family_id)
+    logger.warning(f"Повторное использование refresh-токена цепочки {family_id} (поколение {generation}); цепочка отозвана")
+    return None
+
+
+def revoke_family(family_id):
+    """Отзывает цепочку refresh-токенов; изменение сохраняется при commit вызывающего кода."""
+    db.session.execute(
+        db.update(RefreshTokenFamily).where(RefreshTokenFamily.id == family_id).values(revoked=True)
+    )
+
+
+def prune_expired():
+    """
+    Удаляет записи об отозванных токенах и цепочки refresh-токенов, срок
+    действия которых истёк.
+
+    Returns:
+        int: Количество удалённых записей.
+    """
+    now = datetime.utcnow()
+    deleted = RevokedToken.query.filter(RevokedToken.expires_at <= now).delete()
+    deleted += RefreshTokenFamily.query.filter(RefreshTokenFamily.expires_at <= now).delete()
+    db.session.commit()
+    return deleted
+
+
+@jwt.token_in_blocklist_loader
+def _check_if_token_revoked(jwt_header, jwt_payload):
+    return is_revoked(jwt_payload['jti'])
+
+
+def init_app(app):
+    """
+    Подключает список отзыва JWT (REVOKED_TOKENS_SYNC_INTERVAL).
+
+    Отзыв в другом процессе становится виден не позднее чем через
+    REVOKED_TOKENS_SYNC_INTERVAL секунд.
+
+    Args:
+        app (Flask): Экземпляр приложения.
+    """
+    app.extensions['token_revocation'] = RevocationSet(
+        sync_interval=app.config.get('REVOKED_TOKENS_SYNC_INTERVAL', 10)
+    )
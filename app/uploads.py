@@ -0,0 +1,173 @@
+# app/uploads.py
+
+import hashlib
+import logging
+import os
+import tempfile
+
+from flask import Request, current_app
+from werkzeug.exceptions import UnsupportedMediaType
+
+logger = logging.getLogger(__name__)
+
+# Сигнатуры (magic bytes) допустимых форматов изображений; ключ — расширение сохраняемого файла
+SIGNATURES = {
+    'jpg': (b'\xff\xd8\xff',),
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'gif': (b'GIF87a', b'GIF89a'),
+}
+_HEAD_SIZE = max(len(signature) for signatures in SIGNATURES.values() for signature in signatures)
+
+
+class InvalidImageError(UnsupportedMediaType):
+    """Содержимое загруженного файла не совпадает ни с одной допустимой сигнатурой."""
+    description = 'Файл не является изображением допустимого формата (PNG, JPEG, GIF).'
+
+
+def detect_image_type(head, allowed=None):
+    """
+    Определяет формат изображения по первым байтам.
+
+    Args:
+        head (bytes): Начало файла.
+        allowed (set | None): Допустимые расширения (ALLOWED_EXTENSIONS); None — любые из SIGNATURES.
+
+    Returns:
+        str | None: Расширение ('jpg', 'png', 'gif') или None.
+    """
+    for extension, signatures in SIGNATURES.items():
+        if allowed is not None and extension not in allowed and not (extension == 'jpg' and 'jpeg' in allowed):
+            continue
+        if head.startswith(signatures):
+            return extension
+    return None
+
+
+class UploadStream:
+    """
+    Приёмник загружаемого изображения.
+
+    Данные пишутся блоками во временный файл в tmp_folder (UPLOAD_TMP_FOLDER —
+    непубличный каталог на той же файловой системе, что и каталог назначения)
+    с подсчётом sha256, поэтому в памяти хранится только первый блок сигнатуры. Сигнатура
+    проверяется, как только получены первые байты: неподходящий файл отклоняется
+    (InvalidImageError, 415) до чтения остальной части запроса. commit()
+    атомарно переименовывает файл в <sha256[:32]>.<расширение>; незафиксированный
+    временный файл удаляется в close().
+    """
+
+    def __init__(self, folder, allowed=None, tmp_folder=None):
+        self.folder = folder
+        self.allowed = allowed
+        self.tmp_folder = tmp_folder or folder
+        self.kind = None
+        self.size = 0
+        self._head = b''
+        self._digest = hashlib.sha256()
+        self._file = None
+        self._tmp_path = None
+
+    def write(self, data):
+        if not data:
+            return 0
+        if self.kind is None:
+            self._head += bytes(data[:_HEAD_SIZE - len(self._head)])
+            if len(self._head) >= _HEAD_SIZE:
+                self._validate()
+        if self._file is None:
+            os.makedirs(self.tmp_folder, exist_ok=True)
+            fd, self._tmp_path = tempfile.mkstemp(prefix='.upload.', suffix='.tmp', dir=self.tmp_folder)
+            self._file = os.fdopen(fd, 'w+b')
+        self._digest.update(data)
+        self._file.write(data)
+        self.size += len(data)
+        return len(data)
+
+    def _validate(self):
+        self.kind = detect_image_type(self._head, self.allowed)
+        if self.kind is None:
+            self.close()
+            logger.warning(f"Загрузка отклонена: неизвестная сигнатура {self._head[:_HEAD_SIZE].hex()}")
+            raise InvalidImageError()
+
+    def commit(self):
+        """
+        Сохраняет файл под именем из хэша содержимого. Если такой файл уже есть,
+        используется он, а временный удаляется.
+
+        Returns:
+            str: Имя сохранённого файла.
+
+        Raises:
+            InvalidImageError: Файл пустой или не является изображением.
+        """
+        if self.kind is None:
+            self._validate()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        name = f"{self._digest.hexdigest()[:32]}.{self.kind}"
+        path = os.path.join(self.folder, name)
+        os.makedirs(self.folder, exist_ok=True)
+        if os.path.exists(path):
+            os.remove(self._tmp_path)
+            logger.info(f"Изображение {name} уже загружено, используется существующий файл.")
+        else:
+            os.replace(self._tmp_path, path)
+        self._file = self._tmp_path = None
+        return name
+
+    def read(self, size=-1):
+        return self._file.read(size) if self._file is not None else b''
+
+    def readline(self, size=-1):
+        return self._file.readline(size) if self._file is not None else b''
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self._file.seek(offset, whence) if self._file is not None else 0
+
+    def tell(self):
+        return self._file.tell() if self._file is not None else 0
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._tmp_path is not None:
+            try:
+                os.remove(self._tmp_path)
+            except FileNotFoundError:
+                pass
+            self._tmp_path = None
+
+
+def upload_stream():
+    """UploadStream с каталогами и допустимыми форматами из настроек приложения."""
+    config = current_app.config
+    return UploadStream(config['UPLOAD_FOLDER'], config.get('ALLOWED_EXTENSIONS'), config.get('UPLOAD_TMP_FOLDER'))
+
+
+class UploadRequest(Request):
+    """
+    Запрос, в котором файлы из multipart/form-data сразу пишутся через UploadStream
+    в UPLOAD_TMP_FOLDER вместо буфера в памяти или промежуточного временного файла.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if not filename:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return upload_stream()
+
+
+def init_app(app):
+    """
+    Включает потоковый приём загружаемых изображений.
+
+    Args:
+        app (Flask): Экземпляр приложения.
+    """
+    app.request_class = UploadRequest
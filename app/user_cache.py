@@ -0,0 +1,169 @@
+# app/user_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from app import db
+from app.models import User
+
+_INVALIDATE_KEY = 'user_cache_invalidate'
+
+
+class UserCache:
+    """
+    Ограниченный по размеру кэш пользователей с коротким TTL.
+
+    Хранит отсоединённые снимки столбцов User. Каждая invalidate() получает
+    следующий номер; загрузка запоминает текущий номер (version()), и set()
+    отбрасывает снимок, если пользователь был инвалидирован после начала
+    загрузки. Номера инвалидаций хранятся не более чем для max_size
+    пользователей; для забытых действует наибольший забытый номер, поэтому
+    память ограничена, а устаревший снимок по-прежнему не попадёт в кэш.
+    """
+
+    def __init__(self, ttl=15, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._invalidations = OrderedDict()
+        self._counter = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, snapshot = entry
+            if expires_at <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return snapshot
+
+    def version(self, user_id):
+        """Метка начала загрузки пользователя для set()."""
+        with self._lock:
+            return self._counter
+
+    def set(self, user_id, snapshot, version):
+        with self._lock:
+            if self._invalidations.get(user_id, self._floor) > version:
+                return
+            self._entries[user_id] = (time.monotonic() + self.ttl, snapshot)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._counter += 1
+            self._invalidations[user_id] = self._counter
+            self._invalidations.move_to_end(user_id)
+            while len(self._invalidations) > self.max_size:
+                _, self._floor = self._invalidations.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._counter += 1
+            self._floor = self._counter
+            self._invalidations.clear()
+            self._entries.clear()
+
+
+def _snapshot(user):
+    """Отсоединённая копия столбцов пользователя без изменений (для Session.merge(load=False))."""
+    snapshot = User(**{attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs})
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+
+def _get_cache():
+    return current_app.extensions.get('user_cache') if has_app_context() else None
+
+
+def get_user(user_id):
+    """
+    Возвращает пользователя по id, по возможности без запроса к базе.
+
+    Объект присоединяется к текущей сессии, поэтому его можно изменять
+    и сохранять как обычно.
+
+    Args:
+        user_id (int): Идентификатор пользователя.
+
+    Returns:
+        User | None: Пользователь или None, если он не найден.
+    """
+    cache = _get_cache()
+    if cache is None:
+        return db.session.get(User, user_id)
+
+    # Пользователь уже загружен в текущей сессии
+    user = db.session.identity_map.get(db.session.identity_key(User, user_id))
+    if user is not None:
+        return user
+
+    snapshot = cache.get(user_id)
+    if snapshot is not None:
+        return db.session.merge(snapshot, load=False)
+
+    version = cache.version(user_id)
+    user = db.session.get(User, user_id)
+    if user is not None:
+        cache.set(user_id, _snapshot(user), version)
+    return user
+
+
+def invalidate(user_id):
+    """Удаляет пользователя из кэша (например, после массового UPDATE в обход сессии)."""
+    cache = _get_cache()
+    if cache is not None:
+        cache.invalidate(user_id)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    # Профиль, пароль, права администратора и удаление — любые изменения User
+    user_ids = {obj.id for obj in session.dirty if isinstance(obj, User) and session.is_modified(obj)}
+    user_ids.update(obj.id for obj in session.deleted if isinstance(obj, User))
+    if user_ids:
+        session.info.setdefault(_INVALIDATE_KEY, set()).update(user_ids)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_committed_users(session):
+    user_ids = session.info.pop(_INVALIDATE_KEY, None)
+    cache = _get_cache()
+    if user_ids and cache is not None:
+        for user_id in user_ids:
+            cache.invalidate(user_id)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_changed_users(session):
+    session.info.pop(_INVALIDATE_KEY, None)
+
+
+def init_app(app):
+    """
+    Подключает кэш пользователей (USER_CACHE_TTL, USER_CACHE_MAX_SIZE).
+
+    Кэш локален для процесса: в других воркерах изменения становятся видны
+    не позднее чем через USER_CACHE_TTL секунд.
+
+    Args:
+        app (Flask): Экземпляр приложения.
+    """
+    if app.config.get('USER_CACHE_TTL', 15) > 0:
+        app.extensions['user_cache'] = UserCache(
+            ttl=app.config.get('USER_CACHE_TTL', 15),
+            max_size=app.config.get('USER_CACHE_MAX_SIZE', 10000)
+        )
@@ -1,21 +1,26 @@
 import logging
 from flask import Blueprint, request, current_app, jsonify
 from flask_wtf.csrf import CSRFProtect
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 import stripe
 
+from app.rate_limits import limiter
+
 webhook_bp = Blueprint('webhooks', __name__)
 
 csrf = CSRFProtect()
-limiter = Limiter(key_func=get_remote_address)
 
 @webhook_bp.route('/stripe_webhook', methods=['POST'])
 @limiter.exempt
 @csrf.exempt
 def stripe_webhook():
-    from app.models import ActionLog
+    """
+    Принимает событие Stripe: проверяет подпись, сохраняет событие в очередь
+    stripe_event и сразу отвечает 200. Обработка выполняется в фоне
+    (app/stripe_events.py); повторные доставки того же события игнорируются.
+    """
     from app import db
+    from app.audit import log_action
+    from app.stripe_events import enqueue_event
 
     payload = request.get_data(as_text=True)
     sig_header = request.headers.get('Stripe-Signature')
@@ -24,190 +29,100 @@ def stripe_webhook():
     logging.info("Received webhook payload")
     logging.debug(f"Payload: {payload}")
     logging.debug(f"Stripe-Signature Header: {sig_header}")
-    logging.debug(f"Endpoint Secret: {endpoint_secret}")
 
     try:
         event = stripe.Webhook.construct_event(
             payload, sig_header, endpoint_secret
         )
-        logging.info(f"Successfully constructed event: {event['type']}")
-
-        # Сохранение события в логах
-        action_log = ActionLog(
-            user_id=None,  # Здесь лучше установить правильный user_id, если возможно
-            action=f"Webhook event: {event['type']}",
-            ip_address=request.remote_addr,
-            status='received'
-        )
-        db.session.add(action_log)
-        db.session.commit()
-
-        # Обработка события
-        event_type = event['type']
-        if event_type == 'payment_intent.succeeded':
-            handle_payment_intent_succeeded(event['data']['object'])
-        elif event_type == 'payment_intent.payment_failed':
-            handle_payment_intent_failed(event['data']['object'])
-        elif event_type == 'charge.succeeded':
-            handle_charge_succeeded(event['data']['object'])
-        elif event_type == 'charge.failed':
-            handle_charge_failed(event['data']['object'])
-        else:
-            logging.warning(f"Unhandled event type: {event_type}")
-
-        return '', 200
-
     except stripe.error.SignatureVerificationError as e:
         logging.error(f"Invalid signature: {e}")
         return 'Invalid signature', 400
-    except Exception as e:
-        logging.error(f"Error handling webhook: {e}")
-        return 'Internal Server Error', 500
-
-def handle_payment_intent_succeeded(payment_intent):
-    from app.models import Payment, ActionLog
-    from app import db
-
-    user_id = payment_intent['metadata'].get('user_id')
-    amount = payment_intent['amount'] / 100  # Преобразование из центов
-    stripe_payment_id = payment_intent['id']
-
-    logging.info(f"Handling payment_intent.succeeded for user_id: {user_id}, amount: {amount}")
-
-    if not user_id:
-        logging.error("user_id отсутствует в metadata PaymentIntent")
-        # Дополнительная обработка, например, уведомление администратору или пропуск
-        return
+    except ValueError as e:
+        logging.error(f"Invalid payload: {e}")
+        return 'Invalid payload', 400
 
     try:
-        payment = Payment(
-            user_id=user_id,
-            amount=amount,
-            stripe_payment_id=stripe_payment_id,
-            status='paid'
-        )
-        db.session.add(payment)
-
-        action = ActionLog(
-            user_id=user_id,
-            action=f"Успешный платеж на сумму {amount} USD",
-            ip_address=request.remote_addr,
-            status='success'
-        )
-        db.session.add(action)
+        created = enqueue_event(event['id'], event['type'], payload)
+        if created:
+            # Сохранение события в логах (запишется вместе с событием очереди)
+            log_action(f"Webhook event: {event['type']}", status='received')
+        else:
+            logging.info(f"Duplicate webhook event {event['id']} ignored")
         db.session.commit()
-        logging.info(f"Платеж ID {stripe_payment_id} успешно обработан для пользователя ID {user_id}.")
     except Exception as e:
-        logging.error(f"Error handling payment_intent.succeeded: {e}")
         db.session.rollback()
+        logging.error(f"Error queueing webhook: {e}")
+        return 'Internal Server Error', 500
+
+    return '', 200
 
-def handle_payment_intent_failed(payment_intent):
-    from app.models import Payment, ActionLog
-    from app import db
 
-    user_id = payment_intent['metadata'].get('user_id')
-    amount = payment_intent['amount'] / 100
-    stripe_payment_id = payment_intent['id']
+def _record_payment(stripe_object, status, message, log_status):
+    """
+    Создаёт или обновляет платёж по идентификатору объекта Stripe.
 
-    logging.info(f"Handling payment_intent.payment_failed for user_id: {user_id}, amount: {amount}")
+    Обработчик идемпотентен: повторная обработка того же объекта не создаёт
+    второй платёж. Статус 'paid' окончательный: Stripe не гарантирует порядок
+    доставки, а очередь откладывает повторы, поэтому событие о неудачной
+    попытке может прийти после успешного и не должно его перезаписать.
+    Commit выполняет обработчик очереди; исключение приводит к повторной попытке.
+    """
+    from app.models import Payment
+    from app.audit import log_action
+    from app import db
+
+    user_id = stripe_object['metadata'].get('user_id')
+    amount = stripe_object['amount'] / 100  # Преобразование из центов
+    stripe_payment_id = stripe_object['id']
 
     if not user_id:
-        logging.error("user_id отсутствует в metadata PaymentIntent")
-        # Дополнительная обработка, например, уведомление администратору или пропуск
+        logging.error(f"user_id отсутствует в metadata объекта {stripe_payment_id}")
         return
 
-    try:
-        payment = Payment(
+    payment = Payment.query.filter_by(stripe_payment_id=stripe_payment_id).first()
+    if payment is None:
+        db.session.add(Payment(
             user_id=user_id,
             amount=amount,
             stripe_payment_id=stripe_payment_id,
-            status='failed'
-        )
-        db.session.add(payment)
-
-        action = ActionLog(
-            user_id=user_id,
-            action=f"Неуспешный платеж на сумму {amount} USD",
-            ip_address=request.remote_addr,
-            status='failure'
-        )
-        db.session.add(action)
-        db.session.commit()
-        logging.warning(f"Платеж ID {stripe_payment_id} не удался для пользователя ID {user_id}.")
-    except Exception as e:
-        logging.error(f"Error handling payment_intent.payment_failed: {e}")
-        db.session.rollback()
-
-def handle_charge_succeeded(charge):
-    from app.models import Payment, ActionLog
-    from app import db
+            status=status
+        ))
+    elif payment.status == status:
+        logging.info(f"Платеж {stripe_payment_id} уже в статусе {status}")
+        return
+    elif payment.status == 'paid':
+        logging.info(f"Платеж {stripe_payment_id} уже оплачен, событие со статусом {status} пропущено")
+        return
+    else:
+        payment.status = status
 
-    user_id = charge['metadata'].get('user_id')
-    amount = charge['amount'] / 100  # Преобразование из центов
-    stripe_charge_id = charge['id']
+    log_action(message.format(amount=amount), status=log_status, user_id=user_id)
 
-    logging.info(f"Handling charge.succeeded for user_id: {user_id}, amount: {amount}")
 
-    if not user_id:
-        logging.error("user_id отсутствует в metadata Charge")
-        # Дополнительная обработка, например, уведомление администратору или пропуск
-        return
+def handle_payment_intent_succeeded(payment_intent):
+    logging.info(f"Handling payment_intent.succeeded: {payment_intent['id']}")
+    _record_payment(payment_intent, 'paid', "Успешный платеж на сумму {amount} USD", 'success')
 
-    try:
-        payment = Payment(
-            user_id=user_id,
-            amount=amount,
-            stripe_payment_id=stripe_charge_id,
-            status='paid'
-        )
-        db.session.add(payment)
 
-        action = ActionLog(
-            user_id=user_id,
-            action=f"Успешный платеж (charge) на сумму {amount} USD",
-            ip_address=request.remote_addr,
-            status='success'
-        )
-        db.session.add(action)
-        db.session.commit()
-        logging.info(f"Платеж charge ID {stripe_charge_id} успешно обработан для пользователя ID {user_id}.")
-    except Exception as e:
-        logging.error(f"Error handling charge.succeeded: {e}")
-        db.session.rollback()
+def handle_payment_intent_failed(payment_intent):
+    logging.info(f"Handling payment_intent.payment_failed: {payment_intent['id']}")
+    _record_payment(payment_intent, 'failed', "Неуспешный платеж на сумму {amount} USD", 'failure')
 
-def handle_charge_failed(charge):
-    from app.models import Payment, ActionLog
-    from app import db
 
-    user_id = charge['metadata'].get('user_id')
-    amount = charge['amount'] / 100
-    stripe_charge_id = charge['id']
+def handle_charge_succeeded(charge):
+    logging.info(f"Handling charge.succeeded: {charge['id']}")
+    _record_payment(charge, 'paid', "Успешный платеж (charge) на сумму {amount} USD", 'success')
 
-    logging.info(f"Handling charge.failed for user_id: {user_id}, amount: {amount}")
 
-    if not user_id:
-        logging.error("user_id отсутствует в metadata Charge")
-        # Дополнительная обработка, например, уведомление администратору или пропуск
-        return
+def handle_charge_failed(charge):
+    logging.info(f"Handling charge.failed: {charge['id']}")
+    _record_payment(charge, 'failed', "Неуспешный платеж (charge) на сумму {amount} USD", 'failure')
 
-    try:
-        payment = Payment(
-            user_id=user_id,
-            amount=amount,
-            stripe_payment_id=stripe_charge_id,
-            status='failed'
-        )
-        db.session.add(payment)
 
-        action = ActionLog(
-            user_id=user_id,
-            action=f"Неуспешный платеж (charge) на сумму {amount} USD",
-            ip_address=request.remote_addr,
-            status='failure'
-        )
-        db.session.add(action)
-        db.session.commit()
-        logging.warning(f"Платеж charge ID {stripe_charge_id} не удался для пользователя ID {user_id}.")
-    except Exception as e:
-        logging.error(f"Error handling charge.failed: {e}")
-        db.session.rollback()
\ No newline at end of file
+# Обработчики событий по типу; вызываются фоновым обработчиком очереди stripe_event
+EVENT_HANDLERS = {
+    'payment_intent.succeeded': handle_payment_intent_succeeded,
+    'payment_intent.payment_failed': handle_payment_intent_failed,
+    'charge.succeeded': handle_charge_succeeded,
+    'charge.failed': handle_charge_failed,
+}
@@ -0,0 +1,161 @@
+# app/work_queue.py
+
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Сколько запись остаётся закреплённой за обработчиком; если процесс упал во время
+# обработки, запись снова станет доступной по истечении этого времени
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+class WorkQueue:
+    """
+    Очередь задач в таблице базы данных (outbox_email, stripe_event).
+
+    Общая часть очередей: закрепление пакета условным UPDATE с арендой
+    CLAIM_LEASE, повтор с экспоненциальной задержкой, цикл обработчика и
+    фоновый поток, который пробуждается после commit новых записей. Модуль
+    очереди задаёт только обработку пакета (handler).
+
+    Модель должна иметь столбцы id, status ('pending' у ожидающих записей),
+    attempts, next_attempt_at и last_error. Настройки читаются из конфигурации
+    с префиксом config_prefix: _WORKER ('thread' — фоновый поток в процессе
+    приложения), _BATCH_SIZE, _MAX_ATTEMPTS, _RETRY_DELAY и _POLL_INTERVAL.
+
+    Args:
+        model: Модель таблицы очереди.
+        config_prefix (str): Префикс настроек, например 'MAIL_OUTBOX'.
+        handler (callable): handler() обрабатывает один пакет и возвращает
+            количество обработанных записей; 0 — очередь пуста.
+        name (str): Имя очереди в журнале и фонового потока.
+        label (str): Описание записи в журнале, например 'Письмо ID {}'.
+        failed_status (str): Статус записи после исчерпания попыток.
+        max_attempts (int): Количество попыток, если не задано в конфигурации.
+    """
+
+    def __init__(self, model, config_prefix, handler, name, label, failed_status='failed', max_attempts=5):
+        self.model = model
+        self.config_prefix = config_prefix
+        self.handler = handler
+        self.name = name
+        self.label = label
+        self.failed_status = failed_status
+        self.max_attempts = max_attempts
+        self._queued_key = f'{name}_queued'
+        self._worker_lock = threading.Lock()
+        self._worker_thread = None
+        self._wake_event = threading.Event()
+
+        event.listen(db.session, 'after_commit', self._wake_worker_after_commit)
+        event.listen(db.session, 'after_rollback', self._forget_queued_after_rollback)
+
+    def setting(self, option, default, app=None):
+        return (app or current_app).config.get(f'{self.config_prefix}_{option}', default)
+
+    def batch_size(self, batch_size=None):
+        return batch_size or self.setting('BATCH_SIZE', 50)
+
+    def notify(self):
+        """
+        Отмечает, что в текущей сессии добавлена запись: фоновый обработчик
+        запускается при необходимости и пробуждается после commit.
+        """
+        db.session.info[self._queued_key] = True
+        self.ensure_worker(current_app._get_current_object())
+
+    def _wake_worker_after_commit(self, session):
+        if session.info.pop(self._queued_key, False):
+            self._wake_event.set()
+
+    def _forget_queued_after_rollback(self, session):
+        session.info.pop(self._queued_key, None)
+
+    def claim_due(self, batch_size):
+        """
+        Выбирает записи, готовые к обработке, и закрепляет их за текущим обработчиком.
+
+        Закрепление выполняется условным UPDATE, поэтому несколько процессов
+        (фоновые потоки gunicorn-воркеров и команды CLI) не обработают одну
+        запись одновременно.
+
+        Returns:
+            list: Идентификаторы закреплённых записей.
+        """
+        model = self.model
+        now = datetime.utcnow()
+        candidates = db.session.query(model.id).filter(
+            model.status == 'pending',
+            model.next_attempt_at <= now
+        ).order_by(model.next_attempt_at.asc()).limit(batch_size).all()
+
+        claimed = []
+        for (item_id,) in candidates:
+            result = db.session.execute(
+                db.update(model)
+                .where(
+                    model.id == item_id,
+                    model.status == 'pending',
+                    model.next_attempt_at <= now
+                )
+                .values(next_attempt_at=now + CLAIM_LEASE)
+            )
+            if result.rowcount == 1:
+                claimed.append(item_id)
+        db.session.commit()
+        return claimed
+
+    def schedule_retry(self, item, error):
+        """
+        Откладывает запись после ошибки с экспоненциальной задержкой
+        (_RETRY_DELAY * 2^(attempts-1)); после _MAX_ATTEMPTS попыток запись
+        получает статус failed_status и остаётся в таблице для разбора.
+        """
+        max_attempts = self.setting('MAX_ATTEMPTS', self.max_attempts)
+        retry_delay = self.setting('RETRY_DELAY', 30)
+        label = self.label.format(item.id)
+
+        item.attempts += 1
+        item.last_error = str(error)
+        if item.attempts >= max_attempts:
+            item.status = self.failed_status
+            logger.error(f"{label}: не обработано после {item.attempts} попыток: {error}")
+        else:
+            item.next_attempt_at = datetime.utcnow() + timedelta(seconds=retry_delay * 2 ** (item.attempts - 1))
+            logger.warning(f"{label}: повторная попытка после ошибки: {error}")
+
+    def drain(self, app, poll_interval=None, stop_event=None):
+        """
+        Цикл обработчика очереди: обрабатывает пакеты, пока они есть, затем ждёт
+        пробуждения после commit или истечения poll_interval.
+        """
+        poll_interval = poll_interval or self.setting('POLL_INTERVAL', 5, app)
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            self._wake_event.clear()
+            with app.app_context():
+                try:
+                    while self.handler():
+                        pass
+                except Exception as e:
+                    logger.error(f"Ошибка обработчика очереди {self.name}: {e}")
+                    db.session.rollback()
+            self._wake_event.wait(poll_interval)
+
+    def ensure_worker(self, app):
+        """Запускает фоновый поток обработки при первой записи в процессе (_WORKER='thread')."""
+        if app.testing or self.setting('WORKER', 'thread', app) != 'thread':
+            return
+        if self._worker_thread is not None and self._worker_thread.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker_thread is None or not self._worker_thread.is_alive():
+                self._worker_thread = threading.Thread(target=self.drain, args=(app,), name=self.name, daemon=True)
+                self._worker_thread.start()
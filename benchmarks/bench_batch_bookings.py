@@ -0,0 +1,100 @@
+# benchmarks/bench_batch_bookings.py
+"""
+Бенчмарк пакетного бронирования: N вызовов POST /api/v1/bookings против
+одного POST /api/v1/bookings:batch с теми же N элементами.
+
+Для каждого варианта создаётся отдельная база SQLite с N классами; запросы
+идут через тестовый клиент Flask, поэтому измеряется время приложения и базы
+без сети.
+
+Запуск:
+    python benchmarks/bench_batch_bookings.py --items 200
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models import Booking, Class, User  # noqa: E402
+
+
+def make_config(database_uri):
+    class BenchConfig:
+        SECRET_KEY = 'bench'
+        JWT_SECRET_KEY = 'bench-jwt-secret-key-for-benchmarks'
+        SQLALCHEMY_DATABASE_URI = database_uri
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+        TESTING = True
+        RATELIMIT_ENABLED = False
+        RATELIMIT_STORAGE_URI = 'memory://'
+    return BenchConfig
+
+
+def setup(items):
+    """Создаёт приложение с пользователем и items классами; возвращает (app, client, headers, items)."""
+    path = os.path.join(tempfile.mkdtemp(), 'batch.db')
+    app = create_app(config_class=make_config(f"sqlite:///{path}"))
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com', password='x')
+        db.session.add(user)
+        schedule = datetime.utcnow() + timedelta(days=1)
+        day = schedule.strftime('%A')
+        db.session.execute(db.insert(Class), [
+            {'name': f'Class {i}', 'schedule': schedule, 'capacity': 20, 'days_of_week': day}
+            for i in range(items)
+        ])
+        db.session.commit()
+        token = create_access_token(identity=str(user.id))
+        class_ids = [class_id for (class_id,) in db.session.query(Class.id).order_by(Class.id)]
+    return app, app.test_client(), {'Authorization': f'Bearer {token}'}, [(class_id, day) for class_id in class_ids]
+
+
+def count_bookings(app):
+    with app.app_context():
+        return db.session.query(Booking).count()
+
+
+def run_single(items):
+    app, client, headers, pairs = setup(items)
+    started = time.perf_counter()
+    for class_id, _ in pairs:
+        response = client.post('/api/v1/bookings', json={'class_id': class_id}, headers=headers)
+        assert response.status_code == 201, response.get_json()
+    elapsed = time.perf_counter() - started
+    return elapsed, count_bookings(app)
+
+
+def run_batch(items):
+    app, client, headers, pairs = setup(items)
+    body = {'items': [{'class_id': class_id, 'day': day} for class_id, day in pairs]}
+    started = time.perf_counter()
+    response = client.post('/api/v1/bookings:batch', json=body, headers=headers)
+    elapsed = time.perf_counter() - started
+    assert response.status_code == 200 and response.get_json()['created'] == items, response.get_json()
+    return elapsed, count_bookings(app)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=200, help='Количество бронирований (не больше 500)')
+    args = parser.parse_args()
+
+    single, single_count = run_single(args.items)
+    batch, batch_count = run_batch(args.items)
+    print(f"{args.items} bookings")
+    print(f"{'single POST x N':<20} {single * 1000:9.1f} ms  {args.items / single:8.1f} bookings/s  created={single_count}")
+    print(f"{'POST :batch':<20} {batch * 1000:9.1f} ms  {args.items / batch:8.1f} bookings/s  created={batch_count}")
+    print(f"speedup: {single / batch:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
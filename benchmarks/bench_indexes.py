@@ -0,0 +1,171 @@
+# benchmarks/bench_indexes.py
+"""
+Бенчмарк горячих запросов к booking и action_log до и после составных индексов.
+
+Заполняет отдельную базу синтетическими данными (по умолчанию 1M бронирований
+и 5M записей журнала), замеряет p50/p99 каждого запроса без индексов, создаёт
+индексы из моделей и повторяет замеры.
+
+Запуск:
+    python benchmarks/bench_indexes.py --bookings 1000000 --logs 5000000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+from app.models import ActionLog, Booking, Class, User  # noqa: E402
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+STATUSES = ['confirmed'] * 8 + ['cancelled', 'pending']
+ACTIONS = ['Login', 'Registration', 'Изменение пароля', 'Отмена бронирования']
+CHUNK = 50000
+
+
+def make_config(database_uri):
+    class BenchConfig:
+        SECRET_KEY = 'bench'
+        SQLALCHEMY_DATABASE_URI = database_uri
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+        TESTING = True
+    return BenchConfig
+
+
+def insert_chunks(table, rows_factory, total):
+    for start in range(0, total, CHUNK):
+        size = min(CHUNK, total - start)
+        db.session.execute(db.insert(table), [rows_factory() for _ in range(size)])
+        db.session.commit()
+
+
+def seed(args):
+    """Создаёт пользователей, классы, бронирования и записи журнала."""
+    now = datetime.utcnow()
+    rnd = random.Random(args.seed)
+
+    db.session.execute(db.insert(User), [
+        {'username': f'bench{i}', 'email': f'bench{i}@example.com', 'password': 'x'}
+        for i in range(args.users)
+    ])
+    db.session.execute(db.insert(Class), [
+        {'name': f'Class {i}', 'schedule': now, 'capacity': 20, 'days_of_week': ','.join(DAYS)}
+        for i in range(args.classes)
+    ])
+    db.session.commit()
+
+    insert_chunks(Booking.__table__, lambda: {
+        'user_id': rnd.randint(1, args.users),
+        'class_id': rnd.randint(1, args.classes),
+        'booking_date': now - timedelta(minutes=rnd.randint(0, 60 * 24 * 365)),
+        'status': rnd.choice(STATUSES),
+        'day': rnd.choice(DAYS),
+    }, args.bookings)
+
+    insert_chunks(ActionLog.__table__, lambda: {
+        'user_id': rnd.randint(1, args.users),
+        'action': rnd.choice(ACTIONS),
+        'timestamp': now - timedelta(minutes=rnd.randint(0, 60 * 24 * 365)),
+        'ip_address': '127.0.0.1',
+        'status': rnd.choice(['success', 'failure']),
+    }, args.logs)
+
+
+def hot_queries(args):
+    """Горячие запросы приложения с тем же набором фильтров, что и в маршрутах."""
+    now = datetime.utcnow()
+    return {
+        'booking by (class_id, day, status)': lambda rnd: Booking.query.filter_by(
+            class_id=rnd.randint(1, args.classes), day=rnd.choice(DAYS), status='confirmed'
+        ).count(),
+        'booking by (user_id, status) order by booking_date': lambda rnd: Booking.query.filter_by(
+            user_id=rnd.randint(1, args.users), status='confirmed'
+        ).order_by(Booking.booking_date.desc()).all(),
+        'booking by (user_id, booking_date)': lambda rnd: Booking.query.filter(
+            Booking.user_id == rnd.randint(1, args.users),
+            Booking.booking_date >= now - timedelta(minutes=10)
+        ).count(),
+        'action_log by (user_id, action, status, timestamp)': lambda rnd: ActionLog.query.filter(
+            ActionLog.user_id == rnd.randint(1, args.users),
+            ActionLog.action == 'Login',
+            ActionLog.status == 'failure',
+            ActionLog.timestamp >= now - timedelta(minutes=15)
+        ).count(),
+    }
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(args):
+    results = {}
+    for name, query in hot_queries(args).items():
+        rnd = random.Random(args.seed)
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            query(rnd)
+            samples.append((time.perf_counter() - started) * 1000)
+            db.session.rollback()
+        results[name] = (statistics.median(samples), percentile(samples, 99))
+    return results
+
+
+def hot_indexes():
+    return [index for table in (Booking.__table__, ActionLog.__table__) for index in table.indexes]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', default='bench_indexes.db', help='Файл SQLite или URI базы данных')
+    parser.add_argument('--bookings', type=int, default=1000000)
+    parser.add_argument('--logs', type=int, default=5000000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--classes', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=200, help='Количество замеров на запрос')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reuse', action='store_true', help='Не пересоздавать данные, если база уже заполнена')
+    args = parser.parse_args()
+
+    database_uri = args.database if '://' in args.database else f"sqlite:///{os.path.abspath(args.database)}"
+    app = create_app(make_config(database_uri))
+
+    with app.app_context():
+        engine = db.engine
+        if not args.reuse:
+            db.drop_all()
+            db.create_all()
+        for index in hot_indexes():
+            index.drop(engine, checkfirst=True)
+
+        if not args.reuse or not Booking.query.first():
+            print(f"Seeding {args.bookings} bookings and {args.logs} action log rows...")
+            started = time.perf_counter()
+            seed(args)
+            print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+        before = measure(args)
+        for index in hot_indexes():
+            index.create(engine, checkfirst=True)
+        with engine.begin() as connection:
+            if engine.dialect.name in ('sqlite', 'postgresql'):
+                connection.exec_driver_sql('ANALYZE')
+        after = measure(args)
+
+    print(f"\n{'query':<55} {'p50 before':>11} {'p99 before':>11} {'p50 after':>10} {'p99 after':>10}")
+    for name in before:
+        (p50_before, p99_before), (p50_after, p99_after) = before[name], after[name]
+        print(f"{name:<55} {p50_before:>9.2f}ms {p99_before:>9.2f}ms {p50_after:>8.2f}ms {p99_after:>8.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
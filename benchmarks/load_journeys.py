@@ -0,0 +1,412 @@
+# benchmarks/load_journeys.py
+"""
+Нагрузочный тест пользовательских сценариев по HTTP.
+
+Каждый виртуальный пользователь в цикле проходит сценарий с новым аккаунтом:
+регистрация и вход (main.register, main.login), бронирование класса
+(main.book_class), отмена (main.cancel_booking), затем API: вход,
+список и создание бронирований (/api/v1/bookings) и оплата (/api/v1/payment).
+Нагрузку создают --processes процессов по --users потоков в каждом.
+
+Без --url запускается собственный сервер: отдельный процесс с приложением
+на временной базе SQLite, многопоточным сервером Werkzeug и заглушкой
+stripe.PaymentIntent.create (задержка --stripe-latency). С --url нагрузка
+идёт на уже запущенный сервер (например, gunicorn); оплата через API там
+обращается к настоящему Stripe, поэтому её можно отключить --skip-payment.
+
+Выводит по каждому шагу: число запросов, запросы в секунду, p50/p90/p99
+задержки и долю ошибок. --save-baseline сохраняет результат в JSON,
+--baseline сравнивает с сохранённым; с --max-regression процесс завершается
+с кодом 1, если p99 или пропускная способность ухудшились больше порога.
+
+Запуск:
+    python benchmarks/load_journeys.py --processes 4 --users 8 --duration 30 --save-baseline baseline.json
+    python benchmarks/load_journeys.py --processes 4 --users 8 --duration 30 --baseline baseline.json --max-regression 20
+    python benchmarks/load_journeys.py --url http://127.0.0.1:8000 --skip-payment
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import re
+import signal
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+PASSWORD = 'Load-test-passw0rd'
+
+CSRF_RE = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"|value="([^"]+)"[^>]*name="csrf_token"')
+CLASS_RE = re.compile(r'/book_class/(\d+)')
+DAY_RE = re.compile(r'<option value="([^"]+)"')
+CANCEL_RE = re.compile(r'/cancel_booking/(\d+)')
+
+
+# --- Сервер ---------------------------------------------------------------
+
+def make_config(database_uri, args):
+    class LoadConfig:
+        SECRET_KEY = 'load-test'
+        JWT_SECRET_KEY = 'load-test-jwt-secret-key-for-benchmarks'
+        SQLALCHEMY_DATABASE_URI = database_uri
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+        RATELIMIT_ENABLED = False
+        RATELIMIT_STORAGE_URI = 'memory://'
+        STRIPE_SECRET_KEY = 'sk_test_load'
+        # Очереди писем и событий копятся в базе, фоновые потоки не запускаются
+        MAIL_OUTBOX_WORKER = 'cli'
+        STRIPE_EVENTS_WORKER = 'cli'
+        BCRYPT_LOG_ROUNDS = args.bcrypt_rounds
+        METRICS_DIR = tempfile.mkdtemp(prefix='load-metrics-')
+    return LoadConfig
+
+
+def stub_stripe(latency):
+    import stripe
+
+    def create(**params):
+        time.sleep(latency)
+        return SimpleNamespace(
+            id=f'pi_load_{uuid.uuid4().hex[:24]}',
+            status='succeeded',
+            client_secret=f'pi_load_secret_{uuid.uuid4().hex[:16]}',
+            charges=SimpleNamespace(data=[]),
+        )
+
+    stripe.PaymentIntent.create = create
+
+
+def serve(port, database_uri, args, ready):
+    from werkzeug.serving import make_server
+
+    from app import create_app, db
+    from app.models import Class
+
+    # Журнал запросов и отладочные сообщения сервера искажают замер
+    logging.disable(logging.INFO)
+    app = create_app(config_class=make_config(database_uri, args))
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(Class), [
+            {'name': f'Load class {i}', 'schedule': datetime.utcnow() + timedelta(days=1 + i % 7),
+             'capacity': 1000000, 'days_of_week': ','.join(DAYS)}
+            for i in range(args.classes)
+        ])
+        db.session.commit()
+    stub_stripe(args.stripe_latency)
+
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    # terminate() останавливает цикл сервера (shutdown() нельзя вызывать из его же потока),
+    # после чего закрывается и пул хэширования паролей
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    ready.set()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        app.extensions['passwords'].shutdown()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(args):
+    port = free_port()
+    directory = tempfile.mkdtemp(prefix='load-')
+    database_uri = f"sqlite:///{os.path.join(directory, 'load.db')}"
+    ready = multiprocessing.Event()
+    # Не daemon: серверу нужен пул процессов хэширования паролей (app/passwords.py)
+    process = multiprocessing.Process(target=serve, args=(port, database_uri, args, ready))
+    process.start()
+    if not ready.wait(timeout=60):
+        process.terminate()
+        raise RuntimeError('Сервер не запустился за 60 секунд')
+    return process, f'http://127.0.0.1:{port}'
+
+
+# --- Сценарий -------------------------------------------------------------
+
+class JourneyError(Exception):
+    pass
+
+
+class Recorder:
+    """Задержки и ошибки по шагам одного процесса нагрузки."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def request(self, session, step, method, url, expect=(200,), location=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, allow_redirects=False, timeout=30, **kwargs)
+        except requests.RequestException as e:
+            self._add(step, time.perf_counter() - started, ok=False)
+            raise JourneyError(f'{step}: {e}')
+        ok = response.status_code in expect and \
+            (location is None or location in response.headers.get('Location', ''))
+        self._add(step, time.perf_counter() - started, ok)
+        if not ok:
+            raise JourneyError(f"{step}: {response.status_code} {response.headers.get('Location', '')}")
+        return response
+
+    def _add(self, step, latency, ok):
+        with self._lock:
+            self.latencies[step].append(latency)
+            if not ok:
+                self.errors[step] += 1
+
+
+def csrf_token(html):
+    match = CSRF_RE.search(html)
+    return (match.group(1) or match.group(2)) if match else None
+
+
+def form_post(recorder, session, step, url, page_html, data, **kwargs):
+    token = csrf_token(page_html)
+    if token:
+        data = {**data, 'csrf_token': token}
+    return recorder.request(session, step, 'POST', url, data=data, **kwargs)
+
+
+def journey(recorder, base_url, username, class_ids, skip_payment, rng):
+    session = requests.Session()
+    email = f'{username}@loadtest.example.com'
+
+    page = recorder.request(session, 'GET /register', 'GET', f'{base_url}/register').text
+    form_post(recorder, session, 'POST /register', f'{base_url}/register', page,
+              {'username': username, 'email': email, 'password': PASSWORD, 'confirm_password': PASSWORD},
+              expect=(302,), location='/login')
+
+    page = recorder.request(session, 'GET /login', 'GET', f'{base_url}/login').text
+    form_post(recorder, session, 'POST /login', f'{base_url}/login', page,
+              {'email_or_username': username, 'password': PASSWORD}, expect=(302,), location='/')
+
+    class_id = rng.choice(class_ids)
+    page = recorder.request(session, 'GET /book_class', 'GET', f'{base_url}/book_class/{class_id}').text
+    days = DAY_RE.findall(page)
+    form_post(recorder, session, 'POST /book_class', f'{base_url}/book_class/{class_id}', page,
+              {'day': rng.choice(days) if days else DAYS[0]}, expect=(302,), location='/my_bookings')
+
+    page = recorder.request(session, 'GET /my_bookings', 'GET', f'{base_url}/my_bookings').text
+    booking_ids = CANCEL_RE.findall(page)
+    if not booking_ids:
+        raise JourneyError('GET /my_bookings: бронирование не найдено')
+    form_post(recorder, session, 'POST /cancel_booking', f'{base_url}/cancel_booking/{booking_ids[0]}', page,
+              {'booking_id': booking_ids[0]}, expect=(302,), location='/profile')
+
+    api = requests.Session()
+    tokens = recorder.request(api, 'POST /api/v1/login', 'POST', f'{base_url}/api/v1/login',
+                              json={'email': email, 'password': PASSWORD}).json()
+    api.headers['Authorization'] = f"Bearer {tokens['access_token']}"
+    recorder.request(api, 'GET /api/v1/bookings', 'GET', f'{base_url}/api/v1/bookings')
+    # Отменённое бронирование тоже считается, поэтому через API бронируется другой класс
+    other_ids = [other for other in class_ids if other != class_id] or class_ids
+    recorder.request(api, 'POST /api/v1/bookings', 'POST', f'{base_url}/api/v1/bookings',
+                     json={'class_id': rng.choice(other_ids)}, expect=(201,))
+    if not skip_payment:
+        recorder.request(api, 'POST /api/v1/payment', 'POST', f'{base_url}/api/v1/payment',
+                         json={'amount': 1500, 'currency': 'gbp', 'payment_method_id': 'pm_card_visa'})
+
+
+def virtual_user(recorder, base_url, run_id, process_index, user_index, class_ids, args, deadline, failures):
+    rng = random.Random(f'{run_id}-{process_index}-{user_index}')
+    iteration = 0
+    while time.perf_counter() < deadline:
+        # Имя пользователя не длиннее 20 символов (RegistrationForm)
+        username = f'u{run_id}{process_index}x{user_index}x{iteration}'
+        iteration += 1
+        try:
+            journey(recorder, base_url, username, class_ids, args.skip_payment, rng)
+        except JourneyError as e:
+            failures.append(str(e))
+
+
+def load_process(process_index, base_url, run_id, class_ids, args, start_event, results):
+    recorder = Recorder()
+    failures = []
+    start_event.wait()
+    deadline = time.perf_counter() + args.duration
+    threads = [
+        threading.Thread(target=virtual_user,
+                         args=(recorder, base_url, run_id, process_index, i, class_ids, args, deadline, failures))
+        for i in range(args.users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put((dict(recorder.latencies), dict(recorder.errors), failures[:20]))
+
+
+def discover_classes(base_url):
+    # Главная страница доступна без входа и содержит ссылки на бронирование всех классов
+    response = requests.get(f'{base_url}/', timeout=30)
+    response.raise_for_status()
+    class_ids = sorted({int(class_id) for class_id in CLASS_RE.findall(response.text)})
+    if not class_ids:
+        raise RuntimeError('На главной странице нет классов для бронирования')
+    return class_ids
+
+
+# --- Отчёт ----------------------------------------------------------------
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+def summarize(latencies, errors, elapsed):
+    steps = {}
+    for step, values in latencies.items():
+        steps[step] = {
+            'requests': len(values),
+            'rps': len(values) / elapsed,
+            'p50_ms': percentile(values, 50) * 1000,
+            'p90_ms': percentile(values, 90) * 1000,
+            'p99_ms': percentile(values, 99) * 1000,
+            'error_rate': errors.get(step, 0) / len(values),
+        }
+    all_values = [value for values in latencies.values() for value in values]
+    total_errors = sum(errors.values())
+    steps['TOTAL'] = {
+        'requests': len(all_values),
+        'rps': len(all_values) / elapsed,
+        'p50_ms': percentile(all_values, 50) * 1000,
+        'p90_ms': percentile(all_values, 90) * 1000,
+        'p99_ms': percentile(all_values, 99) * 1000,
+        'error_rate': total_errors / len(all_values) if all_values else 0.0,
+    }
+    return steps
+
+
+def print_summary(steps):
+    print(f"{'step':<24}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'errors':>9}")
+    for step, row in steps.items():
+        print(f"{step:<24}{row['requests']:>10}{row['rps']:>10.1f}{row['p50_ms']:>10.1f}"
+              f"{row['p90_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['error_rate'] * 100:>8.1f}%")
+
+
+def change(new, old):
+    return (new - old) / old * 100 if old else 0.0
+
+
+def compare(steps, baseline, max_regression):
+    """
+    Печатает изменения относительно baseline и возвращает шаги, где p99 выросла
+    или пропускная способность упала больше чем на max_regression процентов.
+    """
+    print(f"\n{'step':<24}{'req/s':>16}{'p50 ms':>16}{'p99 ms':>16}{'errors':>14}")
+    regressions = []
+    for step, row in steps.items():
+        old = baseline['steps'].get(step)
+        if old is None:
+            print(f"{step:<24}{'нет в базовом прогоне':>40}")
+            continue
+        rps, p50, p99 = change(row['rps'], old['rps']), change(row['p50_ms'], old['p50_ms']), \
+            change(row['p99_ms'], old['p99_ms'])
+        errors = (row['error_rate'] - old['error_rate']) * 100
+        print(f"{step:<24}{rps:>+15.1f}%{p50:>+15.1f}%{p99:>+15.1f}%{errors:>+12.1f}pp")
+        if max_regression is not None and (p99 > max_regression or -rps > max_regression):
+            regressions.append(step)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Адрес запущенного сервера; без него запускается собственный')
+    parser.add_argument('--processes', type=int, default=4, help='Процессы нагрузки')
+    parser.add_argument('--users', type=int, default=4, help='Виртуальных пользователей (потоков) на процесс')
+    parser.add_argument('--duration', type=float, default=20.0, help='Секунды нагрузки')
+    parser.add_argument('--classes', type=int, default=20, help='Классов в базе собственного сервера')
+    parser.add_argument('--bcrypt-rounds', type=int, default=12, help='BCRYPT_LOG_ROUNDS собственного сервера')
+    parser.add_argument('--stripe-latency', type=float, default=0.05, help='Секунды задержки заглушки Stripe')
+    parser.add_argument('--skip-payment', action='store_true', help='Не вызывать /api/v1/payment')
+    parser.add_argument('--save-baseline', help='Сохранить результат в JSON')
+    parser.add_argument('--baseline', help='Сравнить с сохранённым результатом')
+    parser.add_argument('--max-regression', type=float, help='Допустимое ухудшение p99 и req/s, проценты')
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        server, base_url = start_server(args)
+    base_url = base_url.rstrip('/')
+
+    try:
+        class_ids = discover_classes(base_url)
+        run_id = uuid.uuid4().hex[:4]
+        start_event = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=load_process,
+                                    args=(i, base_url, run_id, class_ids, args, start_event, results))
+            for i in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        print(f"{base_url}: {args.processes} processes x {args.users} users, {args.duration:.0f}s")
+        started = time.perf_counter()
+        start_event.set()
+
+        latencies, errors, failures = defaultdict(list), defaultdict(int), []
+        for _ in processes:
+            process_latencies, process_errors, process_failures = results.get()
+            for step, values in process_latencies.items():
+                latencies[step].extend(values)
+            for step, count in process_errors.items():
+                errors[step] += count
+            failures.extend(process_failures)
+        elapsed = time.perf_counter() - started
+        for process in processes:
+            process.join()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.join(timeout=30)
+            if server.is_alive():
+                server.kill()
+                server.join()
+
+    steps = summarize(latencies, errors, elapsed)
+    print_summary(steps)
+    for failure in failures[:10]:
+        print(f"  ошибка: {failure}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'created_at': datetime.utcnow().isoformat(), 'args': vars(args), 'steps': steps}, f, indent=2)
+        print(f"\nБазовый прогон сохранён в {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(steps, baseline, args.max_regression)
+        if regressions:
+            print(f"\nУхудшение больше {args.max_regression}%: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
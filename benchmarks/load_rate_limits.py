@@ -0,0 +1,95 @@
+# benchmarks/load_rate_limits.py
+"""
+Нагрузочный тест глобальных лимитов Flask-Limiter на нескольких процессах.
+
+Запускает N процессов-воркеров (по умолчанию 8, как воркеры gunicorn), каждый
+со своим экземпляром приложения, и отправляет запросы к одному маршруту с
+одного IP. С общим хранилищем (sqlite:// или redis://) число успешных ответов
+должно совпасть с лимитом; с memory:// каждый процесс считает отдельно.
+
+Запуск:
+    python benchmarks/load_rate_limits.py --workers 8 --requests 50 --limit "100 per minute"
+    python benchmarks/load_rate_limits.py --storage redis://localhost:6379
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+
+
+def make_config(storage_uri, limit):
+    class BenchConfig:
+        SECRET_KEY = 'bench'
+        SQLALCHEMY_DATABASE_URI = 'sqlite://'
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+        TESTING = True
+        RATELIMIT_STORAGE_URI = storage_uri
+        RATELIMIT_DEFAULT = limit
+    return BenchConfig
+
+
+def worker(storage_uri, limit, requests, start_event, results):
+    app = create_app(config_class=make_config(storage_uri, limit))
+    client = app.test_client()
+    start_event.wait()
+    statuses = Counter(client.get('/login').status_code for _ in range(requests))
+    results.put(dict(statuses))
+
+
+def run(storage_uri, args):
+    start_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=worker, args=(storage_uri, args.limit, args.requests, start_event, results))
+        for _ in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    # Даём воркерам создать приложения, затем стартуем одновременно
+    time.sleep(args.warmup)
+    started = time.perf_counter()
+    start_event.set()
+
+    totals = Counter()
+    for _ in processes:
+        totals.update(results.get())
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+    return totals, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=50, help='Запросов на воркер')
+    parser.add_argument('--limit', default='100 per minute')
+    parser.add_argument('--storage', help='URI хранилища; по умолчанию временный файл SQLite')
+    parser.add_argument('--warmup', type=float, default=3.0, help='Секунды на запуск воркеров')
+    args = parser.parse_args()
+
+    expected = int(args.limit.split()[0])
+    storages = [args.storage] if args.storage else [
+        'memory://',
+        f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'limits.db')}",
+    ]
+
+    print(f"{args.workers} workers x {args.requests} requests, limit '{args.limit}'")
+    for storage_uri in storages:
+        totals, elapsed = run(storage_uri, args)
+        allowed = totals.get(200, 0)
+        verdict = 'OK' if allowed == min(expected, args.workers * args.requests) else 'LIMIT NOT GLOBAL'
+        print(f"{storage_uri:<50} allowed={allowed:<5} limited={totals.get(429, 0):<5} "
+              f"{args.workers * args.requests / elapsed:8.0f} req/s  {verdict}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 from dotenv import load_dotenv
 
 
@@ -11,17 +12,113 @@ load_dotenv()
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY')  # Используется Flask для сессий и CSRF
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY')  # Используется Flask-JWT-Extended
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///site.db'
+    # Access-токен содержит claim is_admin: изменение прав вступает в силу при следующем обмене
+    # refresh-токена, поэтому access-токен короткий, а refresh-токен продлевается ротацией
+    # (поколение цепочки в refresh_token_family, см. app/token_revocation.py)
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=15)
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    # Отозванные токены (app/token_revocation.py): как часто процесс догружает отзывы других воркеров
+    REVOKED_TOKENS_SYNC_INTERVAL = int(os.environ.get('REVOKED_TOKENS_SYNC_INTERVAL', 10))  # Секунды
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///site.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Профиль движка БД (app/db_profiles.py): 'auto' — по схеме DATABASE_URL, 'sqlite', 'postgres', 'none'
+    DB_PROFILE = os.environ.get('DB_PROFILE', 'auto')
+    # Пул соединений Postgres; на процесс приходится до DB_POOL_SIZE + DB_MAX_OVERFLOW соединений
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = 30  # Секунды ожидания свободного соединения
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # Секунды
+    # PRAGMA SQLite: WAL позволяет читать во время записи, synchronous=NORMAL безопасен в режиме WAL
+    SQLITE_JOURNAL_MODE = 'WAL'
+    SQLITE_SYNCHRONOUS = 'NORMAL'
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # Миллисекунды
+    # Стоимость bcrypt (log2 числа раундов); хэши с другой стоимостью пересчитываются при входе
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    # Процессы пула хэширования паролей (app/passwords.py); 0 — хэширование в потоке запроса.
+    # Пул создаётся в каждом воркере gunicorn, поэтому всего процессов bcrypt — воркеры ×
+    # PASSWORD_HASH_WORKERS; произведение не должно превышать число ядер: задавайте
+    # cpu_count // workers (8 ядер и `gunicorn -w 4` — 2)
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
     MAIL_SERVER = 'smtp.gmail.com'
     MAIL_PORT = 587
     MAIL_USE_TLS = True
     MAIL_USERNAME = os.environ.get('EMAIL_USER')
     MAIL_PASSWORD = os.environ.get('EMAIL_PASS')
     MAIL_DEFAULT_SENDER = ('c_work Support', 'noreply@yourdomain.com')
+    # Очередь исходящих писем: 'thread' — фоновый поток в процессе приложения,
+    # 'cli' — отдельный процесс `flask send-emails --loop`
+    MAIL_OUTBOX_WORKER = os.environ.get('MAIL_OUTBOX_WORKER', 'thread')
+    MAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('MAIL_OUTBOX_BATCH_SIZE', 50))
+    MAIL_OUTBOX_MAX_ATTEMPTS = 5
+    MAIL_OUTBOX_RETRY_DELAY = 30  # Секунды; удваивается после каждой неудачной попытки
+    MAIL_OUTBOX_POLL_INTERVAL = 5
+    # Буферизованный журнал действий (app/audit.py)
+    AUDIT_FLUSH_SIZE = int(os.environ.get('AUDIT_FLUSH_SIZE', 500))
+    AUDIT_FLUSH_INTERVAL = int(os.environ.get('AUDIT_FLUSH_INTERVAL', 5))  # Секунды
+    AUDIT_BUFFER_MAX_SIZE = 10000
+
+    # Счётчики скользящего окна для блокировок (app/rate_windows.py):
+    # 'sqlite:///path.db' — общие для воркеров на одном сервере, 'memory://' — отдельные
+    # в каждом процессе (с N воркерами блокировка входа допускает в N раз больше попыток)
+    RATE_WINDOW_STORAGE_URI = os.environ.get('RATE_WINDOW_STORAGE_URI', 'sqlite:///rate_windows.db')
+
+    # Кэш пользователей для user_loader и проверок прав в API (app/user_cache.py); 0 — отключён
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 15))  # Секунды
+    USER_CACHE_MAX_SIZE = 10000
+
+    # Кэш отрендеренных карточек классов на главной и /classes (app/fragment_cache.py); 0 — отключён
+    FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL', 30))  # Секунды
+    FRAGMENT_CACHE_MAX_ENTRIES = 5000
+    FRAGMENT_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+    # Flask-Limiter (app/rate_limits.py). Хранилище общее для всех воркеров:
+    # 'sqlite:///limits.db' — файл на сервере, 'redis://localhost:6379' — Redis-совместимый сервер
+    # (требует пакет redis), 'memory://' — отдельные счётчики в каждом процессе
+    RATELIMIT_STORAGE_URI = os.environ.get('RATELIMIT_STORAGE_URI', 'sqlite:///limits.db')
+    RATELIMIT_STRATEGY = 'fixed-window'
+    RATELIMIT_DEFAULT = '200 per day;50 per hour'
+    # Лимиты по блюпринтам вместо RATELIMIT_DEFAULT
+    RATELIMIT_BLUEPRINT_LIMITS = {
+        'api': '1000 per hour;100 per minute',
+        'admin': '1000 per hour',
+    }
+    # Производные изображения (app/images.py, требует пакет Pillow): миниатюры и WebP
+    # создаются в пуле потоков после загрузки; IMAGE_VARIANTS — размеры, см. DEFAULT_VARIANTS
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+    IMAGE_WEBP_QUALITY = 80
+    IMAGE_JPEG_QUALITY = 85
+    # Загрузки и производные изображения называются по хэшу содержимого и не меняются,
+    # поэтому отдаются с Cache-Control: immutable; неиспользуемые файлы удаляет `flask gc-images`
+    IMAGE_CACHE_MAX_AGE = 365 * 24 * 3600  # Секунды
+    # Временные файлы загрузок (app/uploads.py) — вне публичного static, по умолчанию
+    # instance/uploads. Каталог должен быть на той же файловой системе, что и UPLOAD_FOLDER,
+    # иначе готовый файл нельзя атомарно переименовать
+    UPLOAD_TMP_FOLDER = os.environ.get('UPLOAD_TMP_FOLDER')
+    # Учёт SQL-запросов (app/query_stats.py): медленные запросы и повторы одного запроса
+    # (возможный N+1) записываются в журнал с местом вызова; QUERY_BUDGET — предупреждение,
+    # если HTTP-запрос выполнил больше SQL-запросов (None — без ограничения)
+    QUERY_STATS_ENABLED = True
+    QUERY_SLOW_THRESHOLD = float(os.environ.get('QUERY_SLOW_THRESHOLD', 0.1))  # Секунды
+    QUERY_N_PLUS_ONE_THRESHOLD = 5
+    QUERY_BUDGET = None
+    # Метрики запросов в формате Prometheus на /metrics (app/metrics.py). Воркеры записывают снимки
+    # в METRICS_DIR (по умолчанию instance/metrics), снимки завершившихся воркеров сворачиваются
+    # в archive.json; очищайте каталог командой `flask reset-metrics` при перезапуске сервера.
+    # Доступ — администратор или Authorization: Bearer <METRICS_TOKEN>
+    METRICS_ENABLED = True
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = 5  # Секунды
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
     STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
     STRIPE_PUBLISHABLE_KEY = os.getenv('STRIPE_PUBLISHABLE_KEY')
     STRIPE_ENDPOINT_SECRET = os.environ.get('STRIPE_ENDPOINT_SECRET')
+    # Очередь событий вебхука Stripe: 'thread' — фоновый поток в процессе приложения,
+    # 'cli' — отдельный процесс `flask process-stripe-events --loop`
+    STRIPE_EVENTS_WORKER = os.environ.get('STRIPE_EVENTS_WORKER', 'thread')
+    STRIPE_EVENTS_BATCH_SIZE = 50
+    STRIPE_EVENTS_MAX_ATTEMPTS = 8
+    STRIPE_EVENTS_RETRY_DELAY = 30  # Секунды; удваивается после каждой неудачной попытки
+    STRIPE_EVENTS_POLL_INTERVAL = 5
 
 
 
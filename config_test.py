@@ -19,4 +19,8 @@ class TestConfig:
     MAIL_PASSWORD = os.environ.get('EMAIL_PASS', 'test_email_pass')
     STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY', 'test_stripe_secret_key')
     TESTING = True
-    WTF_CSRF_ENABLED = False  # Отключение CSRF для тестов
\ No newline at end of file
+    WTF_CSRF_ENABLED = False  # Отключение CSRF для тестов
+    RATELIMIT_STORAGE_URI = 'memory://'
+    RATE_WINDOW_STORAGE_URI = 'memory://'
+    AUDIT_FLUSH_SIZE = 1  # Журнал действий записывается в конце каждого запроса
+    BCRYPT_LOG_ROUNDS = 4  # Минимальная стоимость bcrypt ускоряет тесты
\ No newline at end of file
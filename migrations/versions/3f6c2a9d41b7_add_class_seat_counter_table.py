@@ -0,0 +1,42 @@
+"""Add class_seat_counter table
+
+Revision ID: 3f6c2a9d41b7
+Revises: 1002038f7807
+Create Date: 2026-10-18 10:12:04.215731
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6c2a9d41b7'
+down_revision = '1002038f7807'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('class_seat_counter',
+    sa.Column('class_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.String(length=10), nullable=False),
+    sa.Column('confirmed', sa.Integer(), nullable=False),
+    sa.Column('capacity', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['class_id'], ['class.id'], ),
+    sa.PrimaryKeyConstraint('class_id', 'day')
+    )
+
+    # Заполнение счётчиков по уже существующим подтверждённым бронированиям
+    op.execute(
+        """
+        INSERT INTO class_seat_counter (class_id, day, confirmed, capacity)
+        SELECT booking.class_id, booking.day, COUNT(booking.id), "class".capacity
+        FROM booking JOIN "class" ON "class".id = booking.class_id
+        WHERE booking.status = 'confirmed'
+        GROUP BY booking.class_id, booking.day, "class".capacity
+        """
+    )
+
+
+def downgrade():
+    op.drop_table('class_seat_counter')
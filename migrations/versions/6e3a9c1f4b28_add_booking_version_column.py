@@ -0,0 +1,26 @@
+"""Add version column to booking
+
+Revision ID: 6e3a9c1f4b28
+Revises: 4d7f2b8e6a19
+Create Date: 2026-10-18 17:12:05.318442
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e3a9c1f4b28'
+down_revision = '4d7f2b8e6a19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('booking', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('booking', schema=None) as batch_op:
+        batch_op.drop_column('version')
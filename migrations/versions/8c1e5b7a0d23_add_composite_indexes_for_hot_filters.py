@@ -0,0 +1,49 @@
+"""Add composite indexes for hot booking and action_log filters
+
+Revision ID: 8c1e5b7a0d23
+Revises: 3f6c2a9d41b7
+Create Date: 2026-10-18 11:02:47.530912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c1e5b7a0d23'
+down_revision = '3f6c2a9d41b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Таблица action_log раньше создавалась только через db.create_all()
+    if 'action_log' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('action_log',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('action', sa.String(length=255), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.Column('ip_address', sa.String(length=45), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+    with op.batch_alter_table('booking', schema=None) as batch_op:
+        batch_op.create_index('ix_booking_class_id_day_status', ['class_id', 'day', 'status'], unique=False)
+        batch_op.create_index('ix_booking_user_id_status_booking_date', ['user_id', 'status', 'booking_date'], unique=False)
+        batch_op.create_index('ix_booking_user_id_booking_date', ['user_id', 'booking_date'], unique=False)
+
+    with op.batch_alter_table('action_log', schema=None) as batch_op:
+        batch_op.create_index('ix_action_log_user_id_action_status_timestamp', ['user_id', 'action', 'status', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('action_log', schema=None) as batch_op:
+        batch_op.drop_index('ix_action_log_user_id_action_status_timestamp')
+
+    with op.batch_alter_table('booking', schema=None) as batch_op:
+        batch_op.drop_index('ix_booking_user_id_booking_date')
+        batch_op.drop_index('ix_booking_user_id_status_booking_date')
+        batch_op.drop_index('ix_booking_class_id_day_status')
@@ -0,0 +1,29 @@
+"""Add booking_list_version table
+
+Revision ID: a3d5f8b2c6e4
+Revises: 7f4b2d9e1c36
+Create Date: 2026-10-18 21:12:45.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d5f8b2c6e4'
+down_revision = '7f4b2d9e1c36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('booking_list_version',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('booking_list_version')
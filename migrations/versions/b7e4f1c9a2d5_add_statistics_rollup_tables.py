@@ -0,0 +1,65 @@
+"""Add statistics rollup tables
+
+Revision ID: b7e4f1c9a2d5
+Revises: 5a9d0e4c7b12
+Create Date: 2026-10-18 14:05:47.318902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e4f1c9a2d5'
+down_revision = '5a9d0e4c7b12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_booking_stat',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('confirmed', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    with op.batch_alter_table('user_booking_stat', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_user_booking_stat_confirmed'), ['confirmed'], unique=False)
+
+    op.create_table('payment_status_stat',
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('status')
+    )
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_user_last_login'), ['last_login'], unique=False)
+
+    # Заполнение сводок по уже существующим данным
+    op.execute(
+        """
+        INSERT INTO user_booking_stat (user_id, confirmed)
+        SELECT booking.user_id, COUNT(booking.id)
+        FROM booking
+        WHERE booking.status = 'confirmed'
+        GROUP BY booking.user_id
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO payment_status_stat (status, count)
+        SELECT payment.status, COUNT(payment.id)
+        FROM payment
+        GROUP BY payment.status
+        """
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_last_login'))
+
+    op.drop_table('payment_status_stat')
+    with op.batch_alter_table('user_booking_stat', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_booking_stat_confirmed'))
+
+    op.drop_table('user_booking_stat')
@@ -0,0 +1,40 @@
+"""Add refresh_token_family table
+
+Revision ID: c5e7a9d1b3f6
+Revises: a3d5f8b2c6e4
+Create Date: 2026-10-18 22:05:13.482906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e7a9d1b3f6'
+down_revision = 'a3d5f8b2c6e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('refresh_token_family',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('generation', sa.Integer(), nullable=False),
+    sa.Column('revoked', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('refresh_token_family', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_refresh_token_family_expires_at'), ['expires_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_refresh_token_family_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('refresh_token_family', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_refresh_token_family_user_id'))
+        batch_op.drop_index(batch_op.f('ix_refresh_token_family_expires_at'))
+
+    op.drop_table('refresh_token_family')
@@ -0,0 +1,26 @@
+"""Add payment user_id/timestamp index
+
+Revision ID: e2a8c6d3f915
+Revises: b7e4f1c9a2d5
+Create Date: 2026-10-18 15:02:19.804417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a8c6d3f915'
+down_revision = 'b7e4f1c9a2d5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.create_index('ix_payment_user_id_timestamp', ['user_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.drop_index('ix_payment_user_id_timestamp')
@@ -1,10 +1,13 @@
 # tests/conftest.py
 
+from contextlib import contextmanager
+
 import pytest
 from flask_jwt_extended import create_access_token
 from app import create_app, db, bcrypt
 from config_test import TestConfig
 from app.models import User, Class
+from app.query_stats import capture_queries
 from datetime import datetime, timedelta
 
 @pytest.fixture(scope='function')
@@ -101,6 +104,20 @@ def admin_access_token(app):
         return token
 
 
+@pytest.fixture(scope='function')
+def query_budget(app):
+    """
+    Фикстура для проверки максимального числа SQL-запросов:
 
+        with query_budget(5):
+            client.get('/my_bookings')
 
+    При превышении тест падает со списком запросов, местами их вызова и повторами.
+    """
+    @contextmanager
+    def budget(max_queries):
+        with capture_queries() as log:
+            yield log
+        assert len(log) <= max_queries, f"Превышен бюджет {max_queries} SQL-запросов. {log.report()}"
 
+    return budget
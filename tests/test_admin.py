@@ -112,4 +112,70 @@ def test_delete_class(client, app):
         deleted_class = Class.query.get(2)
         assert deleted_class is None, "Class was not deleted from the database"
 
-    logout(client)
\ No newline at end of file
+    logout(client)
+
+def admin_login(client):
+    """
+    Вход администратора через форму входа.
+    """
+    return client.post('/login', data={
+        'email_or_username': 'adminuser',
+        'password': 'adminpassword'
+    })
+
+
+def test_admin_panel_user_pages_and_search(client, app, mocker):
+    """
+    Тест keyset-пагинации и поиска пользователей в панели администратора.
+    """
+    from app import db
+    from app.models import User
+    mocker.patch('app.admin_routes.ADMIN_PAGE_SIZE', 2)
+    with app.app_context():
+        db.session.add_all([
+            User(username=f'member{i}', email=f'member{i}@example.com', password='x') for i in range(3)
+        ])
+        db.session.commit()
+
+    admin_login(client)
+    seen, url = [], '/admin/'
+    while url:
+        html = client.get(url).get_data(as_text=True)
+        seen.extend(name for name in ('adminuser', 'member0', 'member1', 'member2', 'testuser1')
+                    if f'<td>{name}</td>' in html)
+        marker = 'users_after='
+        url = None
+        if 'Следующие' in html and marker in html:
+            start = html.index(marker)
+            cursor = html[start + len(marker):].split('&')[0].split('"')[0]
+            url = f'/admin/?users_after={cursor}'
+
+    assert seen == ['adminuser', 'member0', 'member1', 'member2', 'testuser1']
+
+    html = client.get('/admin/?user_q=MEMBER1').get_data(as_text=True)
+    assert '<td>member1</td>' in html
+    assert '<td>member0</td>' not in html
+
+
+def test_admin_user_details_fragment(client, app):
+    """
+    Тест отдельной загрузки бронирований и платежей пользователя.
+    """
+    from app import db
+    from app.models import Booking, Payment, User
+    with app.app_context():
+        user = User.query.filter_by(username='testuser1').first()
+        yoga = Class.query.filter_by(name='Yoga').first()
+        db.session.add(Booking(user_id=user.id, class_id=yoga.id, day='Monday'))
+        db.session.add(Payment(user_id=user.id, amount=12.5, stripe_payment_id='pi_1'))
+        db.session.commit()
+        user_id = user.id
+
+    admin_login(client)
+    response = client.get(f'/admin/users/{user_id}/details')
+
+    assert response.status_code == 200
+    html = response.get_data(as_text=True)
+    assert 'Yoga' in html
+    assert '12.50' in html
+    assert '<html' not in html
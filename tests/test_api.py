@@ -1,7 +1,9 @@
+import json
 from datetime import datetime, timezone
 
 import pytest
-from app.models import Booking, Class
+from sqlalchemy import event
+from app.models import Booking, Class, User
 from app import db
 
 
@@ -220,3 +222,235 @@ def test_api_non_admin_access_to_others_booking(client, access_token):
     assert response.status_code == 403, f"Ожидался статус код 403, получен {response.status_code}"
     json_data = response.get_json()
     assert json_data['message'] == 'Access denied', f"Ожидалось сообщение 'Access denied', получено '{json_data.get('message')}'"
+
+
+def add_user_bookings(app, count):
+    """
+    Создаёт count бронирований testuser1; у пар бронирований одинаковая дата,
+    чтобы проверить порядок по id внутри одной даты.
+    """
+    with app.app_context():
+        user = User.query.filter_by(email='test1@example.com').first()
+        base = datetime(2026, 1, 1)
+        bookings = [
+            Booking(user_id=user.id, class_id=1, status='confirmed', day='Monday',
+                    booking_date=base.replace(day=1 + i // 2))
+            for i in range(count)
+        ]
+        db.session.add_all(bookings)
+        db.session.commit()
+        return [booking.id for booking in bookings]
+
+
+def test_get_bookings_keyset_pages(client, app, user_access_token):
+    """
+    Тест постраничного списка бронирований по курсору (booking_date, id)
+    """
+    expected_ids = add_user_bookings(app, 5)
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+
+    ids, url, pages = [], '/api/v1/bookings?limit=2', 0
+    while url:
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        ids.extend(item['id'] for item in response.get_json())
+        pages += 1
+        cursor = response.headers.get('X-Next-Cursor')
+        url = f'/api/v1/bookings?limit=2&cursor={cursor}' if cursor else None
+
+    assert ids == expected_ids
+    assert pages == 3
+
+
+def test_get_bookings_fields_and_invalid_params(client, app, user_access_token):
+    """
+    Тест выбора полей и проверки параметров списка бронирований
+    """
+    add_user_bookings(app, 1)
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+
+    response = client.get('/api/v1/bookings?fields=id,status', headers=headers)
+    assert response.status_code == 200
+    assert set(response.get_json()[0]) == {'id', 'status'}
+
+    for query in ('fields=password', 'cursor=not-a-cursor', 'limit=0', 'limit=abc'):
+        response = client.get(f'/api/v1/bookings?{query}', headers=headers)
+        assert response.status_code == 400, query
+
+
+def test_get_bookings_ndjson_stream(client, app, user_access_token, mocker):
+    """
+    Тест потоковой выгрузки бронирований в NDJSON пакетами
+    """
+    mocker.patch('app.api.bookings.STREAM_BATCH_SIZE', 2)
+    expected_ids = add_user_bookings(app, 5)
+
+    response = client.get('/api/v1/bookings?format=ndjson&fields=id,booking_date', headers={
+        'Authorization': f'Bearer {user_access_token}'
+    })
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line['id'] for line in lines] == expected_ids
+    assert lines[0]['booking_date'] == '2026-01-01T00:00:00'
+
+
+def test_get_booking_conditional_request(client, app, user_access_token):
+    """
+    Тест ETag бронирования: 304 при неизменной версии, новый ETag после изменения
+    """
+    booking_id = add_user_bookings(app, 1)[0]
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+
+    response = client.get(f'/api/v1/bookings/{booking_id}', headers=headers)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+
+    response = client.get(f'/api/v1/bookings/{booking_id}', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+    response = client.put(f'/api/v1/bookings/{booking_id}', json={'status': 'cancelled'}, headers=headers)
+    assert response.status_code == 200
+
+    response = client.get(f'/api/v1/bookings/{booking_id}', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'cancelled'
+    assert response.headers['ETag'] != etag
+
+
+def test_get_bookings_list_conditional_request(client, app, user_access_token):
+    """
+    Тест ETag списка бронирований: 304 до изменения списка, учёт параметров запроса
+    """
+    add_user_bookings(app, 2)
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+
+    etag = client.get('/api/v1/bookings', headers=headers).headers['ETag']
+    response = client.get('/api/v1/bookings', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+
+    response = client.get('/api/v1/bookings?fields=id', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+
+    add_user_bookings(app, 1)
+    response = client.get('/api/v1/bookings', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert len(response.get_json()) == 3
+
+    # Удаление последнего бронирования и создание другого с тем же id (rowid в SQLite)
+    etag = response.headers['ETag']
+    with app.app_context():
+        last = Booking.query.order_by(Booking.id.desc()).first()
+        last_id = last.id
+        db.session.delete(last)
+        db.session.commit()
+        db.session.add(Booking(user_id=last.user_id, class_id=2, status='confirmed', day='Tuesday',
+                               booking_date=datetime(2026, 1, 2)))
+        db.session.commit()
+        assert Booking.query.order_by(Booking.id.desc()).first().id == last_id
+    response = client.get('/api/v1/bookings', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()[-1]['class_id'] == 2
+
+
+def change_before_commit(booking_id):
+    """Изменяет бронирование в отдельной транзакции перед ближайшим commit сессии (конкурентный запрос)."""
+    def concurrent_update(session):
+        with db.engine.begin() as connection:
+            connection.execute(
+                db.update(Booking).where(Booking.id == booking_id)
+                .values(status='cancelled', version=Booking.version + 1)
+            )
+
+    event.listen(db.session, 'before_commit', concurrent_update, once=True)
+
+
+def test_update_and_delete_booking_conflict(client, app, user_access_token):
+    """
+    Тест конкурентного изменения бронирования: PUT и DELETE возвращают 409, изменения откатываются
+    """
+    booking_id = add_user_bookings(app, 1)[0]
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+
+    change_before_commit(booking_id)
+    response = client.put(f'/api/v1/bookings/{booking_id}', json={'status': 'pending'}, headers=headers)
+    assert response.status_code == 409
+
+    change_before_commit(booking_id)
+    response = client.delete(f'/api/v1/bookings/{booking_id}', headers=headers)
+    assert response.status_code == 409
+
+    with app.app_context():
+        booking = db.session.get(Booking, booking_id)
+        assert booking.status == 'cancelled'
+        assert booking.version == 3
+
+
+def test_batch_booking_per_item_results(client, app, user_access_token):
+    """
+    Тест пакетного бронирования: успешные элементы сохраняются, для остальных — причина отказа
+    """
+    with app.app_context():
+        Class.query.filter_by(name='Pilates').one().capacity = 0
+        db.session.commit()
+        yoga_id = Class.query.filter_by(name='Yoga').one().id
+        pilates_id = Class.query.filter_by(name='Pilates').one().id
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+
+    response = client.post('/api/v1/bookings:batch', headers=headers, json={'items': [
+        {'class_id': yoga_id, 'day': 'Monday'},
+        {'class_id': yoga_id, 'day': 'Wednesday'},
+        {'class_id': yoga_id, 'day': 'Monday'},
+        {'class_id': yoga_id, 'day': 'Friday'},
+        {'class_id': pilates_id, 'day': 'Tuesday'},
+        {'class_id': 999, 'day': 'Monday'},
+    ]})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert (data['created'], data['failed']) == (2, 4)
+    assert [item['status'] for item in data['results']] == ['created', 'created'] + ['error'] * 4
+    assert [item.get('message') for item in data['results'][2:]] == [
+        'Already booked', 'Class is not held on this day', 'No available slots', 'Class not found'
+    ]
+
+    with app.app_context():
+        assert Booking.query.filter_by(class_id=yoga_id).count() == 2
+        assert db.session.get(Class, yoga_id).available_slots('Monday') == 9
+
+    response = client.post('/api/v1/bookings:batch', headers=headers, json={'items': [
+        {'class_id': yoga_id, 'day': 'Monday'}
+    ]})
+    assert response.get_json()['results'][0]['message'] == 'Already booked'
+
+    for body in ({}, {'items': []}, {'items': [{'class_id': '1', 'day': 'Monday'}]}):
+        assert client.post('/api/v1/bookings:batch', headers=headers, json=body).status_code == 400
+
+
+def test_single_and_batch_bookings_share_duplicate_rule(client, app, user_access_token):
+    """
+    Тест общего правила повторного бронирования: отменённое бронирование на тот же класс и день
+    отклоняет и пакетное, и одиночное бронирование; бронирование на другой день не мешает
+    """
+    with app.app_context():
+        user = User.query.filter_by(email='test1@example.com').one()
+        yoga = Class.query.filter_by(name='Yoga').one()
+        yoga_id, schedule_day = yoga.id, yoga.schedule.strftime('%A')
+        db.session.add(Booking(user_id=user.id, class_id=yoga_id, day='Monday', status='cancelled',
+                               booking_date=datetime.now(timezone.utc)))
+        db.session.commit()
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+
+    response = client.post('/api/v1/bookings:batch', headers=headers, json={'items': [
+        {'class_id': yoga_id, 'day': 'Monday'}
+    ]})
+    assert response.get_json()['results'][0]['message'] == 'Already booked'
+
+    # Одиночное бронирование API выбирает день по расписанию класса
+    response = client.post('/api/v1/bookings', headers=headers, json={'class_id': yoga_id})
+    if schedule_day == 'Monday':
+        assert response.status_code == 400
+        assert response.get_json()['message'] == 'You have already booked this class'
+    else:
+        assert response.status_code == 201
@@ -0,0 +1,58 @@
+# tests/test_audit.py
+
+from app import audit, db
+from app.audit import log_action
+from app.models import ActionLog, User
+
+
+def test_log_action_piggybacks_on_commit(app):
+    """
+    Тест записи журнала в транзакции основного commit.
+    """
+    with app.app_context():
+        user = User.query.filter_by(email='test1@example.com').first()
+        user.last_login = None
+        log_action('Login', status='success', user_id=user.id, ip_address='127.0.0.1')
+        assert ActionLog.query.count() == 0
+
+        db.session.commit()
+        log = ActionLog.query.one()
+        assert (log.user_id, log.action, log.status, log.ip_address) == (user.id, 'Login', 'success', '127.0.0.1')
+
+
+def test_rolled_back_records_are_discarded(app):
+    """
+    Тест отбрасывания записей, вставленных в откатившуюся транзакцию.
+    """
+    with app.app_context():
+        log_action('Registration', status='success')
+        db.session.add(User(username='testuser1', email='dup@example.com', password='x'))
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+
+    with app.app_context():
+        assert audit.flush() == 0
+        assert ActionLog.query.count() == 0
+
+
+def test_records_without_commit_are_buffered_and_flushed(client, app):
+    """
+    Тест буферизации записей запросов без commit и пакетного сброса по порогу размера.
+    """
+    app.config['AUDIT_FLUSH_SIZE'] = 3
+
+    client.get('/error/invalid_token')
+    client.get('/error/invalid_token')
+    with app.app_context():
+        assert ActionLog.query.count() == 0
+
+    client.get('/error/too_many_attempts')
+    with app.app_context():
+        actions = [log.action for log in ActionLog.query.order_by(ActionLog.id)]
+    assert actions == [
+        'Страница ошибки: invalid_token',
+        'Страница ошибки: invalid_token',
+        'Страница ошибки: too_many_attempts',
+    ]
@@ -5,6 +5,7 @@ from app.models import Booking, Class, User
 from flask_jwt_extended import create_access_token
 from datetime import datetime, timezone
 from app import db, bcrypt  # Правильный импорт
+from sqlalchemy import event
 
 @pytest.fixture
 def sample_class(app):
@@ -502,4 +503,26 @@ def test_delete_non_existing_booking(client, user_access_token):
         }
     )
 
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+def test_cancel_booking_concurrent_update(client, app):
+    """
+    Тест отмены бронирования, изменённого в другом запросе: сообщение вместо ошибки 500.
+    """
+    with app.app_context():
+        user = User.query.filter_by(username='testuser1').first()
+        booking = Booking(user_id=user.id, class_id=1, status='confirmed', day='Monday')
+        db.session.add(booking)
+        db.session.commit()
+        booking_id = booking.id
+
+    def concurrent_delete(target, context):
+        with db.engine.begin() as connection:
+            connection.execute(db.delete(Booking).where(Booking.id == booking_id))
+
+    client.post('/login', data={'email_or_username': 'testuser1', 'password': 'password1'})
+    event.listen(Booking, 'load', concurrent_delete, once=True)
+    response = client.post(f'/cancel_booking/{booking_id}', data={'booking_id': booking_id}, follow_redirects=True)
+
+    assert response.status_code == 200
+    assert 'Бронирование было изменено в другом запросе' in response.data.decode('utf-8')
@@ -1,6 +1,9 @@
 # tests/test_classes.py
 
+from datetime import datetime, timedelta
+
 import pytest
+from sqlalchemy import event
 
 from app import db
 from app.models import Booking, Class
@@ -58,4 +61,54 @@ def test_overbooking(client, app):
         else:
             assert 'Извините, места на этот класс уже заполнены.' in response.data.decode('utf-8')
 
-    logout(client)
\ No newline at end of file
+    logout(client)
+
+
+def count_queries(app, client, url):
+    """
+    Возвращает количество SQL-запросов, выполненных при обработке GET-запроса.
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def add_classes(app, count):
+    with app.app_context():
+        for i in range(count):
+            db.session.add(Class(
+                name=f'Class {i}',
+                schedule=datetime.now() + timedelta(days=2),
+                capacity=5,
+                days_of_week='Friday'
+            ))
+        db.session.commit()
+
+
+@pytest.mark.parametrize('url', ['/', '/classes'])
+def test_class_listing_query_count_is_constant(client, app, url):
+    """
+    Регрессионный тест N+1: число запросов не зависит от количества классов.
+    """
+    client.post('/login', data={'email_or_username': 'test1@example.com', 'password': 'password1'})
+    # Первый запрос прогревает кэш текущего пользователя в g
+    count_queries(app, client, url)
+
+    # Карточки рендерятся заново, а не берутся из кэша фрагментов
+    app.extensions['fragment_cache'].clear()
+    baseline = count_queries(app, client, url)
+    assert baseline <= 2
+    add_classes(app, 20)
+    app.extensions['fragment_cache'].clear()
+    assert count_queries(app, client, url) == baseline
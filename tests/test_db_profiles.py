@@ -0,0 +1,40 @@
+# tests/test_db_profiles.py
+
+from flask import Flask
+
+from app import db, db_profiles
+
+
+def test_sqlite_profile_applies_pragmas(app):
+    """
+    Тест профиля SQLite: WAL, synchronous=NORMAL и busy_timeout на соединениях приложения.
+    """
+    assert app.config['DB_PROFILE'] == 'sqlite'
+    with db.engine.connect() as connection:
+        assert connection.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+        # 1 — NORMAL
+        assert connection.exec_driver_sql('PRAGMA synchronous').scalar() == 1
+        assert connection.exec_driver_sql('PRAGMA busy_timeout').scalar() == 5000
+
+
+def test_postgres_profile_engine_options():
+    """
+    Тест профиля Postgres: параметры пула из конфигурации, явные SQLALCHEMY_ENGINE_OPTIONS важнее профиля.
+    """
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI='postgres://user:secret@db/c_work',
+        DB_POOL_SIZE=5,
+        SQLALCHEMY_ENGINE_OPTIONS={'pool_recycle': 300},
+    )
+    db_profiles.configure(app)
+
+    assert app.config['SQLALCHEMY_DATABASE_URI'] == 'postgresql://user:secret@db/c_work'
+    assert app.config['DB_PROFILE'] == 'postgres'
+    assert app.config['SQLALCHEMY_ENGINE_OPTIONS'] == {
+        'pool_size': 5,
+        'max_overflow': 20,
+        'pool_timeout': 30,
+        'pool_recycle': 300,
+        'pool_pre_ping': True,
+    }
@@ -0,0 +1,72 @@
+# tests/test_fragment_cache.py
+
+from sqlalchemy import event
+
+from app import db
+from app.fragment_cache import FragmentCache
+from app.models import Class
+from app.reservations import reserve_seat
+
+
+def count_queries(app, client, url):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_anonymous_home_page_is_served_without_queries(app, client):
+    """
+    Тест кэша фрагментов: повторная главная страница для анонимного посетителя не обращается к базе.
+    """
+    assert count_queries(app, client, '/') > 0
+    assert count_queries(app, client, '/') == 0
+    assert 'Yoga' in client.get('/').data.decode('utf-8')
+
+
+def test_class_card_is_invalidated_by_booking_and_edit(app, client):
+    """
+    Тест версий: бронирование и изменение класса обновляют закэшированные карточки.
+    """
+    client.post('/login', data={'email_or_username': 'testuser1', 'password': 'password1'})
+    assert 'Доступно мест:</strong> 10' in client.get('/classes').data.decode('utf-8')
+
+    with app.app_context():
+        yoga = Class.query.filter_by(name='Yoga').one()
+        reserve_seat(1, yoga, 'Monday')
+        db.session.commit()
+    assert 'Доступно мест:</strong> 9' in client.get('/classes').data.decode('utf-8')
+
+    with app.app_context():
+        Class.query.filter_by(name='Yoga').one().name = 'Hatha Yoga'
+        db.session.commit()
+    html = client.get('/').data.decode('utf-8')
+    assert 'Hatha Yoga' in html and 'Pilates' in html
+
+
+def test_fragment_cache_evicts_least_recently_used():
+    """
+    Тест ограничений кэша: вытеснение LRU по числу записей и по суммарному размеру.
+    """
+    cache = FragmentCache(ttl=60, max_entries=2, max_bytes=10)
+    cache.set('a', 'aaa', size=3)
+    cache.set('b', 'bbb', size=3)
+    assert cache.get('a') == 'aaa'
+    cache.set('c', 'ccc', size=3)
+    assert cache.get('b') is None and len(cache) == 2
+
+    cache.set('d', 'dddddddd', size=8)
+    assert cache.get('a') is None and cache.get('c') is None and cache.get('d') == 'dddddddd'
+
+    cache.set('huge', 'x' * 11, size=11)
+    assert cache.get('huge') is None
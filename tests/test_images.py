@@ -0,0 +1,129 @@
+# tests/test_images.py
+
+import io
+import os
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from app import db, images
+from app.models import Class
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def make_image(path, size=(1600, 1200), color=(200, 30, 30)):
+    Image.new('RGB', size, color).save(path, format='JPEG')
+
+
+def test_generate_variants_uses_content_hash_names(tmp_path):
+    """
+    Тест производных изображений: размеры, WebP, имена по хэшу содержимого и манифест.
+    """
+    make_image(tmp_path / 'first.jpg')
+    make_image(tmp_path / 'second.jpg')
+    folder = str(tmp_path / 'variants')
+
+    manifest = images.generate_variants(str(tmp_path / 'first.jpg'), folder)
+    thumb, card = manifest['variants']['thumb'], manifest['variants']['card']
+    assert (thumb['width'], thumb['height']) == (100, 100)
+    assert (card['width'], card['height']) == (800, 600)
+    assert thumb['webp'].endswith('.webp') and thumb['fallback'].endswith('.jpg')
+    with Image.open(os.path.join(folder, card['webp'])) as webp:
+        assert webp.format == 'WEBP' and webp.size == (800, 600)
+    assert os.path.exists(os.path.join(folder, 'first.jpg.json'))
+
+    # Одинаковое содержимое даёт те же файлы
+    assert images.generate_variants(str(tmp_path / 'second.jpg'), folder) == manifest
+
+
+def test_picture_helper_picks_variant(app, tmp_path):
+    """
+    Тест хелпера picture(): <picture> с WebP после создания вариантов, оригинал до этого.
+    """
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    make_image(tmp_path / 'yoga.jpg')
+
+    with app.test_request_context():
+        html = str(images.picture('yoga.jpg', 'thumb', alt='Yoga', class_='rounded-circle', width=50, height=50))
+        assert html.startswith('<img') and 'yoga.jpg' in html
+
+        images.schedule_variants('yoga.jpg')
+        entry = images.load_manifest('yoga.jpg')['variants']['thumb']
+        html = str(images.picture('yoga.jpg', 'thumb', alt='Yoga', class_='rounded-circle', width=50, height=50))
+
+    assert html.startswith('<picture>')
+    assert f'{entry["webp"]}" type="image/webp"' in html
+    assert entry['fallback'] in html
+    assert 'class="rounded-circle"' in html and 'width="50"' in html and 'height="50"' in html
+
+
+def test_store_upload_deduplicates_by_content(app, tmp_path):
+    """
+    Тест хранения по хэшу: повторная загрузка того же файла не создаёт копию.
+    """
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    make_image(tmp_path / 'source.jpg')
+    data = (tmp_path / 'source.jpg').read_bytes()
+
+    with app.test_request_context():
+        first = images.store_upload(FileStorage(io.BytesIO(data), filename='yoga.JPEG'))
+        second = images.store_upload(FileStorage(io.BytesIO(data), filename='copy.jpg'))
+
+    assert first == second
+    assert images.CONTENT_HASH_RE.match(first) and first.endswith('.jpg')
+    assert sorted(os.listdir(tmp_path)) == sorted(['source.jpg', first])
+
+
+def test_content_hash_images_are_served_immutable(app, client, tmp_path):
+    """
+    Тест заголовков: immutable Cache-Control, ETag по хэшу и 304 на If-None-Match.
+    """
+    app.static_folder = str(tmp_path)
+    (tmp_path / 'images').mkdir()
+    name = 'a' * 32 + '.png'
+    (tmp_path / 'images' / name).write_bytes(b'png')
+    (tmp_path / 'images' / 'user.png').write_bytes(b'png')
+
+    response = client.get(f'/static/images/{name}')
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'max-age=31536000' in response.headers['Cache-Control']
+    assert response.headers['ETag'] == f'"{"a" * 32}"'
+
+    response = client.get(f'/static/images/{name}', headers={'If-None-Match': f'"{"a" * 32}"'})
+    assert response.status_code == 304
+
+    # Остальная статика кэшируется как обычно
+    assert 'immutable' not in client.get('/static/images/user.png').headers.get('Cache-Control', '')
+
+
+def test_collect_garbage_removes_unreferenced_files(app, tmp_path):
+    """
+    Тест сборки мусора: удаляются только неиспользуемые загрузки по хэшу и их варианты.
+    """
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    make_image(tmp_path / 'a.jpg', color=(10, 10, 10))
+    make_image(tmp_path / 'b.jpg', color=(250, 250, 250))
+
+    with app.test_request_context():
+        used = images.store_upload(FileStorage(io.BytesIO((tmp_path / 'a.jpg').read_bytes()), filename='a.jpg'))
+        orphan = images.store_upload(FileStorage(io.BytesIO((tmp_path / 'b.jpg').read_bytes()), filename='b.jpg'))
+        images.create_variants(used)
+        images.create_variants(orphan)
+        Class.query.filter_by(name='Yoga').one().image_filename = used
+        db.session.commit()
+
+        orphan_variants = images.load_manifest(orphan)['variants']['thumb']
+        assert images.collect_garbage() == []  # Файлы моложе grace_period
+
+        garbage = images.collect_garbage(grace_period=0)
+
+    variants = tmp_path / 'variants'
+    assert not (tmp_path / orphan).exists()
+    assert not (variants / f'{orphan}.json').exists()
+    assert not (variants / orphan_variants['webp']).exists()
+    assert len(garbage) == 2 + 2 * len(images.DEFAULT_VARIANTS)
+    assert (tmp_path / used).exists() and (variants / f'{used}.json').exists()
+    # Файлы со старыми именами не удаляются
+    assert (tmp_path / 'a.jpg').exists() and (tmp_path / 'b.jpg').exists()
@@ -0,0 +1,72 @@
+# tests/test_mailer.py
+
+from datetime import datetime
+
+from flask_mail import Connection
+
+from app import db, mail
+from app.mailer import queue_email, send_pending_emails
+from app.models import OutboxEmail
+
+
+def test_queued_emails_are_sent_in_one_batch(app):
+    """
+    Тест отправки писем из очереди, включая рассылку администраторам.
+    """
+    with app.app_context():
+        queue_email('Подтверждение', recipients=['test1@example.com'], body='Текст')
+        queue_email('Уведомление', to_admins=True, body='Текст')
+        db.session.commit()
+
+        with mail.record_messages() as outbox:
+            assert send_pending_emails() == 2
+
+        assert [message.recipients for message in outbox] == [['test1@example.com'], ['admin@example.com']]
+        assert OutboxEmail.query.filter_by(status='sent').count() == 2
+        # Повторный запуск ничего не отправляет
+        assert send_pending_emails() == 0
+
+
+def test_failed_email_is_retried_with_backoff(app, mocker):
+    """
+    Тест отложенной повторной отправки и пометки письма как 'failed'.
+    """
+    app.config['MAIL_OUTBOX_MAX_ATTEMPTS'] = 2
+    mocker.patch.object(Connection, 'send', side_effect=OSError('SMTP недоступен'))
+
+    with app.app_context():
+        email = queue_email('Сброс Пароля', recipients=['test1@example.com'], body='Ссылка')
+        db.session.commit()
+
+        assert send_pending_emails() == 0
+        db.session.refresh(email)
+        assert email.status == 'pending'
+        assert email.attempts == 1
+        assert email.next_attempt_at > datetime.utcnow()
+
+        # Письмо ещё не готово к повторной отправке
+        assert send_pending_emails() == 0
+        db.session.refresh(email)
+        assert email.attempts == 1
+
+        email.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+        send_pending_emails()
+        db.session.refresh(email)
+        assert email.status == 'failed'
+        assert 'SMTP' in email.last_error
+
+
+def test_reset_password_queues_email(client, app):
+    """
+    Тест постановки письма сброса пароля в очередь без синхронной отправки.
+    """
+    with mail.record_messages() as outbox:
+        response = client.post('/reset_password', data={'email': 'test1@example.com'})
+
+    assert response.status_code == 200
+    assert outbox == []
+    with app.app_context():
+        email = OutboxEmail.query.filter_by(subject='Сброс Пароля').one()
+        assert email.recipients == 'test1@example.com'
+        assert '/reset_password/' in email.body
@@ -0,0 +1,95 @@
+# tests/test_metrics.py
+
+import os
+
+from app.metrics import FileStore, Metrics, Registry, merge, render
+
+
+def login(client, username, password):
+    return client.post('/login', data={'email_or_username': username, 'password': password})
+
+
+def test_metrics_requires_admin(client, app):
+    """
+    Тест доступа к /metrics: без входа — 401, обычный пользователь — 403, токен METRICS_TOKEN — 200
+    """
+    assert client.get('/metrics').status_code == 401
+
+    login(client, 'testuser1', 'password1')
+    assert client.get('/metrics').status_code == 403
+    client.get('/logout')
+
+    app.config['METRICS_TOKEN'] = 'scrape-secret'
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+
+
+def test_request_metrics_are_exported(client, app):
+    """
+    Тест счётчиков, гистограмм длительности и числа SQL-запросов по маршрутам
+    """
+    client.get('/')
+    client.get('/classes')
+    client.get('/no-such-page')
+    client.open('/', method='FOOBAR')
+    login(client, 'adminuser', 'adminpassword')
+
+    body = client.get('/metrics').get_data(as_text=True)
+    assert '# TYPE http_request_duration_seconds histogram' in body
+    assert 'http_requests_total{endpoint="main.home",method="GET",status="200"} 1' in body
+    assert 'http_requests_total{endpoint="unmatched",method="GET",status="404"} 1' in body
+    assert 'http_request_duration_seconds_count{endpoint="main.classes",method="GET"} 1' in body
+    # Нестандартный метод не создаёт собственного временного ряда
+    assert 'method="other",status="405"} 1' in body
+    assert 'FOOBAR' not in body
+    assert 'http_request_db_queries_count{endpoint="main.login"} 1' in body
+    assert 'password_hash_duration_seconds_count{operation="verify"} 1' in body
+    # Запрос к /metrics ещё выполняется
+    assert 'http_requests_in_progress{endpoint="metrics"} 1' in body
+
+
+def test_snapshots_are_merged_across_processes(tmp_path):
+    """
+    Тест объединения снимков воркеров: счётчики суммируются, gauge — только по работающим процессам
+    """
+    store = FileStore(str(tmp_path))
+    for key in ('101-1', '102-1'):
+        registry = Registry()
+        registry.inc('http_requests_total', {'endpoint': 'main.home', 'method': 'GET', 'status': '200'}, 2)
+        registry.gauge_add('http_requests_in_progress', {'endpoint': 'main.home'}, 1)
+        registry.observe('http_request_duration_seconds', {'endpoint': 'main.home', 'method': 'GET'}, 0.02,
+                         (0.01, 0.05))
+        store.write(key, registry.snapshot())
+
+    body = render(merge(store.read_all(), live_keys={'101-1'}))
+    assert 'http_requests_total{endpoint="main.home",method="GET",status="200"} 4' in body
+    assert 'http_requests_in_progress{endpoint="main.home"} 1' in body
+    assert 'http_request_duration_seconds_bucket{endpoint="main.home",le="0.01",method="GET"} 0' in body
+    assert 'http_request_duration_seconds_bucket{endpoint="main.home",le="0.05",method="GET"} 2' in body
+    assert 'http_request_duration_seconds_bucket{endpoint="main.home",le="+Inf",method="GET"} 2' in body
+    assert store.clear() == 2
+
+
+def test_dead_process_snapshots_are_archived(tmp_path):
+    """
+    Тест архива снимков: снимок завершившегося процесса с тем же pid не заменяется
+    новым, а при сборе переносится в archive.json без gauge
+    """
+    store = FileStore(str(tmp_path))
+    # Прежний процесс с тем же pid, но другим временем запуска
+    dead = Registry()
+    dead.inc('http_requests_total', {'endpoint': 'main.home', 'method': 'GET', 'status': '200'}, 3)
+    dead.gauge_add('http_requests_in_progress', {'endpoint': 'main.home'}, 1)
+    store.write(f'{os.getpid()}-0', dead.snapshot())
+
+    metrics = Metrics(store=store)
+    metrics.registry.inc('http_requests_total', {'endpoint': 'main.home', 'method': 'GET', 'status': '200'}, 2)
+    assert metrics.key != f'{os.getpid()}-0'
+
+    for _ in range(2):
+        body = render(metrics.collect())
+        assert 'http_requests_total{endpoint="main.home",method="GET",status="200"} 5' in body
+        assert 'http_requests_in_progress' not in body
+    assert sorted(os.listdir(tmp_path)) == sorted(['.lock', 'archive.json', f'{metrics.key}.json'])
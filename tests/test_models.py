@@ -1,8 +1,13 @@
 # tests/test_models.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from sqlalchemy.orm.exc import StaleDataError
+
 from app import db
-from app.models import User, Class, Booking, Payment
+from app.models import User, Class, Booking, Payment, ClassSeatCounter, UserBookingStat
+from app.seats import rebuild_seat_counters
 
 
 def test_user_model(app):
@@ -80,4 +85,123 @@ def test_payment_model(app):
         fetched_payment = Payment.query.filter_by(user_id=user.id).first()
         assert fetched_payment is not None
         assert fetched_payment.amount == 100.0
-        assert fetched_payment.status == 'paid'  # Убедитесь, что статус 'paid' устанавливается корректно
\ No newline at end of file
+        assert fetched_payment.status == 'paid'  # Убедитесь, что статус 'paid' устанавливается корректно
+
+
+def _seat_counter(class_id, day):
+    counter = db.session.query(ClassSeatCounter.confirmed, ClassSeatCounter.capacity).filter_by(
+        class_id=class_id, day=day
+    ).first()
+    return tuple(counter) if counter else None
+
+
+def test_seat_counter_tracks_booking_changes(app):
+    """
+    Тест поддержки счётчика class_seat_counter при создании, отмене и удалении бронирований.
+    """
+    with app.app_context():
+        user = User.query.filter_by(email='test1@example.com').first()
+        class_ = Class.query.filter_by(name='Yoga').first()
+
+        booking = Booking(user_id=user.id, class_id=class_.id, day='Monday')
+        db.session.add(booking)
+        db.session.add(Booking(user_id=user.id, class_id=class_.id, day='Monday', status='pending'))
+        db.session.commit()
+        assert _seat_counter(class_.id, 'Monday') == (1, 10)
+        assert class_.available_slots('Monday') == 9
+        assert class_.enrolled_count == 1
+
+        booking.status = 'cancelled'
+        db.session.commit()
+        assert _seat_counter(class_.id, 'Monday') == (0, 10)
+
+        booking.status = 'confirmed'
+        class_.capacity = 3
+        db.session.commit()
+        assert _seat_counter(class_.id, 'Monday') == (1, 3)
+
+        db.session.delete(booking)
+        db.session.commit()
+        assert _seat_counter(class_.id, 'Monday') == (0, 3)
+
+
+def test_delete_class_with_bookings_enforced_foreign_keys(app):
+    """
+    Тест удаления класса с бронированиями при включённой проверке внешних ключей:
+    строки счётчика удаляются раньше класса.
+    """
+    with app.app_context():
+        user = User.query.filter_by(email='test1@example.com').first()
+        class_ = Class.query.filter_by(name='Yoga').first()
+        class_id = class_.id
+        db.session.add(Booking(user_id=user.id, class_id=class_id, day='Monday'))
+        db.session.commit()
+
+        # PRAGMA действует, только если выполнена до начала транзакции
+        db.session.execute(db.text('PRAGMA foreign_keys=ON'))
+        assert db.session.execute(db.text('PRAGMA foreign_keys')).scalar() == 1
+        db.session.delete(class_)
+        db.session.commit()
+
+        assert db.session.get(Class, class_id) is None
+        assert _seat_counter(class_id, 'Monday') is None
+
+
+def test_concurrent_cancellations_decrement_seat_counter_once(app):
+    """
+    Тест двух одновременных отмен одного бронирования: счётчик уменьшается один раз.
+    """
+    with app.app_context():
+        user = User.query.filter_by(email='test1@example.com').first()
+        class_ = Class.query.filter_by(name='Yoga').first()
+        booking = Booking(user_id=user.id, class_id=class_.id, day='Monday')
+        db.session.add(booking)
+        db.session.add(Booking(user_id=user.id, class_id=class_.id, day='Monday'))
+        db.session.commit()
+        booking_id, class_id, user_id = booking.id, class_.id, user.id
+
+    loaded = threading.Barrier(2)
+
+    def cancel(_):
+        with app.app_context():
+            try:
+                booking = db.session.get(Booking, booking_id)
+                assert booking.status == 'confirmed'
+                loaded.wait()
+                booking.status = 'cancelled'
+                db.session.commit()
+                return 'cancelled'
+            except StaleDataError:
+                db.session.rollback()
+                return 'conflict'
+            finally:
+                db.session.remove()
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = sorted(executor.map(cancel, range(2)))
+
+    with app.app_context():
+        assert _seat_counter(class_id, 'Monday') == (1, 10)
+        assert db.session.get(UserBookingStat, user_id).confirmed == 1
+        assert results == ['cancelled', 'conflict']
+
+
+def test_rebuild_seat_counters(app):
+    """
+    Тест пересчёта счётчиков мест по таблице booking.
+    """
+    with app.app_context():
+        user = User.query.filter_by(email='test1@example.com').first()
+        class_ = Class.query.filter_by(name='Pilates').first()
+        db.session.add(Booking(user_id=user.id, class_id=class_.id, day='Tuesday'))
+        db.session.add(Booking(user_id=user.id, class_id=class_.id, day='Thursday'))
+        db.session.commit()
+
+        # Рассинхронизация, которую события сессии не видят
+        db.session.execute(db.update(ClassSeatCounter).values(confirmed=7))
+        db.session.commit()
+
+        assert rebuild_seat_counters() == 2
+        assert _seat_counter(class_.id, 'Tuesday') == (1, 15)
+        assert _seat_counter(class_.id, 'Thursday') == (1, 15)
+        assert class_.available_slots() == 13
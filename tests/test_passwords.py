@@ -0,0 +1,61 @@
+# tests/test_passwords.py
+
+from app import db, passwords
+from app.models import User
+
+
+def test_rehash_on_login_when_cost_changes(client, app):
+    """
+    Тест пересчёта хэша при входе, если BCRYPT_LOG_ROUNDS изменился
+    """
+    with app.app_context():
+        old_hash = User.query.filter_by(username='testuser1').first().password
+    assert passwords.hash_cost(old_hash) == 4
+
+    app.extensions['passwords'].rounds = 5
+    response = client.post('/login', data={'email_or_username': 'testuser1', 'password': 'password1'})
+    assert response.status_code == 302
+
+    with app.app_context():
+        new_hash = db.session.get(User, User.query.filter_by(username='testuser1').first().id).password
+        assert passwords.hash_cost(new_hash) == 5
+        assert passwords.check_password(new_hash, 'password1')
+
+    # Повторный вход с той же стоимостью хэш не меняет
+    client.get('/logout')
+    client.post('/login', data={'email_or_username': 'testuser1', 'password': 'password1'})
+    with app.app_context():
+        assert User.query.filter_by(username='testuser1').first().password == new_hash
+
+
+def test_api_login_rehashes_and_rejects_invalid_hash(client, app):
+    """
+    Тест пересчёта хэша при входе через API и отказа для повреждённого хэша
+    """
+    app.extensions['passwords'].rounds = 5
+    response = client.post('/api/v1/login', json={'email': 'test1@example.com', 'password': 'password1'})
+    assert response.status_code == 200
+    with app.app_context():
+        user = User.query.filter_by(email='test1@example.com').first()
+        assert passwords.hash_cost(user.password) == 5
+        user.password = 'not-a-bcrypt-hash'
+        db.session.commit()
+
+    response = client.post('/api/v1/login', json={'email': 'test1@example.com', 'password': 'password1'})
+    assert response.status_code == 401
+
+
+def test_latency_histograms(app):
+    """
+    Тест гистограмм задержек хэширования и проверки паролей
+    """
+    with app.app_context():
+        hashed = passwords.hash_password('secret')
+        assert passwords.check_password(hashed, 'secret')
+        assert not passwords.check_password(hashed, 'wrong')
+        histograms = passwords.latency_histograms()
+
+    assert histograms['hash']['count'] == 1
+    assert histograms['verify']['count'] == 2
+    assert histograms['verify']['buckets'][-1] == (float('inf'), 2)
+    assert passwords.quantile_bound(histograms['verify'], 0.5) in passwords.LATENCY_BUCKETS + (float('inf'),)
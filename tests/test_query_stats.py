@@ -0,0 +1,66 @@
+# tests/test_query_stats.py
+
+import logging
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Booking, Class, User
+
+
+def add_bookings(app, count):
+    with app.app_context():
+        user = User.query.filter_by(username='testuser1').first()
+        for i in range(count):
+            class_ = Class(name=f'Class {i}', schedule=datetime.now() + timedelta(days=2), capacity=5,
+                           days_of_week='Friday')
+            db.session.add(class_)
+            db.session.add(Booking(user=user, class_=class_, status='confirmed', day='Friday'))
+        db.session.commit()
+
+
+def test_my_bookings_query_budget(client, app, query_budget):
+    """
+    Регрессионный тест N+1 на /my_bookings: число запросов не зависит от количества бронирований
+    """
+    client.post('/login', data={'email_or_username': 'testuser1', 'password': 'password1'})
+    add_bookings(app, 1)
+    with query_budget(10) as log:
+        assert client.get('/my_bookings').status_code == 200
+    baseline = len(log)
+
+    add_bookings(app, 6)
+    with query_budget(baseline):
+        response = client.get('/my_bookings')
+    assert response.status_code == 200
+    assert 'Class 5' in response.data.decode('utf-8')
+
+
+def test_n_plus_one_is_logged_with_call_site(client, app, caplog):
+    """
+    Тест обнаружения повторяющихся запросов с разными параметрами
+    """
+    add_bookings(app, 6)
+
+    def lazy_class_names():
+        return ','.join(booking.class_.name for booking in Booking.query.all())
+
+    app.add_url_rule('/lazy-class-names', 'lazy_class_names', lazy_class_names)
+    with caplog.at_level(logging.WARNING, logger='app.query_stats'):
+        assert client.get('/lazy-class-names').status_code == 200
+
+    messages = [record.getMessage() for record in caplog.records if 'N+1' in record.getMessage()]
+    assert len(messages) == 1
+    assert 'lazy_class_names' in messages[0]
+    assert 'tests/test_query_stats.py' in messages[0]
+
+
+def test_slow_query_is_logged(app, caplog):
+    """
+    Тест записи медленного запроса в журнал с местом вызова
+    """
+    app.extensions['query_stats']['slow_threshold'] = 0
+    with caplog.at_level(logging.WARNING, logger='app.query_stats'), app.app_context():
+        User.query.filter_by(username='testuser1').first()
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert any('Медленный SQL-запрос' in message and 'test_slow_query_is_logged' in message for message in messages)
@@ -0,0 +1,69 @@
+# tests/test_rate_limits.py
+
+import threading
+
+from app.rate_limits import SQLiteStorage
+
+
+def test_sqlite_storage_fixed_window(tmp_path):
+    """
+    Тест счётчиков fixed-window в SQLite: инкремент, истечение окна и очистка.
+    """
+    storage = SQLiteStorage(f"sqlite:///{tmp_path / 'limits.db'}")
+
+    assert storage.incr('LIMITER/127.0.0.1/main.login', 60) == 1
+    assert storage.incr('LIMITER/127.0.0.1/main.login', 60, amount=2) == 3
+    assert storage.get('LIMITER/127.0.0.1/main.login') == 3
+    assert storage.get_expiry('LIMITER/127.0.0.1/main.login') > 0
+
+    # Истёкшее окно начинается заново
+    assert storage.incr('LIMITER/127.0.0.1/api', -1) == 1
+    assert storage.get('LIMITER/127.0.0.1/api') == 0
+    assert storage.incr('LIMITER/127.0.0.1/api', 60) == 1
+
+    storage.clear('LIMITER/127.0.0.1/main.login')
+    assert storage.get('LIMITER/127.0.0.1/main.login') == 0
+    assert storage.check()
+
+
+def test_sqlite_storage_is_shared_between_workers(tmp_path):
+    """
+    Тест общего счётчика: несколько экземпляров хранилища (как воркеры gunicorn)
+    конкурентно увеличивают один ключ без потерянных инкрементов.
+    """
+    uri = f"sqlite:///{tmp_path / 'limits.db'}"
+    workers = [SQLiteStorage(uri) for _ in range(8)]
+
+    def hit(storage):
+        for _ in range(25):
+            storage.incr('LIMITER/10.0.0.1/api', 60)
+
+    threads = [threading.Thread(target=hit, args=(storage,)) for storage in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert workers[0].get('LIMITER/10.0.0.1/api') == 200
+
+
+def test_blueprint_policy_limits_api(client, app):
+    """
+    Тест политики лимитов блюпринта: лимит api читается из RATELIMIT_BLUEPRINT_LIMITS.
+    """
+    app.config['RATELIMIT_BLUEPRINT_LIMITS'] = {'api': '2 per minute'}
+
+    statuses = [client.get('/api/v1/bookings').status_code for _ in range(3)]
+    assert statuses[-1] == 429
+    assert statuses[:2].count(429) == 0
+
+
+def test_webhook_is_exempt(client, app):
+    """
+    Тест исключения вебхука Stripe из лимитов.
+    """
+    app.config['RATELIMIT_DEFAULT'] = '1 per minute'
+    app.config['STRIPE_ENDPOINT_SECRET'] = 'whsec_test'
+
+    statuses = [client.post('/stripe_webhook', data='{}').status_code for _ in range(3)]
+    assert statuses == [400, 400, 400]
@@ -0,0 +1,49 @@
+# tests/test_rate_windows.py
+
+from datetime import timedelta
+
+from app.rate_windows import MemoryWindowStore, SQLiteWindowStore
+
+
+def test_memory_store_sliding_window():
+    """
+    Тест скользящего окна: устаревшие события не учитываются.
+    """
+    store = MemoryWindowStore()
+    store.hit('login_failure:1', now=100)
+    store.hit('login_failure:1', now=200)
+    store.hit('login_failure:2', now=200)
+
+    assert store.count('login_failure:1', timedelta(seconds=150), now=250) == 2
+    assert store.count('login_failure:1', timedelta(seconds=60), now=250) == 1
+    assert store.count('login_failure:3', 60, now=250) == 0
+
+    store.reset('login_failure:1')
+    assert store.count('login_failure:1', 1000, now=250) == 0
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    """
+    Тест общего хранилища SQLite: счётчики видны из разных экземпляров (процессов).
+    """
+    path = str(tmp_path / 'rate_windows.db')
+    first, second = SQLiteWindowStore(path), SQLiteWindowStore(path)
+
+    first.hit('booking_cancel:1', now=1000)
+    second.hit('booking_cancel:1', now=1010)
+
+    assert first.count('booking_cancel:1', 60, now=1020) == 2
+    assert second.count('booking_cancel:1', 15, now=1020) == 1
+
+
+def test_login_lockout_after_failed_attempts(client):
+    """
+    Тест блокировки входа после MAX_FAILED_ATTEMPTS неудачных попыток.
+    """
+    for _ in range(5):
+        response = client.post('/login', data={'email_or_username': 'test1@example.com', 'password': 'wrong'})
+        assert '/error/invalid_credentials' in response.headers['Location']
+
+    response = client.post('/login', data={'email_or_username': 'test1@example.com', 'password': 'password1'})
+    assert response.status_code == 302
+    assert '/error/too_many_attempts' in response.headers['Location']
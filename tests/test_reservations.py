@@ -0,0 +1,67 @@
+# tests/test_reservations.py
+
+from concurrent.futures import ThreadPoolExecutor
+
+from app import db
+from app.models import Booking, Class, ClassSeatCounter, User
+from app.reservations import reserve_seat
+
+ATTEMPTS = 500
+CAPACITY = 25
+
+
+def test_reserve_seat_respects_capacity(app):
+    """
+    Тест отказа в бронировании после заполнения класса.
+    """
+    with app.app_context():
+        user = User.query.filter_by(email='test1@example.com').first()
+        class_ = Class.query.filter_by(name='Yoga').first()
+        class_.capacity = 1
+        db.session.commit()
+
+        assert reserve_seat(user.id, class_, 'Monday') is not None
+        db.session.commit()
+        assert reserve_seat(user.id, class_, 'Monday') is None
+        # Неподтверждённые бронирования место не занимают
+        assert reserve_seat(user.id, class_, 'Monday', status='pending') is not None
+        db.session.commit()
+
+        assert Booking.query.filter_by(class_id=class_.id, status='confirmed').count() == 1
+        assert class_.available_slots('Monday') == 0
+
+
+def test_concurrent_reservations_never_overbook(app):
+    """
+    Стресс-тест: 500 параллельных попыток забронировать класс вместимостью 25.
+    """
+    with app.app_context():
+        class_ = Class.query.filter_by(name='Pilates').first()
+        class_.capacity = CAPACITY
+        db.session.execute(db.insert(User), [
+            {'username': f'stress{i}', 'email': f'stress{i}@example.com', 'password': 'x'}
+            for i in range(ATTEMPTS)
+        ])
+        db.session.commit()
+        class_id = class_.id
+        user_ids = [user_id for (user_id,) in db.session.query(User.id).filter(User.username.like('stress%'))]
+
+    def attempt(user_id):
+        with app.app_context():
+            try:
+                booking = reserve_seat(user_id, db.session.get(Class, class_id), 'Tuesday')
+                db.session.commit()
+                return booking is not None
+            finally:
+                db.session.remove()
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(attempt, user_ids))
+
+    with app.app_context():
+        confirmed = Booking.query.filter_by(class_id=class_id, day='Tuesday', status='confirmed').count()
+        counter = db.session.get(ClassSeatCounter, (class_id, 'Tuesday'))
+
+        assert sum(results) == CAPACITY
+        assert confirmed == CAPACITY
+        assert counter.confirmed == CAPACITY
@@ -0,0 +1,60 @@
+# tests/test_stats.py
+
+from datetime import datetime
+
+from app import db
+from app.models import Booking, Class, Payment, PaymentStatusStat, User, UserBookingStat
+from app.stats import rebuild_statistics
+
+
+def rollups():
+    users = {row.user_id: row.confirmed for row in UserBookingStat.query if row.confirmed}
+    payments = {row.status: row.count for row in PaymentStatusStat.query if row.count}
+    return users, payments
+
+
+def test_rollups_follow_writes_and_match_rebuild(app):
+    """
+    Тест обновления сводок при создании, изменении и удалении бронирований и платежей.
+    """
+    with app.app_context():
+        user = User.query.filter_by(email='test1@example.com').first()
+        admin = User.query.filter_by(email='admin@example.com').first()
+        yoga = Class.query.filter_by(name='Yoga').first()
+
+        bookings = [Booking(user_id=user.id, class_id=yoga.id, day=day) for day in ('Monday', 'Wednesday')]
+        payment = Payment(user_id=user.id, amount=10, stripe_payment_id='pi_1')
+        db.session.add_all(bookings + [payment, Booking(user_id=admin.id, class_id=yoga.id, day='Monday')])
+        db.session.commit()
+        assert rollups() == ({user.id: 2, admin.id: 1}, {'paid': 1})
+
+        bookings[0].status = 'cancelled'
+        db.session.delete(bookings[1])
+        payment.status = 'failed'
+        db.session.commit()
+        assert rollups() == ({admin.id: 1}, {'failed': 1})
+
+        expected = rollups()
+        rebuild_statistics()
+        assert rollups() == expected
+
+
+def test_statistics_page_reads_rollups(client, app):
+    """
+    Тест страницы статистики администратора.
+    """
+    with app.app_context():
+        user = User.query.filter_by(email='test1@example.com').first()
+        yoga = Class.query.filter_by(name='Yoga').first()
+        db.session.add(Booking(user_id=user.id, class_id=yoga.id, day='Monday', booking_date=datetime.utcnow()))
+        db.session.add(Payment(user_id=user.id, amount=10, stripe_payment_id='pi_1'))
+        db.session.commit()
+
+    client.post('/login', data={'email_or_username': 'adminuser', 'password': 'adminpassword'})
+    response = client.get('/admin/statistics')
+
+    assert response.status_code == 200
+    html = response.get_data(as_text=True)
+    assert 'Yoga' in html
+    assert 'testuser1' in html
+    assert 'Всего: 1' in html  # Администратор только что вошёл
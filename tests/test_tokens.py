@@ -0,0 +1,134 @@
+# tests/test_tokens.py
+
+import re
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event
+
+from app import db
+from app.models import Booking, Class, RefreshTokenFamily, RevokedToken, User
+from app.token_revocation import RevocationSet, prune_expired
+
+
+def api_login(client, email, password):
+    response = client.post('/api/v1/login', json={'email': email, 'password': password})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_refresh_token_rotation(client, app):
+    """
+    Тест обмена refresh-токена: новая пара выдаётся, старый refresh-токен отклоняется
+    """
+    tokens = api_login(client, 'test1@example.com', 'password1')
+    assert 'refresh_token' in tokens
+
+    response = client.post('/api/v1/token/refresh', headers={'Authorization': f"Bearer {tokens['refresh_token']}"})
+    assert response.status_code == 200
+    rotated = response.get_json()
+    assert rotated['refresh_token'] != tokens['refresh_token']
+
+    response = client.get('/api/v1/bookings', headers={'Authorization': f"Bearer {rotated['access_token']}"})
+    assert response.status_code == 200
+
+    with app.app_context():
+        # Ротация не добавляет записей в список отзыва
+        assert RevokedToken.query.count() == 0
+        assert RefreshTokenFamily.query.one().generation == 1
+
+    # Повторное использование обменянного refresh-токена отзывает всю цепочку
+    response = client.post('/api/v1/token/refresh', headers={'Authorization': f"Bearer {tokens['refresh_token']}"})
+    assert response.status_code == 401
+    response = client.post('/api/v1/token/refresh', headers={'Authorization': f"Bearer {rotated['refresh_token']}"})
+    assert response.status_code == 401
+    with app.app_context():
+        assert RefreshTokenFamily.query.one().revoked
+
+    # Access-токен нельзя использовать для обмена
+    response = client.post('/api/v1/token/refresh', headers={'Authorization': f"Bearer {rotated['access_token']}"})
+    assert response.status_code == 422
+
+
+def test_revoked_token_is_rejected_and_persisted(client, app):
+    """
+    Тест отзыва access-токена: запись сохраняется, другой процесс узнаёт о ней при синхронизации
+    """
+    tokens = api_login(client, 'test1@example.com', 'password1')
+    headers = {'Authorization': f"Bearer {tokens['access_token']}"}
+
+    assert client.post('/api/v1/token/revoke', headers=headers).status_code == 200
+    response = client.get('/api/v1/bookings', headers=headers)
+    assert response.status_code == 401
+    assert response.get_json()['msg'] == 'Token has been revoked'
+
+    with app.app_context():
+        row = RevokedToken.query.one()
+        assert row.token_type == 'access'
+
+        # Список другого процесса, загруженный из базы
+        revocations = RevocationSet()
+        revocations.sync()
+        assert row.jti in revocations
+
+        row.expires_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        assert prune_expired() == 1
+
+
+def test_revoked_refresh_token_revokes_family(client, app):
+    """
+    Тест отзыва refresh-токена: отзывается цепочка, другие входы пользователя продолжают работать
+    """
+    tokens = api_login(client, 'test1@example.com', 'password1')
+    other = api_login(client, 'test1@example.com', 'password1')
+
+    headers = {'Authorization': f"Bearer {tokens['refresh_token']}"}
+    assert client.post('/api/v1/token/revoke', headers=headers).status_code == 200
+    assert client.post('/api/v1/token/refresh', headers=headers).status_code == 401
+
+    response = client.post('/api/v1/token/refresh', headers={'Authorization': f"Bearer {other['refresh_token']}"})
+    assert response.status_code == 200
+
+    with app.app_context():
+        assert RevokedToken.query.count() == 0
+        assert RefreshTokenFamily.query.filter_by(revoked=True).count() == 1
+
+        for family in RefreshTokenFamily.query:
+            family.expires_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        assert prune_expired() == 2
+
+
+def test_admin_claim_avoids_user_queries(client, app):
+    """
+    Тест проверки прав администратора по claim is_admin без запросов к таблице user
+    """
+    with app.app_context():
+        user = User.query.filter_by(email='test1@example.com').first()
+        class_ = Class.query.filter_by(name='Yoga').first()
+        booking = Booking(user_id=user.id, class_id=class_.id, status='confirmed',
+                          booking_date=datetime.now(timezone.utc), day='Monday')
+        db.session.add(booking)
+        db.session.commit()
+        booking_id = booking.id
+        app.extensions['user_cache'].clear()
+
+    tokens = api_login(client, 'admin@example.com', 'adminpassword')
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if re.search(r'\bFROM "?user"?(\s|$)', statement):
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(f'/api/v1/bookings/{booking_id}',
+                              headers={'Authorization': f"Bearer {tokens['access_token']}"})
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    assert response.status_code == 200
+    assert statements == []
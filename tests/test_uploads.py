@@ -0,0 +1,153 @@
+# tests/test_uploads.py
+
+import io
+import os
+import time
+import tracemalloc
+
+from flask import request
+
+from app import images, uploads
+from app.models import User
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def login(client):
+    return client.post('/login', data={'email_or_username': 'testuser1', 'password': 'password1'})
+
+
+def post_avatar(client, data, filename):
+    return client.post('/profile', data={
+        'username': 'testuser1',
+        'email': 'test1@example.com',
+        'avatar': (io.BytesIO(data), filename),
+    }, content_type='multipart/form-data')
+
+
+def test_avatar_upload_is_stored_by_content_hash(app, client, tmp_path):
+    """
+    Тест потоковой загрузки аватара: файл переименовывается из временного, временных файлов не остаётся.
+    """
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    app.config['UPLOAD_TMP_FOLDER'] = str(tmp_path / 'tmp')
+    login(client)
+    data = PNG_SIGNATURE + os.urandom(200 * 1024)
+
+    response = post_avatar(client, data, 'avatar.png')
+    assert response.status_code == 302
+
+    with app.app_context():
+        avatar = User.query.filter_by(username='testuser1').one().avatar
+    assert images.CONTENT_HASH_RE.match(avatar) and avatar.endswith('.png')
+    assert [name for name in os.listdir(tmp_path) if os.path.isfile(tmp_path / name)] == [avatar]
+    assert (tmp_path / avatar).read_bytes() == data
+    assert os.listdir(tmp_path / 'tmp') == []
+
+
+def test_upload_in_progress_is_not_public(app, tmp_path):
+    """
+    Тест временных файлов: незавершённая загрузка пишется в UPLOAD_TMP_FOLDER, а не в публичный
+    UPLOAD_FOLDER; оставшиеся после сбоя временные файлы удаляет сборка мусора.
+    """
+    public, private = tmp_path / 'images', tmp_path / 'uploads'
+    app.config['UPLOAD_FOLDER'] = str(public)
+    app.config['UPLOAD_TMP_FOLDER'] = str(private)
+
+    with app.test_request_context():
+        stream = uploads.upload_stream()
+        stream.write(PNG_SIGNATURE + b'\0' * 1024)
+        assert not public.exists()
+        [tmp_name] = os.listdir(private)
+        assert tmp_name.startswith('.upload.') and tmp_name.endswith('.tmp')
+
+        # Процесс упал до commit: временный файл остаётся
+        stream._file.close()
+        public.mkdir()
+        old = time.time() - 7200
+        os.utime(private / tmp_name, (old, old))
+        assert images.collect_garbage() == [str(private / tmp_name)]
+    assert os.listdir(private) == []
+
+
+def test_upload_with_wrong_magic_bytes_is_rejected(app, client, tmp_path):
+    """
+    Тест проверки сигнатуры: файл с расширением .png, но другим содержимым отклоняется с 415.
+    """
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    login(client)
+
+    response = post_avatar(client, b'<?php echo "hi"; ?>' + b'x' * 1024, 'avatar.png')
+
+    assert response.status_code == 415
+    assert os.listdir(tmp_path) == []
+    with app.app_context():
+        assert User.query.filter_by(username='testuser1').one().avatar == 'user.png'
+
+
+class GeneratedInput:
+    """wsgi.input, который генерирует тело multipart-запроса блоками, не держа его в памяти."""
+
+    def __init__(self, prefix, size, suffix, chunk_size=64 * 1024):
+        self._parts = self._generate(prefix, size, suffix, chunk_size)
+        self._buffer = b''
+        self.length = len(prefix) + size + len(suffix)
+
+    @staticmethod
+    def _generate(prefix, size, suffix, chunk_size):
+        yield prefix + PNG_SIGNATURE
+        remaining = size - len(PNG_SIGNATURE)
+        while remaining:
+            chunk = min(chunk_size, remaining)
+            yield b'\0' * chunk
+            remaining -= chunk
+        yield suffix
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            part = next(self._parts, None)
+            if part is None:
+                break
+            self._buffer += part
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def test_upload_memory_is_bounded(app, tmp_path):
+    """
+    Тест памяти: разбор 12 МБ загрузки выделяет не более небольшой константы.
+    """
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    boundary = 'bench-boundary'
+    prefix = (
+        f'--{boundary}\r\n'
+        'Content-Disposition: form-data; name="avatar"; filename="big.png"\r\n'
+        'Content-Type: image/png\r\n\r\n'
+    ).encode()
+    suffix = f'\r\n--{boundary}--\r\n'.encode()
+    size = 12 * 1024 * 1024
+    stream = GeneratedInput(prefix, size, suffix)
+
+    environ = {
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': '/profile',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'wsgi.url_scheme': 'http',
+        'CONTENT_TYPE': f'multipart/form-data; boundary={boundary}',
+        'CONTENT_LENGTH': str(stream.length),
+        'wsgi.input': stream,
+    }
+    with app.request_context(environ):
+        tracemalloc.start()
+        try:
+            upload = request.files['avatar']
+            name = images.store_upload(upload)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    assert (tmp_path / name).stat().st_size == size
+    assert peak < 1024 * 1024
@@ -0,0 +1,103 @@
+# tests/test_user_cache.py
+
+from sqlalchemy import event
+
+from app import db
+from app.models import User
+from app.user_cache import UserCache, get_user
+
+
+def user_selects(app, func):
+    """
+    Выполняет func в новом контексте приложения и возвращает количество SELECT по таблице user.
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and 'FROM user' in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            func()
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return len(statements)
+
+
+def test_cached_user_is_loaded_without_query(app):
+    """
+    Тест повторной загрузки пользователя из кэша без запроса к базе.
+    """
+    with app.app_context():
+        user_id = User.query.filter_by(email='test1@example.com').first().id
+
+    assert user_selects(app, lambda: get_user(user_id)) == 1
+
+    def load_cached():
+        user = get_user(user_id)
+        assert user.username == 'testuser1'
+        assert user in db.session
+    assert user_selects(app, load_cached) == 0
+
+
+def test_cache_invalidated_on_commit(app):
+    """
+    Тест инвалидации кэша при изменении прав, профиля и удалении пользователя.
+    """
+    with app.app_context():
+        user_id = User.query.filter_by(email='test1@example.com').first().id
+        get_user(user_id)
+
+    with app.app_context():
+        user = get_user(user_id)
+        user.is_admin = True
+        user.username = 'renamed'
+        db.session.commit()
+
+    with app.app_context():
+        user = get_user(user_id)
+        assert (user.is_admin, user.username) == (True, 'renamed')
+
+    with app.app_context():
+        db.session.delete(get_user(user_id))
+        db.session.commit()
+
+    with app.app_context():
+        assert get_user(user_id) is None
+
+
+def test_stale_load_is_not_cached():
+    """
+    Тест защиты от гонки: загрузка, начатая до инвалидации, не попадает в кэш.
+    """
+    cache = UserCache(ttl=60, max_size=2)
+    version = cache.version(1)
+    cache.invalidate(1)
+    cache.set(1, 'stale', version)
+    assert cache.get(1) is None
+
+    cache.set(1, 'fresh', cache.version(1))
+    cache.set(2, 'second', cache.version(2))
+    cache.set(3, 'third', cache.version(3))
+    assert cache.get(1) is None
+    assert cache.get(3) == 'third'
+
+
+def test_invalidations_are_bounded():
+    """
+    Тест ограничения памяти: номера инвалидаций хранятся не больше чем для max_size
+    пользователей, а загрузка, начатая до забытой инвалидации, всё равно отбрасывается.
+    """
+    cache = UserCache(ttl=60, max_size=2)
+    version = cache.version(1)
+    for user_id in range(1, 101):
+        cache.invalidate(user_id)
+    assert len(cache._invalidations) == 2
+
+    cache.set(1, 'stale', version)
+    assert cache.get(1) is None
+    cache.set(1, 'fresh', cache.version(1))
+    assert cache.get(1) == 'fresh'
@@ -0,0 +1,118 @@
+# tests/test_webhooks.py
+
+import hashlib
+import hmac
+import os
+import time
+
+from app import db
+from app.models import Payment, StripeEvent
+from app.stripe_events import process_pending_events, requeue_dead_events
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'stripe')
+ENDPOINT_SECRET = 'whsec_test_secret'
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, f'{name}.json'), encoding='utf-8') as f:
+        return f.read()
+
+
+def sign(payload, secret=ENDPOINT_SECRET):
+    """
+    Подписывает payload так же, как Stripe (заголовок Stripe-Signature, схема v1).
+    """
+    timestamp = int(time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def deliver(client, payload, secret=ENDPOINT_SECRET):
+    return client.post('/stripe_webhook', data=payload, content_type='application/json',
+                       headers={'Stripe-Signature': sign(payload, secret)})
+
+
+def test_webhook_acks_and_deduplicates_deliveries(client, app):
+    """
+    Тест быстрого подтверждения и дедупликации повторных доставок события.
+    """
+    app.config['STRIPE_ENDPOINT_SECRET'] = ENDPOINT_SECRET
+    payload = load_fixture('payment_intent.succeeded')
+
+    assert deliver(client, payload).status_code == 200
+    assert deliver(client, payload).status_code == 200
+
+    with app.app_context():
+        assert StripeEvent.query.count() == 1
+        # Платёж создаётся фоновым обработчиком, а не в запросе вебхука
+        assert Payment.query.count() == 0
+
+        assert process_pending_events() == 1
+        assert process_pending_events() == 0
+        payment = Payment.query.one()
+        assert (payment.stripe_payment_id, payment.status, payment.amount) == ('pi_test_0001', 'paid', 25.0)
+        assert db.session.get(StripeEvent, 'evt_test_payment_intent_succeeded').status == 'processed'
+
+    # Повторная доставка уже обработанного события не создаёт второй платёж
+    assert deliver(client, payload).status_code == 200
+    with app.app_context():
+        assert process_pending_events() == 0
+        assert Payment.query.count() == 1
+
+
+def test_late_failed_event_does_not_overwrite_paid(client, app):
+    """
+    Тест доставки не по порядку: событие о неудачной попытке после успешного не меняет статус 'paid'.
+    """
+    app.config['STRIPE_ENDPOINT_SECRET'] = ENDPOINT_SECRET
+    assert deliver(client, load_fixture('payment_intent.succeeded')).status_code == 200
+    with app.app_context():
+        assert process_pending_events() == 1
+
+    assert deliver(client, load_fixture('payment_intent.payment_failed')).status_code == 200
+    with app.app_context():
+        assert process_pending_events() == 1
+        payment = Payment.query.one()
+        assert payment.status == 'paid'
+        assert db.session.get(StripeEvent, 'evt_test_payment_intent_payment_failed').status == 'processed'
+
+
+def test_webhook_rejects_invalid_signature(client, app):
+    """
+    Тест отклонения события с неверной подписью.
+    """
+    app.config['STRIPE_ENDPOINT_SECRET'] = ENDPOINT_SECRET
+
+    response = deliver(client, load_fixture('charge.failed'), secret='whsec_wrong')
+
+    assert response.status_code == 400
+    with app.app_context():
+        assert StripeEvent.query.count() == 0
+
+
+def test_failing_event_is_retried_then_dead_lettered(client, app, mocker):
+    """
+    Тест повторных попыток и перевода события в dead после исчерпания попыток.
+    """
+    app.config.update(STRIPE_ENDPOINT_SECRET=ENDPOINT_SECRET, STRIPE_EVENTS_MAX_ATTEMPTS=2,
+                      STRIPE_EVENTS_RETRY_DELAY=0)
+    handler = mocker.Mock(side_effect=RuntimeError('handler failed'))
+    mocker.patch.dict('app.webhooks.EVENT_HANDLERS', {'charge.failed': handler})
+    deliver(client, load_fixture('charge.failed'))
+
+    with app.app_context():
+        process_pending_events()
+        stripe_event = db.session.get(StripeEvent, 'evt_test_charge_failed')
+        assert (stripe_event.status, stripe_event.attempts) == ('pending', 1)
+
+        process_pending_events()
+        db.session.refresh(stripe_event)
+        assert (stripe_event.status, stripe_event.attempts) == ('dead', 2)
+        assert stripe_event.last_error == 'handler failed'
+        assert Payment.query.count() == 0
+
+        assert requeue_dead_events() == 1
+        handler.side_effect = None
+        process_pending_events()
+        db.session.refresh(stripe_event)
+        assert stripe_event.status == 'processed'